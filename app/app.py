@@ -2,40 +2,53 @@
 
 import streamlit as st
 import requests  # To communicate with the FastAPI backend
+import json
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, Optional
 
 # --- Configuration ---
 st.set_page_config(page_title="Library Desk Agent", layout="wide")
-API_URL = "http://localhost:8000/chat"
+STREAM_URL = "http://localhost:8000/chat/stream"
 HISTORY_URL = "http://localhost:8000/history"
+HISTORY_PAGE_SIZE = 50  # Messages loaded on open; older ones are fetched on demand
 
 
 ## 1. Helper Functions to Communicate with Backend
-def send_message_to_agent(user_prompt: str, session_id: str) -> Dict[str, Any]:
+def stream_message_from_agent(user_prompt: str, session_id: str) -> Iterator[Dict[str, Any]]:
     """
-    Sends the user prompt and session ID to the FastAPI agent endpoint.
+    Posts the prompt to the streaming endpoint and yields its Server-Sent Events
+    ('tool_call', 'tool_result', 'token', 'final') as they arrive.
     """
     try:
-        response = requests.post(
-            API_URL, 
+        with requests.post(
+            STREAM_URL,
             json={"prompt": user_prompt, "session_id": session_id},
-            timeout=30 # Set a reasonable timeout for the LLM
-        )
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        return response.json()
+            stream=True,
+            timeout=(5, 60)  # Connect timeout, then max silence between events
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[len("data: "):])
     except requests.exceptions.RequestException as e:
-        # Handle connection errors, timeouts, etc.
-        return {
-            "response": f"Error communicating with the agent server at {API_URL}. Is the backend running? Details: {e}",
+        yield {
+            "type": "final",
+            "content": f"Error communicating with the agent server at {STREAM_URL}. Is the backend running? Details: {e}",
             "tool_info": "Connection Error",
             "session_id": session_id
         }
 
-def load_chat_history(session_id: str) -> List[Dict[str, Any]]:
-    """Loads chat history from the new backend endpoint."""
+def load_chat_history(session_id: str, before: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Loads one page of chat history from the backend: the most recent
+    HISTORY_PAGE_SIZE messages, or the page just older than message id `before`.
+    Returns the messages in display format plus the cursor for the next older page.
+    """
+    params = {"limit": HISTORY_PAGE_SIZE}
+    if before is not None:
+        params["before"] = before
     try:
-        response = requests.get(f"{HISTORY_URL}/{session_id}")
+        response = requests.get(f"{HISTORY_URL}/{session_id}", params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -49,20 +62,23 @@ def load_chat_history(session_id: str) -> List[Dict[str, Any]]:
                     # Use a placeholder for tool_info for messages loaded from DB
                     "tool_info": "Loaded from DB" if msg['role'] == 'assistant' else None
                 })
-            return loaded_messages
-        return []
+            return {"messages": loaded_messages, "oldest_id": data.get("oldest_id"), "has_more": data.get("has_more", False)}
+        return {"messages": [], "oldest_id": None, "has_more": False}
     except requests.exceptions.RequestException:
         st.error("Could not connect to the backend to load history. Please ensure the server is running.")
-        return []
+        return {"messages": [], "oldest_id": None, "has_more": False}
 
 ## 2. Session State Initialization (With Persistence)
 if "session_id" not in st.session_state:
     # Generate a unique ID for the chat session
     st.session_state["session_id"] = str(uuid.uuid4())
 
-# Load history only on the initial run (after a full page reload)
+# Load only the most recent page on the initial run (after a full page reload)
 if "messages" not in st.session_state:
-    st.session_state["messages"] = load_chat_history(st.session_state["session_id"])
+    page = load_chat_history(st.session_state["session_id"])
+    st.session_state["messages"] = page["messages"]
+    st.session_state["history_oldest_id"] = page["oldest_id"]
+    st.session_state["history_has_more"] = page["has_more"]
 
 
 ## 3. Title and Session Selector
@@ -75,17 +91,29 @@ with st.sidebar:
     # Button to start a new chat (resets Streamlit state and uses a new session_id)
     if st.button("Start New Chat"):
         st.session_state["messages"] = []
+        st.session_state["history_oldest_id"] = None
+        st.session_state["history_has_more"] = False
         st.session_state["session_id"] = str(uuid.uuid4())
         # The old session history remains in the DB, but a new ID ensures a clean slate
         st.rerun() 
 
 
 ## 4. Display Chat History
+if st.session_state.get("history_has_more"):
+    if st.button("Load older messages"):
+        page = load_chat_history(st.session_state["session_id"], before=st.session_state["history_oldest_id"])
+        st.session_state["messages"] = page["messages"] + st.session_state["messages"]
+        st.session_state["history_oldest_id"] = page["oldest_id"] or st.session_state["history_oldest_id"]
+        st.session_state["history_has_more"] = page["has_more"]
+        st.rerun()
+
 for message in st.session_state["messages"]:
     with st.chat_message(message["role"]):
         if message["role"] == "assistant":
             # Display Tool Status for transparency
             st.markdown(f"**Tool Status:** `{message['tool_info']}`")
+            if message.get("trace_id"):
+                st.caption(f"Trace ID: {message['trace_id']}")
             st.markdown("---")
             st.markdown(message["content"])
         else:
@@ -100,25 +128,41 @@ if user_prompt := st.chat_input("Ask the Library Agent..."):
     with st.chat_message("user"):
         st.markdown(user_prompt)
 
-    # 2. Get agent response from the backend
-    with st.spinner("Agent is thinking and checking inventory..."):
-        agent_response_data = send_message_to_agent(
-            user_prompt, 
-            st.session_state["session_id"]
-        )
-        
-        agent_response = agent_response_data.get("response", "An unknown error occurred.")
-        tool_info = agent_response_data.get("tool_info", "No status info.")
-
-    # 3. Add agent response to state and display
+    # 2. Stream the agent response from the backend, rendering it as it arrives
+    with st.chat_message("assistant"):
+        status_placeholder = st.empty()
+        st.markdown("---")
+        content_placeholder = st.empty()
+
+        status_placeholder.markdown("**Tool Status:** `Agent is thinking...`")
+        streamed_text = ""
+        agent_response = "An unknown error occurred."
+        tool_info = "No status info."
+        trace_id = None
+
+        for event in stream_message_from_agent(user_prompt, st.session_state["session_id"]):
+            if event["type"] == "tool_call":
+                status_placeholder.markdown(f"**Tool Status:** `Running {event['name']}...`")
+            elif event["type"] == "tool_result":
+                status_placeholder.markdown(f"**Tool Status:** `{event['name']} finished`")
+            elif event["type"] == "token":
+                streamed_text += event["content"]
+                content_placeholder.markdown(streamed_text + "▌")
+            elif event["type"] == "final":
+                agent_response = event.get("content", agent_response)
+                tool_info = event.get("tool_info", tool_info)
+                trace_id = event.get("trace_id")  # Matches the server's span export, for correlation
+
+        trace_text = f"  \n*Trace ID: {trace_id}*" if trace_id else ""
+        status_placeholder.markdown(f"**Tool Status:** `{tool_info}`{trace_text}")
+        content_placeholder.markdown(agent_response)
+
+    # 3. Add agent response to state so it is redrawn on the next run
     ai_message_data = {
         "role": "assistant", 
         "content": agent_response,
-        "tool_info": tool_info # Store tool info to display later
+        "tool_info": tool_info, # Store tool info to display later
+        "trace_id": trace_id
     }
     
     st.session_state["messages"].append(ai_message_data)
-    with st.chat_message("assistant"):
-        st.markdown(f"**Tool Status:** `{tool_info}`")
-        st.markdown("---")
-        st.markdown(agent_response)
\ No newline at end of file
@@ -1,3 +1,6 @@
+-- Baseline schema. Later changes (indexes, full-text search, ...) are versioned
+-- migrations in server/migrations.py.
+
 -- Domain Tables
 CREATE TABLE books (
     isbn TEXT PRIMARY KEY,
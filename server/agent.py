@@ -3,22 +3,28 @@ load_dotenv()  # Load environment variables from .env
 
 import os
 import json
-from typing import List, Dict, Union, Any
+import time
+from typing import List, Dict, Union, Any, AsyncIterator
 
 # Modern LangChain imports
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Local DB Tools
-from db_tools import find_books, create_order, restock_book, update_price, order_status, inventory_summary
+from db_tools import (find_books, create_order, restock_book, update_price, restock_books, update_prices,
+                      order_status, inventory_summary, set_low_stock_threshold, record_tool_calls)
+from tool_scheduler import ToolScheduler, TurnMemo
+import metrics
+import tracing
+from trace_writer import TraceWriter
 
 # --- 1. Define Tools for LangChain ---
 
 @tool
 def find_books_tool(q: str, by: str = "title") -> str:
-    """Finds books by title or author based on the search query (q). Searches are partial matches."""
+    """Finds books by title or author based on the search query (q). Every word must match the start of a word in the title/author (e.g. 'prag prog'); results are ranked by relevance. At most 50 are returned; 'total' and 'truncated' tell when there are more."""
     return json.dumps(find_books(q, by))
 
 @tool
@@ -39,6 +45,22 @@ def update_price_tool(isbn: str, price: float) -> str:
     """Updates the price (price: float) of a book specified by ISBN."""
     return json.dumps(update_price(isbn, price))
 
+@tool
+def restock_books_tool(items: List[Dict[str, Union[str, int]]]) -> str:
+    """
+    Restocks many books at once, e.g. a whole delivery (list of {'isbn': str, 'qty': int}).
+    Use this instead of repeated restock_book_tool calls; reports the new stock or an error per ISBN.
+    """
+    return json.dumps(restock_books(items))
+
+@tool
+def update_prices_tool(items: List[Dict[str, Union[str, float]]]) -> str:
+    """
+    Updates the prices of many books at once (list of {'isbn': str, 'price': float}).
+    Use this instead of repeated update_price_tool calls; reports the new price or an error per ISBN.
+    """
+    return json.dumps(update_prices(items))
+
 @tool
 def order_status_tool(order_id: int) -> str:
     """Retrieves the status, customer, and item details of an order specified by order_id (int)."""
@@ -46,19 +68,43 @@ def order_status_tool(order_id: int) -> str:
 
 @tool
 def inventory_summary_tool() -> str:
-    """Provides a total summary of inventory quantity and lists any titles currently low in stock (stock <= 5)."""
+    """Provides a total summary of inventory quantity and lists any titles at or below their low-stock threshold (default 5)."""
     return json.dumps(inventory_summary())
 
+@tool
+def set_low_stock_threshold_tool(isbn: str, threshold: int) -> str:
+    """Sets the stock level (threshold: int) at or below which the book with this ISBN is reported as low stock."""
+    return json.dumps(set_low_stock_threshold(isbn, threshold))
+
 # List of all tools the agent can use
 TOOLS = [
     find_books_tool, 
     create_order_tool, 
     restock_book_tool, 
     update_price_tool, 
+    restock_books_tool,
+    update_prices_tool,
     order_status_tool, 
-    inventory_summary_tool
+    inventory_summary_tool,
+    set_low_stock_threshold_tool,
 ]
 
+# Tools that never write; the scheduler may run these concurrently. Any tool
+# not listed here is treated as mutating and runs alone, in order.
+READ_ONLY_TOOLS = {
+    find_books_tool.name,
+    order_status_tool.name,
+    inventory_summary_tool.name,
+}
+
+
+# Every tool invocation is traced into the tool_calls table, in batches, off the request path
+TRACER = TraceWriter(
+    record_tool_calls,
+    batch_size=int(os.getenv("TRACE_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0")),
+)
+
 
 # --- 2. Load Prompt and Initialize LLM ---
 try:
@@ -81,7 +127,11 @@ except FileNotFoundError:
 # Initialize LLM based on environment
 GEMINI_KEY = os.getenv("GOOGLE_API_KEY")
 
-if GEMINI_KEY:
+if os.getenv("LLM_PROVIDER") == "fake":
+    # Scripted offline model for load tests and demos (see fake_llm.py)
+    from fake_llm import ScriptedChatModel
+    LLM = ScriptedChatModel.from_env()
+elif GEMINI_KEY:
     LLM = ChatGoogleGenerativeAI(
         model=os.getenv("LLM_MODEL", "gemini-2.0-flash-exp"),
         api_key=GEMINI_KEY,
@@ -94,6 +144,22 @@ else:
 
 # --- 3. Simple Agent Implementation ---
 
+MAX_ITERATIONS = 10
+MAX_ITERATIONS_MESSAGE = "Maximum iterations reached. Please try rephrasing your question."
+
+
+def _message_text(message) -> str:
+    """Text of a message or chunk; Gemini may return content as a list of parts."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
 class LibraryAgent:
     """Simple agent that uses LLM with tool calling."""
     
@@ -107,72 +173,262 @@ class LibraryAgent:
         
         # Bind tools to the LLM
         self.llm_with_tools = self.llm.bind_tools(tools)
+
+        # Runs independent read-only tool calls of one iteration concurrently
+        self.scheduler = ToolScheduler(self._execute_tool, self._aexecute_tool, READ_ONLY_TOOLS)
+
+        # Tool executions avoided by per-turn memoization, across all turns
+        self.memo_saved_total = 0
     
-    def run(self, user_input: str, chat_history: List = None) -> str:
+    def _build_messages(self, user_input: str, chat_history: List = None) -> List:
+        history = list(chat_history or [])
+        system_prompt = self.system_prompt
+        # A conversation summary arrives as a leading SystemMessage; fold it into the single system prompt
+        while history and isinstance(history[0], SystemMessage):
+            system_prompt += "\n\n" + history.pop(0).content
+        return [SystemMessage(content=system_prompt)] + history + [HumanMessage(content=user_input)]
+
+    def _tool_error(self, tool_call: Dict, e: Exception) -> ToolMessage:
+        error_msg = f"Error executing tool {tool_call['name']}: {str(e)}"
+        print(f"[Error] {error_msg}")
+        return ToolMessage(content=error_msg, tool_call_id=tool_call["id"], status="error")
+
+    def _traced(self, tool_call: Dict, message: ToolMessage, start: float, session_id: str) -> ToolMessage:
+        """Queues a trace of a finished tool call and passes its message through."""
+        status = "Error" if message.status == "error" else "Success"
+        try:
+            status = json.loads(message.content).get("status", status)
+        except (ValueError, AttributeError):
+            pass
+        elapsed = time.perf_counter() - start
+        metrics.record_tool(tool_call["name"], elapsed)
+        TRACER.record(
+            session_id or "cli", tool_call["name"], json.dumps(tool_call["args"], default=str),
+            message.content, elapsed * 1000, status
+        )
+        return message
+
+    def _memo_hit(self, tool_call: Dict, memo: TurnMemo) -> Union[ToolMessage, None]:
+        if memo is None or not self.scheduler.is_read_only(tool_call):
+            return None
+        content = memo.lookup(tool_call)
+        if content is None:
+            return None
+        print(f"\n[Tool Memo] {tool_call['name']} with args: {tool_call['args']} (reused earlier result)")
+        return ToolMessage(content=content, tool_call_id=tool_call["id"])
+
+    def _memo_record(self, tool_call: Dict, message: ToolMessage, memo: TurnMemo) -> None:
+        if memo is not None:
+            memo.record(tool_call, message.content, self.scheduler.is_read_only(tool_call), message.status != "error")
+
+    def _tool_span(self, tool_call: Dict):
+        return tracing.span(f"tool {tool_call['name']}", {
+            "tool.name": tool_call["name"],
+            "tool.args": json.dumps(tool_call["args"], default=str),
+            "tool.read_only": self.scheduler.is_read_only(tool_call),
+        })
+
+    @staticmethod
+    def _end_tool_span(span, message: ToolMessage) -> None:
+        if message.status == "error":
+            span.set_status("ERROR", message.content[:200])
+
+    def _execute_tool(self, tool_call: Dict, session_id: str = None, memo: TurnMemo = None) -> ToolMessage:
+        """Runs one tool call and wraps its output (or error) in a ToolMessage."""
+        cached = self._memo_hit(tool_call, memo)
+        if cached is not None:
+            return cached
+
+        print(f"\n[Tool Call] {tool_call['name']} with args: {tool_call['args']}")
+        start = time.perf_counter()
+        with self._tool_span(tool_call) as span:
+            try:
+                tool_output = self.tool_map[tool_call["name"]].invoke(tool_call["args"])
+                print(f"[Tool Output] {tool_output[:200]}...")  # Print first 200 chars
+                message = ToolMessage(content=tool_output, tool_call_id=tool_call["id"])
+            except Exception as e:
+                message = self._tool_error(tool_call, e)
+            self._end_tool_span(span, message)
+        self._memo_record(tool_call, message, memo)
+        return self._traced(tool_call, message, start, session_id)
+
+    async def _aexecute_tool(self, tool_call: Dict, session_id: str = None, memo: TurnMemo = None) -> ToolMessage:
+        """Async variant of _execute_tool; sync tools are run in LangChain's executor."""
+        cached = self._memo_hit(tool_call, memo)
+        if cached is not None:
+            return cached
+
+        print(f"\n[Tool Call] {tool_call['name']} with args: {tool_call['args']}")
+        start = time.perf_counter()
+        with self._tool_span(tool_call) as span:
+            try:
+                tool_output = await self.tool_map[tool_call["name"]].ainvoke(tool_call["args"])
+                print(f"[Tool Output] {tool_output[:200]}...")  # Print first 200 chars
+                message = ToolMessage(content=tool_output, tool_call_id=tool_call["id"])
+            except Exception as e:
+                message = self._tool_error(tool_call, e)
+            self._end_tool_span(span, message)
+        self._memo_record(tool_call, message, memo)
+        return self._traced(tool_call, message, start, session_id)
+
+    def _iteration_span(self, iteration: int):
+        return tracing.span("agent.iteration", {"agent.iteration": iteration})
+
+    def _llm_span(self):
+        model = getattr(self.llm, "model", None) or type(self.llm).__name__
+        return tracing.span("llm.invoke", {"gen_ai.request.model": model}, kind="CLIENT")
+
+    @staticmethod
+    def _record_llm_call(start: float, response, span) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        metrics.record_llm_call(time.perf_counter() - start, usage)
+        if usage:
+            span.set_attribute("gen_ai.usage.input_tokens", usage.get("input_tokens", 0))
+            span.set_attribute("gen_ai.usage.output_tokens", usage.get("output_tokens", 0))
+        span.set_attribute("llm.tool_calls", len(getattr(response, "tool_calls", None) or []))
+
+    def _finish_turn(self, memo: TurnMemo, iterations: int) -> None:
+        metrics.record_iterations(iterations)
+        self.memo_saved_total += memo.saved
+        if memo.saved:
+            print(f"[Tool Memo] Saved {memo.saved} tool execution(s) this turn")
+
+    def run(self, user_input: str, chat_history: List = None, session_id: str = None) -> str:
         """Execute the agent for one turn."""
-        if chat_history is None:
-            chat_history = []
+        messages = self._build_messages(user_input, chat_history)
+        memo = TurnMemo()
+        iterations = 0
         
-        # Prepare messages
-        messages = [SystemMessage(content=self.system_prompt)] + chat_history + [HumanMessage(content=user_input)]
-        
-        # Agent loop (max 10 iterations to prevent infinite loops)
-        for iteration in range(10):
-            # Call the LLM
-            response = self.llm_with_tools.invoke(messages)
-            
-            # Check if there are tool calls
-            if not response.tool_calls:
-                # No more tool calls, return the final answer
-                return response.content
-            
-            # Add AI response to messages
-            messages.append(response)
+        try:
+            # Agent loop (max 10 iterations to prevent infinite loops)
+            for iteration in range(MAX_ITERATIONS):
+                iterations += 1
+                with self._iteration_span(iterations):
+                    # Call the LLM
+                    start = time.perf_counter()
+                    with self._llm_span() as llm_span:
+                        response = self.llm_with_tools.invoke(messages)
+                        self._record_llm_call(start, response, llm_span)
+
+                    # Check if there are tool calls
+                    if not response.tool_calls:
+                        # No more tool calls, return the final answer
+                        return response.content
+
+                    # Add AI response to messages
+                    messages.append(response)
+
+                    # Execute the tool calls and add their results to messages (in call order)
+                    messages.extend(self.scheduler.run(response.tool_calls, session_id=session_id, memo=memo))
             
-            # Execute each tool call
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
-                
-                print(f"\n[Tool Call] {tool_name} with args: {tool_args}")
-                
-                try:
-                    # Get the tool and execute it
-                    selected_tool = self.tool_map[tool_name]
-                    tool_output = selected_tool.invoke(tool_args)
-                    print(f"[Tool Output] {tool_output[:200]}...")  # Print first 200 chars
-                    
-                    # Add tool result to messages
-                    from langchain_core.messages import ToolMessage
-                    messages.append(
-                        ToolMessage(
-                            content=tool_output,
-                            tool_call_id=tool_call["id"]
-                        )
-                    )
-                except Exception as e:
-                    error_msg = f"Error executing tool {tool_name}: {str(e)}"
-                    print(f"[Error] {error_msg}")
-                    from langchain_core.messages import ToolMessage
-                    messages.append(
-                        ToolMessage(
-                            content=error_msg,
-                            tool_call_id=tool_call["id"]
-                        )
-                    )
-        
-        return "Maximum iterations reached. Please try rephrasing your question."
+            return MAX_ITERATIONS_MESSAGE
+        finally:
+            self._finish_turn(memo, iterations)
+
+    async def arun(self, user_input: str, chat_history: List = None, session_id: str = None,
+                   tools_used: List[str] = None) -> str:
+        """
+        Async version of run(): awaits the LLM and tools so the event loop stays free.
+
+        :param tools_used: If given, the name of every tool called this turn is appended to it.
+        """
+        messages = self._build_messages(user_input, chat_history)
+        memo = TurnMemo()
+        iterations = 0
+
+        try:
+            for iteration in range(MAX_ITERATIONS):
+                iterations += 1
+                with self._iteration_span(iterations):
+                    start = time.perf_counter()
+                    with self._llm_span() as llm_span:
+                        response = await self.llm_with_tools.ainvoke(messages)
+                        self._record_llm_call(start, response, llm_span)
+
+                    if not response.tool_calls:
+                        return response.content
+
+                    messages.append(response)
+                    if tools_used is not None:
+                        tools_used.extend(tool_call["name"] for tool_call in response.tool_calls)
+
+                    messages.extend(await self.scheduler.arun(response.tool_calls, session_id=session_id, memo=memo))
+
+            return MAX_ITERATIONS_MESSAGE
+        finally:
+            self._finish_turn(memo, iterations)
 
+    async def astream(self, user_input: str, chat_history: List = None, session_id: str = None) -> AsyncIterator[Dict]:
+        """
+        Streaming version of arun(). Yields event dicts as they happen:
+        {'type': 'token', 'content'} for LLM text, {'type': 'tool_call', 'name', 'args'}
+        and {'type': 'tool_result', 'name', 'content'} around tool execution, and
+        finally one {'type': 'final', 'content'} with the complete answer.
+        """
+        messages = self._build_messages(user_input, chat_history)
+        memo = TurnMemo()
+        iterations = 0
+        finished = False
 
-def create_library_agent():
-    """Creates and returns the Library Agent."""
-    if not LLM:
+        try:
+            for iteration in range(MAX_ITERATIONS):
+                iterations += 1
+                answer = None
+                with self._iteration_span(iterations):
+                    start = time.perf_counter()
+                    response = None
+                    with self._llm_span() as llm_span:
+                        async for chunk in self.llm_with_tools.astream(messages):
+                            # Chunks add up to one AIMessageChunk, including parsed tool_calls
+                            response = chunk if response is None else response + chunk
+                            text = _message_text(chunk)
+                            if text:
+                                yield {"type": "token", "content": text}
+                        # Streaming latency includes the time the consumer took to take each token
+                        self._record_llm_call(start, response, llm_span)
+
+                    if response is None or not response.tool_calls:
+                        answer = _message_text(response) if response else ""
+                    else:
+                        messages.append(response)
+
+                        for tool_call in response.tool_calls:
+                            yield {"type": "tool_call", "name": tool_call["name"], "args": tool_call["args"]}
+
+                        results = await self.scheduler.arun(response.tool_calls, session_id=session_id, memo=memo)
+                        for tool_call, result in zip(response.tool_calls, results):
+                            yield {"type": "tool_result", "name": tool_call["name"], "content": result.content[:200]}
+                        messages.extend(results)
+
+                if answer is not None:
+                    # Close the turn before 'final', so its metrics are complete when the consumer sees it
+                    self._finish_turn(memo, iterations)
+                    finished = True
+                    yield {"type": "final", "content": answer, "completed": True}
+                    return
+
+            self._finish_turn(memo, iterations)
+            finished = True
+            yield {"type": "final", "content": MAX_ITERATIONS_MESSAGE}
+        finally:
+            if not finished:
+                self._finish_turn(memo, iterations)
+
+
+def create_library_agent(llm=None):
+    """
+    Creates and returns the Library Agent.
+
+    :param llm: Chat model to use instead of the configured one (e.g. a ScriptedChatModel).
+    """
+    llm = llm or LLM
+    if not llm:
         return None
     
-    return LibraryAgent(LLM, TOOLS, SYSTEM_PROMPT)
+    return LibraryAgent(llm, TOOLS, SYSTEM_PROMPT)
 
 
-def run_agent_chat(agent, user_prompt: str, history: List[Any]):
+def run_agent_chat(agent, user_prompt: str, history: List[Any], session_id: str = None):
     """
     Handles a single turn of the agent interaction, including passing history.
     """
@@ -181,13 +437,46 @@ def run_agent_chat(agent, user_prompt: str, history: List[Any]):
 
     try:
         # Run the agent
-        response = agent.run(user_prompt, history)
+        response = agent.run(user_prompt, history, session_id)
         return AIMessage(content=response)
     
     except Exception as e:
         return AIMessage(content=f"An internal error occurred during agent execution: {str(e)}")
 
 
+async def arun_agent_chat(agent, user_prompt: str, history: List[Any], session_id: str = None):
+    """
+    Async counterpart of run_agent_chat, used by the FastAPI server.
+    """
+    if not agent:
+        return AIMessage(content="Agent is not initialized. Check your API Key configuration.")
+
+    try:
+        tools_used: List[str] = []
+        response = await agent.arun(user_prompt, history, session_id, tools_used)
+        completed = response != MAX_ITERATIONS_MESSAGE
+        return AIMessage(content=response, response_metadata={"tools_used": tools_used, "completed": completed})
+
+    except Exception as e:
+        return AIMessage(content=f"An internal error occurred during agent execution: {str(e)}")
+
+
+async def astream_agent_chat(agent, user_prompt: str, history: List[Any], session_id: str = None) -> AsyncIterator[Dict]:
+    """
+    Streaming counterpart of arun_agent_chat. Always ends with a 'final' event,
+    even when the agent is missing or fails part-way.
+    """
+    if not agent:
+        yield {"type": "final", "content": "Agent is not initialized. Check your API Key configuration."}
+        return
+
+    try:
+        async for event in agent.astream(user_prompt, history, session_id):
+            yield event
+    except Exception as e:
+        yield {"type": "final", "content": f"An internal error occurred during agent execution: {str(e)}"}
+
+
 # --- 4. Minimal Run Script for Testing ---
 if __name__ == "__main__":
     agent = create_library_agent()
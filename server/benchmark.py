@@ -0,0 +1,670 @@
+# /server/benchmark.py
+#
+# Micro-benchmarks for the database layer. Each run builds a throwaway copy of
+# db/schema.sql + db/seed.sql so the real library_desk.db is never touched.
+#
+#   python benchmark.py pool --threads 16 --calls 200
+#   python benchmark.py stress --threads 32 --calls 100
+#   python benchmark.py plans
+#   python benchmark.py chat --sessions 1,10,100 --turns 3 --llm-latency 0.2
+#   python benchmark.py context --llm-latency 0.2 --llm-input-latency 0.02
+#   python benchmark.py orders --calls 20
+#   python benchmark.py oversell --processes 4 --threads 8 --calls 25
+#   python benchmark.py suite --scales 1e3,1e4,1e5 --report suite.json --baseline previous.json
+#   python benchmark.py workers --workers 1,2,4 --requests 400 --llm-latency 0.02
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from metrics import percentile
+
+DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db")
+
+
+def build_temp_db() -> str:
+    """Creates a seeded database in a temp dir and points db_tools at it."""
+    path = os.path.join(tempfile.mkdtemp(prefix="library_bench_"), "library_desk.db")
+    conn = sqlite3.connect(path)
+    for name in ("schema.sql", "seed.sql"):
+        with open(os.path.join(DB_DIR, name)) as f:
+            conn.executescript(f.read())
+    conn.commit()
+    conn.close()
+    os.environ["LIBRARY_DB_PATH"] = path
+
+    from migrations import apply_migrations
+    apply_migrations()
+    return path
+
+
+def run_concurrent(fn: Callable[[int], None], threads: int, calls: int) -> Dict:
+    """Runs fn(i) `calls` times per thread and returns per-call latency stats in ms."""
+    def worker(_) -> List[float]:
+        samples = []
+        for i in range(calls):
+            start = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        samples = [s for batch in executor.map(worker, range(threads)) for s in batch]
+    wall = time.perf_counter() - wall_start
+
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "calls_per_sec": len(samples) / wall,
+    }
+
+
+def print_row(label: str, stats: Dict) -> None:
+    print(f"{label:<28} calls={stats['calls']:<7} mean={stats['mean_ms']:.3f}ms "
+          f"p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms "
+          f"throughput={stats['calls_per_sec']:.0f}/s")
+
+
+# --- Scenarios ---
+
+class _PerCallConnections:
+    """Mimics the old behaviour: a fresh connection per tool call, closed on return."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def acquire(self):
+        return self.factory()
+
+    def release(self, conn):
+        conn.close()
+
+
+def bench_pool(args) -> None:
+    build_temp_db()
+    import db_tools
+
+    # The uncached bodies of find_books / inventory_summary: through the result
+    # cache almost every call would be a dict copy and never touch a connection.
+    def mixed_reads(i: int) -> None:
+        if i % 3 == 0:
+            db_tools._search_books("Code", "title", db_tools.FIND_BOOKS_LIMIT)
+        elif i % 3 == 1:
+            db_tools.order_status(101)
+        else:
+            db_tools._compute_inventory_summary()
+
+    pooled = db_tools.POOL
+    db_tools.POOL = _PerCallConnections(db_tools.connect_db)
+    print_row("per-call connect_db()", run_concurrent(mixed_reads, args.threads, args.calls))
+
+    db_tools.POOL = pooled
+    print_row(f"pooled (size={pooled.size})", run_concurrent(mixed_reads, args.threads, args.calls))
+    pooled.close_all()
+
+
+def bench_stress(args) -> int:
+    """Hammers create_order and find_books from many threads; fails on any lock error or oversell."""
+    path = build_temp_db()
+    import db_tools
+
+    print(f"journal_mode={db_tools.configure_database()['journal_mode']}")
+    isbn = "978-0201485677"
+    orders = args.threads * args.calls // 2
+    initial_stock = orders + 1000
+    sold_query = "SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE isbn = ?"
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE books SET stock = ? WHERE isbn = ?", (initial_stock, isbn))
+        sold_before = conn.execute(sold_query, (isbn,)).fetchone()[0]
+
+    errors: List[str] = []
+
+    def hammer(i: int) -> None:
+        if i % 2 == 0:
+            result = db_tools.create_order(1 + i % 6, [{"isbn": isbn, "qty": 1}])
+        else:
+            result = db_tools.find_books("Design")
+        if result["status"] == "Error":
+            errors.append(result["message"])
+
+    print_row("create_order + find_books", run_concurrent(hammer, args.threads, args.calls))
+
+    with sqlite3.connect(path) as conn:
+        final_stock = conn.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,)).fetchone()[0]
+        sold = conn.execute(sold_query, (isbn,)).fetchone()[0] - sold_before
+    db_tools.WRITER.close()
+    db_tools.POOL.close_all()
+
+    locked = sum("locked" in e for e in errors)
+    consistent = final_stock + sold == initial_stock
+    print(f"errors={len(errors)} (database is locked: {locked}) "
+          f"stock={final_stock} sold={sold} consistent={consistent}")
+    return 0 if not errors and consistent else 1
+
+
+def bench_plans(args) -> int:
+    """Asserts (via EXPLAIN QUERY PLAN) that the hot queries use their indexes."""
+    path = build_temp_db()
+    from migrations import check_query_plans
+    with sqlite3.connect(path) as conn:
+        checks = check_query_plans(conn)
+    for check in checks:
+        print(f"{'OK ' if check['ok'] else 'BAD'} {check['label']:<24} {check['plan']}")
+    return 0 if all(check["ok"] for check in checks) else 1
+
+
+def bench_chat(args) -> None:
+    """Drives the /chat pipeline with a stubbed LLM at increasing session concurrency."""
+    build_temp_db()
+    # Every session sends the same prompts: the response cache would answer most turns
+    os.environ.update(FAST_PATH_ENABLED="0", RESPONSE_CACHE_ENABLED="0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        from agent import create_library_agent
+        from fake_llm import ScriptedChatModel
+    main.AGENT = create_library_agent(ScriptedChatModel(latency=args.llm_latency if args.llm_latency is not None else 0.2))
+
+    async def session(name: str) -> List[float]:
+        samples = []
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            await main.chat_endpoint(main.ChatRequest(prompt=f"turn {turn}", session_id=name), main.Response())
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    async def run(concurrency: int) -> Dict:
+        wall_start = time.perf_counter()
+        batches = await asyncio.gather(*(session(f"bench-{concurrency}-{i}") for i in range(concurrency)))
+        wall = time.perf_counter() - wall_start
+        samples = sorted(s for batch in batches for s in batch)
+        return {
+            "calls": len(samples),
+            "mean_ms": statistics.fmean(samples),
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "calls_per_sec": len(samples) / wall,
+        }
+
+    for concurrency in (int(c) for c in args.sessions.split(",")):
+        with contextlib.redirect_stdout(io.StringIO()):  # Silence the agent's tool-call prints
+            stats = asyncio.run(run(concurrency))
+        print_row(f"/chat x{concurrency} sessions", stats)
+
+
+def bench_context(args) -> None:
+    """
+    Prompt size and agent turn latency, full history vs ContextWindow, as
+    sessions grow. The stub LLM's delay grows with its prompt (see
+    ScriptedChatModel.input_latency), so the latencies show the cost of the
+    tokens each turn sends, not that of a real model.
+    """
+    build_temp_db()
+    from langchain_core.messages import AIMessage, HumanMessage
+    with contextlib.redirect_stdout(io.StringIO()):
+        from agent import create_library_agent
+    from context_window import ContextWindow, estimate_tokens
+    from fake_llm import ScriptedChatModel
+
+    model = ScriptedChatModel(latency=args.llm_latency if args.llm_latency is not None else 0.2,
+                              input_latency=args.llm_input_latency)
+    agent = create_library_agent(model)
+    window = ContextWindow(llm=model)
+    print(f"stub LLM: {model.latency * 1000:.0f}ms per call + {model.input_latency * 1000:.0f}ms per 1k prompt tokens")
+
+    async def turn_ms(history: List) -> float:
+        start = time.perf_counter()
+        await agent.arun("find books about code", history)  # Two LLM calls: the tool call, then the answer
+        return (time.perf_counter() - start) * 1000
+
+    for turns in (10, 50, 200, 1000):
+        history = []
+        for i in range(turns):
+            history.append(HumanMessage(content=f"Restock 978-0134494166 by {i} copies and show the new level please."))
+            history.append(AIMessage(content=f"The restock of The Pragmatic Programmer was successful. New stock level is **{i + 15}**."))
+        session_id = f"context-{turns}"
+
+        start = time.perf_counter()
+        prepared = asyncio.run(window.prepare(session_id, history))  # First call folds and persists
+        fold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        prepared = asyncio.run(window.prepare(session_id, history))
+        steady_ms = (time.perf_counter() - start) * 1000
+
+        with contextlib.redirect_stdout(io.StringIO()):  # Silence the agent's tool-call prints
+            full_turn_ms = asyncio.run(turn_ms(history))
+            windowed_turn_ms = asyncio.run(turn_ms(prepared))
+
+        print(f"{turns:>5} turns  full={estimate_tokens(history):>7} tokens  "
+              f"windowed={estimate_tokens(prepared):>5} tokens ({len(prepared)} msgs)  "
+              f"prepare: first={fold_ms:.2f}ms steady={steady_ms:.2f}ms  "
+              f"turn: full={full_turn_ms:.0f}ms windowed={windowed_turn_ms:.0f}ms")
+
+
+def _row_by_row_order(conn: sqlite3.Connection, customer_id: int, items: List[Dict]) -> None:
+    """The previous create_order strategy: SELECT + INSERT + UPDATE per line item."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM customers WHERE id = ?", (customer_id,))
+    cursor.execute("INSERT INTO orders (customer_id) VALUES (?)", (customer_id,))
+    order_id = cursor.lastrowid
+    for item in items:
+        stock, price = cursor.execute("SELECT stock, price FROM books WHERE isbn = ?", (item['isbn'],)).fetchone()
+        cursor.execute("INSERT INTO order_items (order_id, isbn, qty, price_at_order) VALUES (?, ?, ?, ?)",
+                       (order_id, item['isbn'], item['qty'], price))
+        cursor.execute("UPDATE books SET stock = ? WHERE isbn = ?", (stock - item['qty'], item['isbn']))
+    conn.commit()
+
+
+def bench_orders(args) -> None:
+    """create_order latency for 1, 50 and 500 line orders: row-by-row vs set-based."""
+    path = build_temp_db()
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO books (isbn, title, author, stock, price) VALUES (?, ?, ?, ?, ?)",
+            [(f"bench-{i:05d}", f"Bench Title {i}", f"Author {i % 97}", 10 ** 9, 9.99) for i in range(500)]
+        )
+    import db_tools
+
+    print(f"SQLite {sqlite3.sqlite_version}: create_order stock update is "
+          f"{'one UPDATE ... FROM' if db_tools.SQLITE_UPDATE_FROM else 'row by row (needs 3.33 for UPDATE ... FROM)'}")
+    for lines in (1, 50, 500):
+        items = [{"isbn": f"bench-{i:05d}", "qty": 1} for i in range(lines)]
+        # Both strategies go through the same single-writer path
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            db_tools.WRITER.submit(_row_by_row_order, 1, items)
+        row_ms = (time.perf_counter() - start) * 1000 / args.calls
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            result = db_tools.create_order(1, items)
+            assert result["status"] == "Success", result
+        bulk_ms = (time.perf_counter() - start) * 1000 / args.calls
+
+        print(f"{lines:>4} lines  row-by-row={row_ms:8.3f}ms  set-based={bulk_ms:8.3f}ms  speedup={row_ms / bulk_ms:.1f}x")
+    db_tools.WRITER.close()
+
+
+OVERSELL_ISBN = "978-0201485677"
+
+
+def _oversell_worker(args) -> Dict:
+    """
+    One process of the oversell scenario. Each process imports db_tools itself,
+    so it has its own writer thread and connections: the processes only
+    coordinate through SQLite locking, like separate server workers would.
+    """
+    threads, calls = args
+    import db_tools
+
+    outcomes = {"sold": 0, "insufficient": 0, "errors": []}
+
+    def buy(i: int) -> None:
+        result = db_tools.create_order(1 + i % 6, [{"isbn": OVERSELL_ISBN, "qty": 1}])
+        if result["status"] == "Success":
+            outcomes["sold"] += 1
+        elif "Insufficient stock" in result["message"]:
+            outcomes["insufficient"] += 1
+        else:
+            outcomes["errors"].append(result["message"])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_concurrent(buy, threads, calls)
+    db_tools.WRITER.close()
+    db_tools.POOL.close_all()
+    outcomes["locks"] = db_tools.LOCK_STATS.stats()
+    return outcomes
+
+
+def bench_oversell(args) -> int:
+    """
+    Many processes x threads race to buy the last copies of one book.
+    Fails if more copies are sold than were in stock, or on any lock error.
+    """
+    path = build_temp_db()
+    attempts = args.processes * args.threads * args.calls
+    initial_stock = attempts // 4
+    sold_query = "SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE isbn = ?"
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE books SET stock = ? WHERE isbn = ?", (initial_stock, OVERSELL_ISBN))
+        sold_before = conn.execute(sold_query, (OVERSELL_ISBN,)).fetchone()[0]
+
+    start = time.perf_counter()
+    # spawn, not fork: each worker must build its own db_tools threads and connections
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        results = pool.map(_oversell_worker, [(args.threads, args.calls)] * args.processes)
+    wall = time.perf_counter() - start
+
+    with sqlite3.connect(path) as conn:
+        final_stock = conn.execute("SELECT stock FROM books WHERE isbn = ?", (OVERSELL_ISBN,)).fetchone()[0]
+        sold_rows = conn.execute(sold_query, (OVERSELL_ISBN,)).fetchone()[0] - sold_before
+
+    sold = sum(r["sold"] for r in results)
+    errors = [e for r in results for e in r["errors"]]
+    oversold = max(sold_rows - initial_stock, 0)
+    print(f"attempts={attempts} initial_stock={initial_stock} sold={sold} "
+          f"refused={sum(r['insufficient'] for r in results)} errors={len(errors)} wall={wall:.2f}s")
+    print(f"final_stock={final_stock} order_item_qty={sold_rows} oversold={oversold}")
+    for i, r in enumerate(results):
+        locks = r["locks"]
+        print(f"  process {i}: write locks={locks['acquired']} contended={locks['contended']} "
+              f"timeouts={locks['timeouts']} avg_wait={locks['avg_wait_ms']:.3f}ms max_wait={locks['max_wait_ms']:.3f}ms")
+    for message in sorted(set(errors))[:5]:
+        print(f"  error: {message}")
+
+    consistent = final_stock == 0 and sold == sold_rows == initial_stock
+    return 0 if not errors and not oversold and consistent else 1
+
+
+def _suite_calls(db_tools, rng: random.Random, counts: Dict[str, int]) -> Dict[str, Callable[[], Dict]]:
+    """
+    One entry per public db_tools query or write (connection setup and pure
+    helpers like book_tag/isbn_digits aside); arguments are drawn fresh on every call.
+    """
+    from datagen import WORDS, make_isbn
+
+    def isbn() -> str:
+        return make_isbn(rng.randrange(counts["books"]))
+
+    def session() -> str:
+        return f"session-{rng.randrange(counts['sessions'])}"
+
+    def cold(fn: Callable[[], Dict]) -> Callable[[], Dict]:
+        # The result cache would otherwise turn every repeat into a dict copy
+        def call() -> Dict:
+            db_tools.RESULT_CACHE.clear()
+            return fn()
+        return call
+
+    def cache_key() -> str:
+        return f"bench-key-{rng.randrange(100)}"
+
+    trace = ("bench", "find_books_tool", "{}", "{}", 1.0, "Success", 2, 2)
+    versions = {"books": 0, "orders": 0, "customers": 0}
+    return {
+        "find_books (title)": cold(lambda: db_tools.find_books(rng.choice(WORDS))),
+        "find_books (author)": cold(lambda: db_tools.find_books("Martin", by="author")),
+        "find_books (miss)": cold(lambda: db_tools.find_books("zzzz")),
+        "find_books (cached)": lambda: db_tools.find_books("clean code"),
+        "order_status": lambda: db_tools.order_status(rng.randint(1, counts["orders"])),
+        "inventory_summary": cold(db_tools.inventory_summary),
+        "lookup_isbn": lambda: db_tools.lookup_isbn(isbn().replace("-", "")),
+        "create_order": lambda: db_tools.create_order(rng.randint(1, counts["customers"]),
+                                                      [{"isbn": isbn(), "qty": 1}, {"isbn": isbn(), "qty": 1}]),
+        "restock_book": lambda: db_tools.restock_book(isbn(), 5),
+        "update_price": lambda: db_tools.update_price(isbn(), round(rng.uniform(5, 120), 2)),
+        "restock_books (100)": lambda: db_tools.restock_books([{"isbn": isbn(), "qty": 5} for _ in range(100)]),
+        "update_prices (100)": lambda: db_tools.update_prices([{"isbn": isbn(), "price": 9.99} for _ in range(100)]),
+        "set_low_stock_threshold": lambda: db_tools.set_low_stock_threshold(isbn(), rng.randint(0, 10)),
+        "load_history": lambda: db_tools.load_history(session()),
+        "load_history (page)": lambda: db_tools.load_history(session(), limit=10),
+        "save_message": lambda: db_tools.save_message(session(), "user", "benchmark message"),
+        "count_messages": lambda: db_tools.count_messages(session()),
+        "load_summary": lambda: db_tools.load_summary(session()),
+        "save_summary": lambda: db_tools.save_summary(session(), "benchmark summary", 10),
+        "record_tool_calls (50)": lambda: db_tools.record_tool_calls([trace] * 50),
+        "slowest_tool_calls": lambda: db_tools.slowest_tool_calls(session()),
+        "data_versions": db_tools.data_versions,
+        "store_cached_response": lambda: db_tools.store_cached_response(
+            cache_key(), "benchmark prompt", "benchmark answer", ["find_books_tool"], versions, 50),
+        "lookup_cached_response": lambda: db_tools.lookup_cached_response(cache_key()),
+        "touch_cached_response": lambda: db_tools.touch_cached_response(cache_key()),
+        "delete_cached_response": lambda: db_tools.delete_cached_response(cache_key()),
+    }
+
+
+def _suite_worker(args) -> Dict:
+    """Times every db_tools function against one dataset; runs in its own process."""
+    path, repeat, seed = args
+    os.environ["LIBRARY_DB_PATH"] = path
+    import db_tools
+    from migrations import apply_migrations
+    apply_migrations()  # Datasets generated by an older commit are brought up to date, like on server start
+
+    with sqlite3.connect(path) as conn:
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("books", "customers", "orders")}
+        counts["sessions"] = conn.execute("SELECT COUNT(DISTINCT session_id) FROM messages").fetchone()[0]
+
+    rng = random.Random(seed)
+    results = {}
+    for name, call in _suite_calls(db_tools, rng, counts).items():
+        call()  # Warm up the pool and page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = call()
+            samples.append((time.perf_counter() - start) * 1000)
+            if result.get("status") == "Error" and "not found" not in result.get("message", ""):
+                raise RuntimeError(f"{name}: {result['message']}")
+        samples.sort()
+        results[name] = {
+            "median_ms": round(statistics.median(samples), 4),
+            "p95_ms": round(percentile(samples, 95), 4),
+            "mean_ms": round(statistics.fmean(samples), 4),
+        }
+    db_tools.WRITER.close()
+    db_tools.POOL.close_all()
+    return results
+
+
+def bench_suite(args) -> int:
+    """
+    Times every db_tools function at each --scales book count (customers,
+    orders and messages scale along, see datagen.default_counts). Generated
+    datasets are kept in --data-dir and copied before each run, so repeated
+    runs and runs on different commits measure the same data.
+    """
+    from datagen import generate_dataset
+
+    scales = [int(float(scale)) for scale in args.scales.split(",")]
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="library_suite_")
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    report = {"commit": commit, "created": datetime.now().isoformat(timespec="seconds"),
+              "repeat": args.repeat, "results": {}}
+
+    for scale in scales:
+        dataset = os.path.join(data_dir, f"library_{scale}.db")
+        if not os.path.exists(dataset):
+            generated = generate_dataset(dataset, scale)
+            if generated["status"] != "Success":
+                print(generated["message"])
+                return 1
+            print(f"generated {scale} books in {generated['seconds']}s -> {dataset}")
+        work_copy = os.path.join(tempfile.mkdtemp(prefix="library_suite_run_"), "library_desk.db")
+        shutil.copyfile(dataset, work_copy)
+
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(1) as pool:
+            report["results"][str(scale)] = pool.apply(_suite_worker, ((work_copy, args.repeat, 42),))
+        shutil.rmtree(os.path.dirname(work_copy), ignore_errors=True)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"baseline: {baseline.get('commit')} ({baseline.get('created')})")
+
+    header = "".join(f"{f'{scale:.0e} books':>24}" for scale in scales)
+    print(f"{'median ms (p95)':<26}{header}")
+    for name in next(iter(report["results"].values())):
+        cells = []
+        for scale in scales:
+            row = report["results"][str(scale)][name]
+            cell = f"{row['median_ms']:.3f} ({row['p95_ms']:.3f})"
+            base = baseline.get("results", {}).get(str(scale), {}).get(name)
+            if base and base["median_ms"]:
+                cell += f" {(row['median_ms'] / base['median_ms'] - 1) * 100:+.0f}%"
+            cells.append(f"{cell:>24}")
+        print(f"{name:<26}{''.join(cells)}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.report}")
+    return 0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Starts `uvicorn main:app --workers N` and waits until it answers."""
+    import httpx
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited on startup: {server.stderr.read().decode()[-2000:]}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start within 60s.")
+
+
+def _workers_client(args) -> Dict:
+    """One load-generating process of the workers scenario (see loadtest.run_load)."""
+    url, concurrency, requests, seed = args
+    import httpx
+    from loadtest import run_load
+
+    async def run() -> Dict:
+        # No keep-alive: a kept connection stays with the worker that accepted it,
+        # so a new connection per request is what spreads load across workers
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+        async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+            return await run_load(client, concurrency, requests, 0.0, seed)
+
+    return asyncio.run(run())
+
+
+def bench_workers(args) -> int:
+    """
+    /chat throughput of 1..N uvicorn worker processes sharing one database, with
+    the scripted LLM. Fast path, response cache and result cache are off, so
+    every request runs the agent loop and its tools against SQLite. The stub
+    LLM sleeps without blocking the event loop, like a real API client, so one
+    worker already overlaps many calls and extra workers only help as far as
+    the server's own CPU work (agent loop, tools, SQLite, JSON) finds free
+    cores; compare the numbers with the CPU count printed next to them.
+
+    --llm-mode blocking makes every LLM call hold its worker instead. One
+    process then serves one call at a time and N workers give about N times
+    the throughput by construction, whatever the core count: it shows how the
+    server spreads requests, not its capacity.
+    """
+    latency = args.llm_latency if args.llm_latency is not None else 0.02
+    path = build_temp_db()
+    url_port = _free_port()
+    base = None
+    failures = 0
+    cpus = os.cpu_count()
+    print(f"llm={args.llm_mode} latency={latency}s requests={args.requests} "
+          f"clients={args.clients}x{args.concurrency} cpus={cpus}")
+    if args.llm_mode == "blocking":
+        print("note: blocking stub LLM; speedup reflects parallel waiting, not server capacity")
+    for workers in (int(w) for w in args.workers.split(",")):
+        env = dict(os.environ, LIBRARY_DB_PATH=path, LLM_PROVIDER="fake", FAKE_LLM_LATENCY=str(latency),
+                   FAKE_LLM_BLOCKING="1" if args.llm_mode == "blocking" else "0",
+                   FAST_PATH_ENABLED="0", RESPONSE_CACHE_ENABLED="0", RESULT_CACHE_SIZE="0",
+                   WEB_CONCURRENCY=str(workers))
+        server = _start_server(workers, url_port, env)
+        try:
+            share = args.requests // args.clients
+            jobs = [(f"http://127.0.0.1:{url_port}", args.concurrency, share, workers * 1000 + i)
+                    for i in range(args.clients)]
+            wall_start = time.perf_counter()
+            with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+                reports = pool.map(_workers_client, jobs)
+            wall = time.perf_counter() - wall_start
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        errors = sum(report["chat"]["errors"] for report in reports)
+        done = sum(report["chat"]["requests"] for report in reports) - errors
+        throughput = done / wall
+        base = base or throughput / workers
+        speedup = throughput / base
+        failures += errors
+        p50 = statistics.median(report["chat"]["p50_ms"] for report in reports)
+        p95 = max(report["chat"]["p95_ms"] for report in reports)
+        print(f"workers={workers:<3} cpus={cpus:<3} req/s={throughput:8.1f}  speedup={speedup:5.2f}x  "
+              f"efficiency={speedup / workers:6.1%}  p50={p50:.1f}ms p95={p95:.1f}ms errors={errors}")
+    return 1 if failures else 0
+
+
+SCENARIOS = {
+    "pool": bench_pool,
+    "stress": bench_stress,
+    "plans": bench_plans,
+    "chat": bench_chat,
+    "context": bench_context,
+    "orders": bench_orders,
+    "oversell": bench_oversell,
+    "suite": bench_suite,
+    "workers": bench_workers,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Library Desk Agent DB benchmarks")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes (oversell)")
+    parser.add_argument("--calls", type=int, default=200, help="Calls per thread")
+    parser.add_argument("--sessions", default="1,10,100", help="Comma-separated concurrent session counts (chat)")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session (chat)")
+    parser.add_argument("--llm-latency", type=float, default=None,
+                        help="Stub LLM seconds per call (chat, context: 0.2, workers: 0.02)")
+    parser.add_argument("--llm-input-latency", type=float, default=0.02,
+                        help="Stub LLM seconds per 1000 prompt tokens (context)")
+    parser.add_argument("--llm-mode", choices=["async", "blocking"], default="async",
+                        help="Whether the stub LLM blocks its worker's event loop (workers; blocking "
+                             "scales with workers by construction)")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated server worker counts (workers)")
+    parser.add_argument("--clients", type=int, default=2, help="Load-generating processes (workers)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users per client process (workers)")
+    parser.add_argument("--requests", type=int, default=400, help="Total /chat requests per worker count (workers)")
+    parser.add_argument("--scales", default="1e3,1e4,1e5", help="Comma-separated book counts (suite)")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per function (suite)")
+    parser.add_argument("--data-dir", help="Where generated datasets are kept between runs (suite)")
+    parser.add_argument("--report", help="Write the suite results as JSON")
+    parser.add_argument("--baseline", help="Earlier --report JSON to compare against (suite)")
+    args = parser.parse_args()
+    sys.exit(SCENARIOS[args.scenario](args))
@@ -0,0 +1,99 @@
+# /server/context_window.py
+
+from typing import Any, List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from db_tools import aload_summary, asave_summary
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a library desk conversation. Merge the "
+    "existing summary with the new messages into one short factual paragraph. "
+    "Keep ISBNs, order IDs, customer IDs, quantities and prices exactly; drop "
+    "small talk. Output only the summary."
+)
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)."""
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+class ContextWindow:
+    """
+    Bounds the history sent to the LLM on every agent iteration.
+
+    The last `keep_turns` user/assistant turns are sent verbatim, trimmed
+    further if they would exceed `token_budget`. Everything older is folded
+    into a rolling summary that is persisted in session_summaries and sent as
+    a leading SystemMessage (LibraryAgent merges it into its system prompt).
+    Folding happens in batches of `fold_turns` so the summarizer does not run
+    on every turn.
+    """
+
+    def __init__(self, llm: Any = None, keep_turns: int = 6, token_budget: int = 6000,
+                 summary_max_tokens: int = 500, fold_turns: int = 4):
+        """
+        :param llm: Chat model used to summarize; without one, older turns are condensed by truncation.
+        """
+        self.llm = llm
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.fold_turns = fold_turns
+
+    def window_start(self, history: List[BaseMessage]) -> int:
+        """Index of the first message that is kept verbatim."""
+        start = max(len(history) - 2 * self.keep_turns, 0)
+        budget = self.token_budget - self.summary_max_tokens
+        used = estimate_tokens(history[start:])
+        # Always keep at least the last message, even if it alone is over budget
+        while used > budget and start < len(history) - 1:
+            used -= estimate_tokens(history[start:start + 1])
+            start += 1
+        return start
+
+    async def prepare(self, session_id: str, history: List[BaseMessage]) -> List[BaseMessage]:
+        """Returns the messages to pass to the agent as chat_history for this turn."""
+        start = self.window_start(history)
+        if start == 0:
+            return history
+
+        record = await aload_summary(session_id)
+        summary = record.get("summary", "") if record["status"] == "Success" else ""
+        covered = min(record.get("covered_messages", 0), len(history)) if record["status"] == "Success" else 0
+
+        unsummarized = history[covered:start]
+        over_budget = estimate_tokens(history[covered:]) > self.token_budget - self.summary_max_tokens
+        if unsummarized and (len(unsummarized) >= 2 * self.fold_turns or over_budget):
+            summary = await self.summarize(summary, unsummarized)
+            covered = start
+            await asave_summary(session_id, summary, covered)
+
+        window = history[max(covered, 0):]
+        if not summary:
+            return window
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + window
+
+    async def summarize(self, summary: str, messages: List[BaseMessage]) -> str:
+        """Folds messages into the existing summary, capped at summary_max_tokens."""
+        transcript = "\n".join(
+            f"{'User' if isinstance(message, HumanMessage) else 'Agent'}: {message.content}"
+            for message in messages
+        )
+        max_chars = self.summary_max_tokens * 4
+
+        if self.llm is not None:
+            try:
+                response = await self.llm.ainvoke([
+                    SystemMessage(content=SUMMARY_PROMPT),
+                    HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+                ])
+                if isinstance(response.content, str) and response.content.strip():
+                    return response.content.strip()[:max_chars]
+            except Exception as e:
+                print(f"[Context] Summarization failed, falling back to truncation: {e}")
+
+        # Fallback: keep the most recent part of the combined text
+        combined = f"{summary}\n{transcript}".strip()
+        return combined[-max_chars:]
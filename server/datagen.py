@@ -0,0 +1,177 @@
+# /server/datagen.py
+#
+# Reproducible synthetic data for benchmarks. Builds a fresh database from
+# db/schema.sql, bulk-loads generated rows, then applies the migrations so the
+# FTS index and secondary indexes are built once over the finished tables.
+#
+#   python datagen.py /tmp/library_1e5.db --books 100000
+#   python datagen.py /tmp/big.db --books 1000000 --customers 50000 --orders 200000 --messages 1000000
+#
+# The same counts and --seed always produce the same database.
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db")
+
+WORDS = (
+    "code clean design patterns data science pragmatic programmer refactoring architecture "
+    "systems distributed algorithms structure interpretation computer programs phoenix project "
+    "mythical month practice theory modern classic guide handbook art craft introduction advanced "
+    "python java rust databases networks security testing agile lean domain driven models cloud "
+    "machine learning deep statistics history future secrets lessons principles essential"
+).split()
+FIRST_NAMES = "Andrew Robert Martin Eric Gene Foster Harold Steve Erich Frederick Dareen Lina Omar Rania Faisal".split()
+LAST_NAMES = "Hunt Fowler Freeman Gamma Kim Provost Abelson McConnell Brooks Martin Mattar Hadid Qasem Youssef".split()
+
+CHUNK = 50000
+START_TIME = datetime(2024, 1, 1)
+
+
+def make_isbn(n: int) -> str:
+    """ISBN-13 with a valid check digit, hyphenated like the seed data ('978-0201485677')."""
+    body = f"978{n:09d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(body))
+    return f"978-{body[3:]}{(10 - total % 10) % 10}"
+
+
+def default_counts(books: int) -> Dict[str, int]:
+    """Counts for the other tables, scaled from the number of books."""
+    return {
+        "books": books,
+        "customers": max(books // 10, 10),
+        "orders": max(books // 2, 10),
+        "messages": books,
+    }
+
+
+def _books(rng: random.Random, count: int) -> Iterator[tuple]:
+    for n in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        # ~2% of titles are low on stock, so inventory_summary has real work to do
+        stock = rng.randint(0, 5) if rng.random() < 0.02 else rng.randint(6, 200)
+        yield make_isbn(n), title, author, stock, round(rng.uniform(5, 120), 2)
+
+
+def _customers(count: int) -> Iterator[tuple]:
+    for n in range(1, count + 1):
+        yield n, f"Customer {n}", f"customer{n}@example.com"
+
+
+def _orders(rng: random.Random, count: int, customers: int) -> Iterator[tuple]:
+    for n in range(1, count + 1):
+        yield n, rng.randint(1, customers), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00"
+
+
+def _order_items(rng: random.Random, orders: int, books: int) -> Iterator[tuple]:
+    for order_id in range(1, orders + 1):
+        for n in rng.sample(range(books), min(rng.randint(1, 3), books)):
+            yield order_id, make_isbn(n), rng.randint(1, 3), round(rng.uniform(5, 120), 2)
+
+
+def _messages(rng: random.Random, count: int, sessions: int) -> Iterator[tuple]:
+    for n in range(count):
+        role = "user" if n % 2 == 0 else "assistant"
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+        created_at = (START_TIME + timedelta(seconds=n)).strftime("%Y-%m-%d %H:%M:%S")
+        yield f"session-{n % sessions}", role, content, created_at
+
+
+def _tool_calls(rng: random.Random, count: int, sessions: int) -> Iterator[tuple]:
+    names = ["find_books_tool", "order_status_tool", "inventory_summary_tool", "restock_book_tool"]
+    for n in range(count):
+        args_json = json.dumps({"q": rng.choice(WORDS)})
+        result_json = json.dumps({"status": "Success"})
+        yield (f"session-{n % sessions}", rng.choice(names), args_json, result_json,
+               round(rng.expovariate(1 / 5), 3), "Success", len(args_json), len(result_json))
+
+
+def _load(conn: sqlite3.Connection, sql: str, rows: Iterator[tuple]) -> None:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            conn.executemany(sql, chunk)
+            chunk = []
+    if chunk:
+        conn.executemany(sql, chunk)
+    conn.commit()
+
+
+def generate_dataset(path: str, books: int, customers: int = None, orders: int = None,
+                     messages: int = None, seed: int = 42) -> Dict:
+    """
+    Creates a database at `path` filled with synthetic rows. Counts left as None
+    are scaled from `books` (see default_counts). Messages are spread over
+    sessions of ~20 messages; 'session-0' always exists.
+
+    :return: Dictionary with status, the counts used and how long generation took.
+    """
+    counts = default_counts(books)
+    for key, value in (("customers", customers), ("orders", orders), ("messages", messages)):
+        if value is not None:
+            counts[key] = value
+    sessions = max(counts["messages"] // 20, 1)
+    rng = random.Random(seed)
+
+    if os.path.exists(path):
+        os.remove(path)
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        with open(os.path.join(DB_DIR, "schema.sql")) as f:
+            conn.executescript(f.read())
+        # Nothing to protect while the file is being built from scratch
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+
+        _load(conn, "INSERT INTO books (isbn, title, author, stock, price) VALUES (?, ?, ?, ?, ?)",
+              _books(rng, counts["books"]))
+        _load(conn, "INSERT INTO customers (id, name, email) VALUES (?, ?, ?)", _customers(counts["customers"]))
+        _load(conn, "INSERT INTO orders (id, customer_id, order_date) VALUES (?, ?, ?)",
+              _orders(rng, counts["orders"], counts["customers"]))
+        _load(conn, "INSERT INTO order_items (order_id, isbn, qty, price_at_order) VALUES (?, ?, ?, ?)",
+              _order_items(rng, counts["orders"], counts["books"]))
+        _load(conn, "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+              _messages(rng, counts["messages"], sessions))
+
+        conn.execute("PRAGMA journal_mode = DELETE")
+        from migrations import apply_migrations
+        migrated = apply_migrations(conn)
+        if migrated["status"] != "Success":
+            return migrated
+
+        _load(conn, """INSERT INTO tool_calls (session_id, name, args_json, result_json, duration_ms, status,
+                       args_bytes, result_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+              _tool_calls(rng, counts["messages"] // 2, sessions))
+        conn.commit()
+    except (OSError, sqlite3.Error) as e:
+        return {"status": "Error", "message": f"Error during generate_dataset: {e}"}
+    finally:
+        conn.close()
+
+    return {"status": "Success", "path": path, "counts": counts, "sessions": sessions,
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Library Desk database")
+    parser.add_argument("path")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--messages", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    result = generate_dataset(args.path, args.books, args.customers, args.orders, args.messages, args.seed)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["status"] == "Success" else 1)
@@ -0,0 +1,262 @@
+# /server/db_pool.py
+
+import asyncio
+import contextvars
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Connections are created lazily up to `size`, handed out with acquire() and
+    returned with release(). A cheap health check runs on every checkout so a
+    broken connection is replaced instead of being handed to a tool.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], size: int = 8, timeout: float = 10.0,
+                 observer: Optional[Callable[[float], None]] = None):
+        """
+        :param factory: Callable that opens a new, fully configured connection.
+        :param size: Maximum number of open connections.
+        :param timeout: Seconds to wait for a free connection before giving up.
+        :param observer: Called on release with the seconds the connection was checked out.
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)  # LIFO keeps the hottest connections in use
+        self._created = 0
+        self._lock = threading.Lock()
+        self.observer = observer
+        self._checked_out: Dict[int, float] = {}
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """Checks out a healthy connection, opening a new one if the pool is not full."""
+        start = time.perf_counter()
+        conn = self._checkout()
+        if self.observer is not None:
+            self._checked_out[id(conn)] = start
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self.factory()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"Connection pool exhausted: no connection free after {self.timeout}s."
+                    )
+
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        start = self._checked_out.pop(id(conn), None)
+        if start is not None and self.observer is not None:
+            self.observer(time.perf_counter() - start)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    def close_all(self) -> None:
+        """Closes every idle connection (used on shutdown and in benchmarks)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._created, "idle": self._idle.qsize()}
+
+
+class SerialWriter:
+    """
+    Funnels every database write through one dedicated thread and connection.
+
+    SQLite only ever allows one writer, so instead of letting request threads
+    race for the write lock (and fail with "database is locked"), writes are
+    queued and applied in submission order. Combined with WAL, readers on the
+    ConnectionPool never wait on them.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], name: str = "db-writer",
+                 observer: Optional[Callable[[float], None]] = None):
+        """
+        :param observer: Called with the seconds each submitted write took, queue wait included.
+        """
+        self.factory = factory
+        self.name = name
+        self.observer = observer
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs fn(conn, *args, **kwargs) on the writer thread and blocks for its result.
+        Exceptions raised by fn are re-raised in the caller.
+        """
+        if threading.current_thread() is self._thread:
+            # Nested write from inside a job: run inline to avoid deadlocking the queue.
+            return fn(self._conn, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self._enqueue(fn, args, kwargs).result()
+        finally:
+            self._observe(start)
+
+    async def submit_async(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Like submit(), but awaits the result instead of blocking the calling thread."""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self._enqueue(fn, args, kwargs))
+        finally:
+            self._observe(start)
+
+    def _observe(self, start: float) -> None:
+        # Runs in the submitting thread/task, so the observer sees the caller's context
+        if self.observer is not None:
+            self.observer(time.perf_counter() - start)
+
+    def _enqueue(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        # The job runs in the submitter's context, so contextvars (e.g. the current trace span) carry over
+        self._jobs.put((future, contextvars.copy_context(), fn, args, kwargs))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, context, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self._conn is None or not ConnectionPool._is_healthy(self._conn):
+                    self._conn = self.factory()
+                result = context.run(fn, self._conn, *args, **kwargs)
+                if self._conn.in_transaction:
+                    # A job must commit its own work; never leak a half-done transaction.
+                    self._conn.rollback()
+                future.set_result(result)
+            except BaseException as e:
+                if self._conn is not None and self._conn.in_transaction:
+                    self._conn.rollback()
+                future.set_exception(e)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def pending(self) -> int:
+        return self._jobs.qsize()
+
+    def close(self) -> None:
+        """Stops the writer thread after draining queued writes."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._jobs.put(None)
+            thread.join()
+
+
+class LockStats:
+    """Counters for how long write transactions waited to take the SQLite write lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def begin_immediate(self, conn: sqlite3.Connection) -> None:
+        """
+        Starts a write transaction with BEGIN IMMEDIATE, taking the write lock up
+        front so every read inside the transaction sees data no other
+        connection can change before commit. Waits up to the connection's
+        busy_timeout and records the wait.
+        """
+        start = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        waited_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_ms += waited_ms
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+            if waited_ms > 1.0:
+                self.contended += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "contended": self.contended,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_ms / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
@@ -1,106 +1,316 @@
 # /server/db_tools.py
 
+import asyncio
+import functools
+import multiprocessing
+import os
+import re
 import sqlite3
 import json
-from typing import List, Dict, Union
+import time
+from typing import Any, List, Dict, Union
+
+from db_pool import ConnectionPool, LockStats, SerialWriter
+from metrics import record_db
+from result_cache import ResultCache
+import tracing
 
 # '../db/library_desk.db' should correctly point up one directory and into 'db'.
-DB_PATH = '../db/library_desk.db'
+DB_PATH = os.getenv("LIBRARY_DB_PATH", '../db/library_desk.db')
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+FIND_BOOKS_LIMIT = 50
+HISTORY_MAX_PAGE = int(os.getenv("HISTORY_MAX_PAGE", "500"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+# UPDATE ... FROM needs SQLite 3.33; older libraries decrement stock row by row
+SQLITE_UPDATE_FROM = sqlite3.sqlite_version_info >= (3, 33, 0)
+# Low-stock threshold of titles that have no threshold of their own (migration 6 default)
+DEFAULT_LOW_STOCK_THRESHOLD = 5
+# Where the in-process history cache learns about messages saved by other processes:
+#   process - it doesn't; only valid when a single process serves the database
+#   sqlite  - cached histories are checked against SQLite before use
+# Defaults to sqlite whenever more than one server worker may be running. (Cached
+# find_books / inventory_summary results are always checked against data_versions.)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# `uvicorn main:app --workers N` leaves WEB_CONCURRENCY unset, but starts every
+# worker as a multiprocessing child, so a process with a parent counts as one of several
+MULTI_PROCESS = WEB_CONCURRENCY > 1 or multiprocessing.parent_process() is not None
+SHARED_STATE = os.getenv("SHARED_STATE", "sqlite" if MULTI_PROCESS else "process")
+
+# Per-connection tuning applied to every connection we open.
+SQLITE_PRAGMAS = {
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": "NORMAL",  # Safe with WAL; only the last commit can be lost on power failure
+    "cache_size": -int(os.getenv("DB_CACHE_SIZE_KB", "20000")),  # Negative = KiB rather than pages
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
 
 def connect_db():
     """Returns a connection object to the database."""
-    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-    conn.row_factory = sqlite3.Row # Allows accessing columns by name
+    # Pooled connections are shared across FastAPI worker threads, one thread at a time.
+    # With tracing on, every statement becomes a span under the current request's trace.
+    factory = tracing.TracedConnection if tracing.ENABLED else sqlite3.Connection
+    with tracing.span("db.connect", {"db.system": "sqlite"}, require_parent=True):
+        conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                               factory=factory)
+        conn.row_factory = sqlite3.Row # Allows accessing columns by name
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
     return conn
 
+def configure_database() -> Dict:
+    """
+    Startup-time database configuration. Switches the database file to WAL so
+    readers never block on the writer; the journal mode is persistent, so this
+    only has to succeed once per file.
+    """
+    conn = connect_db()
+    try:
+        journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        return {"status": "Success", "journal_mode": journal_mode, "pragmas": SQLITE_PRAGMAS}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during configure_database: {e}"}
+    finally:
+        conn.close()
+
+# Long-lived connections reused by every read instead of connecting per call.
+# Checkout and write times feed the per-request DB time in metrics.py.
+POOL = ConnectionPool(connect_db, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                      observer=functools.partial(record_db, "read"))
+# All writes are applied, in order, by this single writer thread.
+WRITER = SerialWriter(connect_db, observer=functools.partial(record_db, "write"))
+# Stock and price writes take the write lock up front (BEGIN IMMEDIATE), so their
+# read-check-write is atomic even against other processes sharing the file.
+LOCK_STATS = LockStats()
+
+# Read-through cache for find_books and inventory_summary. Entries are tagged
+# with what they depend on and dropped by the writes that touch it:
+#   book:<isbn>  - a specific book's stock or price (in find_books results)
+#   stock        - any stock level (inventory totals and low-stock list)
+#   catalog      - books added, removed or renamed (which books match at all)
+RESULT_CACHE = ResultCache(max_entries=RESULT_CACHE_SIZE)
+STOCK_TAG = "stock"
+CATALOG_TAG = "catalog"
+
+def book_tag(isbn: str) -> str:
+    return f"book:{isbn}"
+
+def _sync_result_cache() -> None:
+    """Drops cached results if another process changed books since the last read (one single-row SELECT)."""
+    result = data_versions()
+    if result["status"] == "Success":
+        RESULT_CACHE.sync(result["versions"].get("books"))
+
+def _books_version(conn: sqlite3.Connection) -> Union[int, None]:
+    """The books change counter as seen inside conn's transaction; None before migration 7."""
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE name = 'books'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def _commit_books_write(conn: sqlite3.Connection, version_before: Union[int, None], *tags: str) -> None:
+    """
+    Commits a write to books and drops the cached results it touched. The write
+    holds the write lock, so the counter moved from version_before only because
+    of it, and the result cache can stay in sync instead of clearing everything.
+    """
+    version_after = _books_version(conn)
+    conn.commit()
+    RESULT_CACHE.invalidate(*tags)
+    RESULT_CACHE.advance(version_before, version_after)
+
 # --- TOOL IMPLEMENTATIONS ---
 
-def find_books(q: str, by: str = "title") -> Dict:
+def _fts_query(q: str, column: str) -> Union[str, None]:
+    """
+    Turns free text into an FTS5 MATCH expression: every token must match, and
+    each token is a prefix ('clean cod' finds 'Clean Code'). Tokens are quoted
+    so user input can never inject FTS5 operators.
+    """
+    tokens = re.findall(r"\w+", q)
+    if not tokens:
+        return None
+    return f"{column} : (" + " ".join(f'"{token}"*' for token in tokens) + ")"
+
+
+def find_books(q: str, by: str = "title", limit: int = FIND_BOOKS_LIMIT) -> Dict:
     """
     Finds books by title or author based on the search query.
 
+    Uses the books_fts full-text index (ranked by bm25, multi-token, prefix
+    matching) when it exists, and falls back to a LIKE scan on databases that
+    have not been migrated yet.
+
     :param q: The search query (title or author keywords).
     :param by: The field to search by ('title' or 'author').
-    :return: Dictionary containing status and a list of matching books.
+    :param limit: Maximum number of books to return.
+    :return: Dictionary containing status, a list of matching books, the total number
+             of matches and whether the list was truncated to `limit`.
     """
-    conn = connect_db()
-    cursor = conn.cursor()
-    
     # Input validation and sanitation for the column name
     column = "title" if by.lower() == "title" else "author"
+
+    key = ("find_books", " ".join(q.lower().split()), column, limit)
+    _sync_result_cache()
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    generation = RESULT_CACHE.generation
+    result = _search_books(q, column, limit)
+    if result["status"] != "Error":
+        tags = [CATALOG_TAG] + [book_tag(book["isbn"]) for book in result["books"]]
+        RESULT_CACHE.put(key, result, tags, generation)
+    return result
+
+
+def _search_books(q: str, column: str, limit: int) -> Dict:
+    """
+    Uncached find_books query. One row past `limit` is fetched to tell whether
+    the list was cut off; only then are all matches counted for `total`.
+    """
+    conn = POOL.acquire()
+    cursor = conn.cursor()
     
     try:
-        query = f"SELECT isbn, title, author, stock, price FROM books WHERE {column} LIKE ?"
-        results = cursor.execute(query, (f'%{q}%',)).fetchall()
+        results = None
+        match = _fts_query(q, column)
+        if match is not None:
+            fts_query = """
+            SELECT b.isbn, b.title, b.author, b.stock, b.price
+            FROM books_fts f
+            JOIN book_search_keys k ON k.id = f.rowid
+            JOIN books b ON b.isbn = k.isbn
+            WHERE books_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+            """
+            count_query = "SELECT COUNT(*) FROM books_fts WHERE books_fts MATCH ?"
+            count_params = (match,)
+            try:
+                results = cursor.execute(fts_query, (match, limit + 1)).fetchall()
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+
+        if results is None:
+            query = f"SELECT isbn, title, author, stock, price FROM books WHERE {column} LIKE ? LIMIT ?"
+            count_query = f"SELECT COUNT(*) FROM books WHERE {column} LIKE ?"
+            count_params = (f'%{q}%',)
+            results = cursor.execute(query, (f'%{q}%', limit + 1)).fetchall()
+
+        truncated = len(results) > limit
+        total = cursor.execute(count_query, count_params).fetchone()[0] if truncated else len(results)
         
         # Convert list of Row objects to list of dicts
-        book_list = [dict(row) for row in results]
+        book_list = [dict(row) for row in results[:limit]]
         
         if not book_list:
-            return {"status": "Found", "message": f"No books found matching '{q}' by {column}.", "books": []}
+            return {"status": "Found", "message": f"No books found matching '{q}' by {column}.", "books": [],
+                    "total": 0, "truncated": False}
 
-        return {"status": "Success", "message": f"Found {len(book_list)} book(s).", "books": book_list}
+        message = f"Found {total} book(s)."
+        if truncated:
+            message = f"Found {total} books; showing the first {len(book_list)}. Refine the search to see the rest."
+        return {"status": "Success", "message": message, "books": book_list, "total": total, "truncated": truncated}
         
     except sqlite3.Error as e:
         return {"status": "Error", "message": f"Database error during find_books: {e}"}
         
     finally:
-        conn.close()
+        POOL.release(conn)
 
 
 def create_order(customer_id: int, items: List[Dict[str, Union[str, int]]]) -> Dict:
     """
     Creates a new order, adds items, and crucially, reduces book stock.
     This function uses a transaction to ensure all steps complete successfully.
+    All lines are validated and applied as sets (one lookup, one executemany
+    insert, one conditional stock UPDATE), so cost barely grows with order size.
+    On SQLite older than 3.33 (no UPDATE ... FROM) stock is decremented row by row.
 
     :param customer_id: ID of the customer.
     :param items: List of items: [{'isbn': str, 'qty': int}].
     :return: Dictionary with new order_id, status, and updated stock details.
     """
-    conn = connect_db()
+    return WRITER.submit(_create_order, customer_id, items)
+
+
+def _create_order(conn: sqlite3.Connection, customer_id: int, items: List[Dict[str, Union[str, int]]]) -> Dict:
+    # A zero or negative line would pass the stock checks below and add stock instead
+    for item in items:
+        qty = item.get('qty')
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty <= 0:
+            return {"status": "Error",
+                    "message": f"Invalid quantity {qty!r} for ISBN {item.get('isbn')}; qty must be a positive integer."}
+
     cursor = conn.cursor()
-    
+
     try:
+        # 0. Reserve the write lock before reading anything we will decide on
+        LOCK_STATS.begin_immediate(conn)
+        version_before = _books_version(conn)
+
         # 1. Check Customer Exists
         cursor.execute("SELECT id FROM customers WHERE id = ?", (customer_id,))
         if cursor.fetchone() is None:
             raise Exception(f"Customer ID {customer_id} not found.")
 
-        # 2. Create the main Order record
-        cursor.execute("INSERT INTO orders (customer_id) VALUES (?)", (customer_id,))
-        order_id = cursor.lastrowid
-        
-        updated_stock = []
-        
-        # 3. Process each item (Check stock, reduce stock, record order_item)
+        # 2. Merge repeated ISBNs so each book is one line (and one order_items row)
+        quantities: Dict[str, int] = {}
         for item in items:
-            isbn = item['isbn']
-            qty = item['qty']
-            
-            cursor.execute("SELECT stock, price, title FROM books WHERE isbn = ?", (isbn,))
-            book_info = cursor.fetchone()
-            
+            quantities[item['isbn']] = quantities.get(item['isbn'], 0) + item['qty']
+        lines_json = json.dumps([{"isbn": isbn, "qty": qty} for isbn, qty in quantities.items()])
+
+        # 3. Fetch every requested book in one query and validate stock in memory
+        books_query = "SELECT isbn, stock, price, title FROM books WHERE isbn IN (SELECT value FROM json_each(?))"
+        isbns_json = json.dumps(list(quantities))
+        books = {row['isbn']: row for row in cursor.execute(books_query, (isbns_json,)).fetchall()}
+
+        for isbn, qty in quantities.items():
+            book_info = books.get(isbn)
             if book_info is None:
                 raise Exception(f"Book with ISBN {isbn} not found.")
-            
-            current_stock, price, title = book_info
-            
-            if current_stock < qty:
-                raise Exception(f"Insufficient stock for {title} (ISBN {isbn}). Requested: {qty}, Available: {current_stock}.")
-                
-            # Insert into order_items
-            cursor.execute(
-                "INSERT INTO order_items (order_id, isbn, qty, price_at_order) VALUES (?, ?, ?, ?)",
-                (order_id, isbn, qty, price)
+            if book_info['stock'] < qty:
+                raise Exception(f"Insufficient stock for {book_info['title']} (ISBN {isbn}). Requested: {qty}, Available: {book_info['stock']}.")
+
+        # 4. Create the main Order record and all order_items rows
+        cursor.execute("INSERT INTO orders (customer_id) VALUES (?)", (customer_id,))
+        order_id = cursor.lastrowid
+
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, isbn, qty, price_at_order) VALUES (?, ?, ?, ?)",
+            [(order_id, isbn, qty, books[isbn]['price']) for isbn, qty in quantities.items()]
+        )
+
+        # 5. Decrement all stock levels with one conditional UPDATE; every line must apply
+        if SQLITE_UPDATE_FROM:
+            stock_update = """
+            UPDATE books SET stock = books.stock - lines.qty
+            FROM (
+                SELECT json_extract(value, '$.isbn') AS isbn, json_extract(value, '$.qty') AS qty
+                FROM json_each(?)
+            ) AS lines
+            WHERE books.isbn = lines.isbn AND books.stock >= lines.qty
+            """
+            cursor.execute(stock_update, (lines_json,))
+        else:
+            cursor.executemany(
+                "UPDATE books SET stock = stock - ? WHERE isbn = ? AND stock >= ?",
+                [(qty, isbn, qty) for isbn, qty in quantities.items()]
             )
+        if cursor.rowcount != len(quantities):
+            raise Exception("Stock changed while the order was being placed. No changes were made; please retry.")
+
+        updated_stock = [
+            {"isbn": isbn, "title": books[isbn]['title'], "new_stock": books[isbn]['stock'] - qty}
+            for isbn, qty in quantities.items()
+        ]
             
-            # Update stock in the books table
-            new_stock = current_stock - qty
-            cursor.execute("UPDATE books SET stock = ? WHERE isbn = ?", (new_stock, isbn))
-            updated_stock.append({"isbn": isbn, "title": title, "new_stock": new_stock})
-            
-        # 4. Commit Transaction (save all changes)
-        conn.commit()
+        # 6. Commit Transaction (save all changes)
+        _commit_books_write(conn, version_before, STOCK_TAG, *(book_tag(isbn) for isbn in quantities))
         return {
             "status": "Success", 
             "order_id": order_id, 
@@ -111,60 +321,198 @@ def create_order(customer_id: int, items: List[Dict[str, Union[str, int]]]) -> D
     except Exception as e:
         conn.rollback() # If any error occurs, undo everything
         return {"status": "Error", "message": str(e)}
-        
-    finally:
-        conn.close()
 
 
 def restock_book(isbn: str, qty: int) -> Dict:
     """Restocks a book by adding the given quantity and returns the new stock level."""
-    conn = connect_db()
+    return WRITER.submit(_restock_book, isbn, qty)
+
+
+def _restock_book(conn: sqlite3.Connection, isbn: str, qty: int) -> Dict:
     cursor = conn.cursor()
     try:
+        LOCK_STATS.begin_immediate(conn)
+        version_before = _books_version(conn)
         cursor.execute("UPDATE books SET stock = stock + ? WHERE isbn = ?", (qty, isbn))
         
         if cursor.rowcount == 0:
-            conn.close()
             return {"status": "Error", "message": f"Book with ISBN {isbn} not found."}
         
         cursor.execute("SELECT title, stock FROM books WHERE isbn = ?", (isbn,))
         result = cursor.fetchone()
         
-        conn.commit()
+        _commit_books_write(conn, version_before, STOCK_TAG, book_tag(isbn))
         return {"status": "Success", "isbn": isbn, "title": result['title'], "new_stock": result['stock']}
     except sqlite3.Error as e:
         conn.rollback()
         return {"status": "Error", "message": f"Database error during restock_book: {e}"}
-    finally:
-        conn.close()
 
 
 def update_price(isbn: str, price: float) -> Dict:
     """Updates the price of a book."""
-    conn = connect_db()
+    return WRITER.submit(_update_price, isbn, price)
+
+
+def _update_price(conn: sqlite3.Connection, isbn: str, price: float) -> Dict:
     cursor = conn.cursor()
     try:
+        LOCK_STATS.begin_immediate(conn)
+        version_before = _books_version(conn)
         cursor.execute("UPDATE books SET price = ? WHERE isbn = ?", (price, isbn))
         
         if cursor.rowcount == 0:
-            conn.close()
             return {"status": "Error", "message": f"Book with ISBN {isbn} not found."}
 
         cursor.execute("SELECT title, price FROM books WHERE isbn = ?", (isbn,))
         result = cursor.fetchone()
         
-        conn.commit()
+        _commit_books_write(conn, version_before, book_tag(isbn))
         return {"status": "Success", "isbn": isbn, "title": result['title'], "new_price": round(result['price'], 2)}
     except sqlite3.Error as e:
         conn.rollback()
         return {"status": "Error", "message": f"Database error during update_price: {e}"}
+
+
+def restock_books(items: List[Dict[str, Union[str, int]]]) -> Dict:
+    """
+    Restocks many books in one transaction, e.g. a whole supplier delivery.
+    Valid lines are applied together; invalid ones are reported and skipped.
+
+    :param items: List of items: [{'isbn': str, 'qty': int}]. Repeated ISBNs are summed.
+    :return: Dictionary with per-ISBN results (new_stock or an error message) and applied/failed counts.
+    """
+    return WRITER.submit(_restock_books, items)
+
+
+def _restock_books(conn: sqlite3.Connection, items: List[Dict[str, Union[str, int]]]) -> Dict:
+    quantities: Dict[str, int] = {}
+    failed: Dict[str, str] = {}
+    for item in items:
+        isbn, qty = str(item.get('isbn')), item.get('qty')
+        if isbn in failed:
+            continue
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty <= 0:
+            failed[isbn] = f"Invalid quantity {qty!r}; qty must be a positive integer."
+            quantities.pop(isbn, None)
+        else:
+            quantities[isbn] = quantities.get(isbn, 0) + qty
+    return _apply_book_batch(conn, "restock_books", quantities, failed,
+                             "UPDATE books SET stock = stock + ? WHERE isbn = ?", "stock", "new_stock")
+
+
+def update_prices(items: List[Dict[str, Union[str, float]]]) -> Dict:
+    """
+    Updates the price of many books in one transaction.
+    Valid lines are applied together; invalid ones are reported and skipped.
+
+    :param items: List of items: [{'isbn': str, 'price': float}]. For a repeated ISBN the last price wins.
+    :return: Dictionary with per-ISBN results (new_price or an error message) and applied/failed counts.
+    """
+    return WRITER.submit(_update_prices, items)
+
+
+def _update_prices(conn: sqlite3.Connection, items: List[Dict[str, Union[str, float]]]) -> Dict:
+    prices: Dict[str, float] = {}
+    failed: Dict[str, str] = {}
+    for item in items:
+        isbn, price = str(item.get('isbn')), item.get('price')
+        if isbn in failed:
+            continue
+        if not isinstance(price, (int, float)) or isinstance(price, bool) or price < 0:
+            failed[isbn] = f"Invalid price {price!r}; price must be a non-negative number."
+            prices.pop(isbn, None)
+        else:
+            prices[isbn] = float(price)
+    return _apply_book_batch(conn, "update_prices", prices, failed,
+                             "UPDATE books SET price = ? WHERE isbn = ?", "price", "new_price")
+
+
+def _apply_book_batch(conn: sqlite3.Connection, name: str, values: Dict[str, Any], failed: Dict[str, str],
+                      update: str, column: str, result_key: str) -> Dict:
+    """
+    Shared body of the batch writers: one lookup for every ISBN, one executemany
+    UPDATE for the ones that exist, one read-back, one commit.
+    """
+    cursor = conn.cursor()
+    try:
+        LOCK_STATS.begin_immediate(conn)
+        version_before = _books_version(conn)
+
+        existing_query = "SELECT isbn FROM books WHERE isbn IN (SELECT value FROM json_each(?))"
+        existing = {row['isbn'] for row in cursor.execute(existing_query, (json.dumps(list(values)),))}
+        for isbn in values:
+            if isbn not in existing:
+                failed[isbn] = f"Book with ISBN {isbn} not found."
+        applied = {isbn: value for isbn, value in values.items() if isbn in existing}
+
+        cursor.executemany(update, [(value, isbn) for isbn, value in applied.items()])
+
+        updated_query = f"SELECT isbn, title, {column} FROM books WHERE isbn IN (SELECT value FROM json_each(?))"
+        updated = {row['isbn']: row for row in cursor.execute(updated_query, (json.dumps(list(applied)),))}
+
+        tags = [book_tag(isbn) for isbn in applied]
+        if applied and column == "stock":
+            tags.append(STOCK_TAG)
+        _commit_books_write(conn, version_before, *tags)
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during {name}: {e}"}
+
+    results = [
+        {"isbn": isbn, "status": "Success", "title": row['title'],
+         result_key: round(row[column], 2) if column == "price" else row[column]}
+        for isbn, row in updated.items()
+    ]
+    results += [{"isbn": isbn, "status": "Error", "message": message} for isbn, message in failed.items()]
+
+    result = {"status": "Success" if applied else "Error", "applied": len(applied), "failed": len(failed), "results": results}
+    if not applied:
+        result["message"] = "No items were applied."
+    return result
+
+
+def isbn_digits(isbn: str) -> str:
+    """An ISBN without hyphens or spaces, as compared by lookup_isbn."""
+    return isbn.upper().replace("-", "").replace(" ", "")
+
+
+def is_valid_isbn(isbn: str) -> bool:
+    """Checks the ISBN-10 or ISBN-13 check digit; hyphens and spaces are ignored."""
+    digits = isbn_digits(isbn)
+    if len(digits) == 13 and digits.isdigit():
+        total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+        return total % 10 == 0
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == "X"):
+        total = sum((10 - i) * (10 if d == "X" else int(d)) for i, d in enumerate(digits))
+        return total % 11 == 0
+    return False
+
+
+def lookup_isbn(isbn: str) -> Dict:
+    """
+    Finds the ISBN of a book as it is stored, ignoring hyphens and spaces in
+    both the input and the stored value (e.g. '9780134494166' finds '978-0134494166').
+
+    :return: Dictionary with status ('Found' or 'Error') and the stored isbn.
+    """
+    conn = POOL.acquire()
+    try:
+        row = conn.execute(
+            "SELECT isbn FROM books WHERE replace(replace(upper(isbn), '-', ''), ' ', '') = ? LIMIT 1",
+            (isbn_digits(isbn),)
+        ).fetchone()
+        if row is None:
+            return {"status": "Error", "message": f"Book with ISBN {isbn} not found."}
+        return {"status": "Found", "isbn": row['isbn']}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during lookup_isbn: {e}"}
     finally:
-        conn.close()
+        POOL.release(conn)
 
 
 def order_status(order_id: int) -> Dict:
     """Retrieves the status and details of an order."""
-    conn = connect_db()
+    conn = POOL.acquire()
     cursor = conn.cursor()
     
     try:
@@ -205,65 +553,170 @@ def order_status(order_id: int) -> Dict:
     except sqlite3.Error as e:
         return {"status": "Error", "message": f"Database error during order_status: {e}"}
     finally:
-        conn.close()
+        POOL.release(conn)
 
 
 def inventory_summary() -> Dict:
     """Provides a summary of inventory and lists low-stock titles."""
-    conn = connect_db()
+    key = ("inventory_summary",)
+    _sync_result_cache()
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    generation = RESULT_CACHE.generation
+    result = _compute_inventory_summary()
+    if result["status"] != "Error":
+        RESULT_CACHE.put(key, result, [STOCK_TAG, CATALOG_TAG], generation)
+    return result
+
+
+def _compute_inventory_summary() -> Dict:
+    """
+    Uncached inventory_summary query. Totals come from the trigger-maintained
+    inventory_totals row and the low-stock list from the partial index
+    idx_books_low_stock, so the cost is independent of catalog size. Databases
+    that have not been migrated yet fall back to aggregating books with the
+    default threshold.
+    """
+    conn = POOL.acquire()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT COUNT(isbn) as unique_books, SUM(stock) as total_stock FROM books")
-        summary_result = cursor.fetchone()
-        unique_books = summary_result['unique_books']
-        total_stock = summary_result['total_stock']
-        
-        LOW_STOCK_THRESHOLD = 5
-        cursor.execute("SELECT title, stock FROM books WHERE stock <= ?", (LOW_STOCK_THRESHOLD,))
+        try:
+            cursor.execute("SELECT total_titles, total_stock FROM inventory_totals WHERE id = 1")
+            summary_result = cursor.fetchone()
+            unique_books = summary_result['total_titles'] if summary_result else 0
+            total_stock = summary_result['total_stock'] if summary_result else 0
+
+            cursor.execute(
+                "SELECT isbn, title, stock, low_stock_threshold FROM books "
+                "WHERE stock <= low_stock_threshold ORDER BY stock, title"
+            )
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e) and "no such column" not in str(e):
+                raise
+            cursor.execute("SELECT COUNT(isbn) as unique_books, SUM(stock) as total_stock FROM books")
+            summary_result = cursor.fetchone()
+            unique_books = summary_result['unique_books'] or 0
+            total_stock = summary_result['total_stock'] or 0
+
+            cursor.execute(
+                "SELECT isbn, title, stock, ? AS low_stock_threshold FROM books WHERE stock <= ? ORDER BY stock, title",
+                (DEFAULT_LOW_STOCK_THRESHOLD, DEFAULT_LOW_STOCK_THRESHOLD)
+            )
         low_stock_results = cursor.fetchall()
         
         low_stock_titles = [dict(row) for row in low_stock_results]
         
         return {
             "status": "Success",
-            "total_unique_books": unique_books if unique_books is not None else 0,
-            "total_inventory_quantity": total_stock if total_stock is not None else 0,
-            "low_stock_threshold": LOW_STOCK_THRESHOLD,
+            "total_unique_books": unique_books,
+            "total_inventory_quantity": total_stock,
+            # Default for titles without their own threshold; each low-stock title lists its own
+            "low_stock_threshold": DEFAULT_LOW_STOCK_THRESHOLD,
             "low_stock_titles": low_stock_titles
         }
     except sqlite3.Error as e:
         return {"status": "Error", "message": f"Database error during inventory_summary: {e}"}
     finally:
-        conn.close()
-        
+        POOL.release(conn)
+
+
+def set_low_stock_threshold(isbn: str, threshold: int) -> Dict:
+    """
+    Sets the stock level at or below which a title is reported as low stock.
+
+    :param isbn: ISBN of the book.
+    :param threshold: New threshold (0 or more); new titles default to DEFAULT_LOW_STOCK_THRESHOLD.
+    """
+    return WRITER.submit(_set_low_stock_threshold, isbn, threshold)
+
+
+def _set_low_stock_threshold(conn: sqlite3.Connection, isbn: str, threshold: int) -> Dict:
+    if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 0:
+        return {"status": "Error", "message": f"Invalid threshold {threshold!r}; it must be a non-negative integer."}
+    cursor = conn.cursor()
+    try:
+        LOCK_STATS.begin_immediate(conn)
+        version_before = _books_version(conn)
+        cursor.execute("UPDATE books SET low_stock_threshold = ? WHERE isbn = ?", (threshold, isbn))
+        if cursor.rowcount == 0:
+            return {"status": "Error", "message": f"Book with ISBN {isbn} not found."}
+
+        cursor.execute("SELECT title, stock FROM books WHERE isbn = ?", (isbn,))
+        result = cursor.fetchone()
+
+        _commit_books_write(conn, version_before, STOCK_TAG)
+        return {"status": "Success", "isbn": isbn, "title": result['title'], "stock": result['stock'],
+                "low_stock_threshold": threshold, "is_low_stock": result['stock'] <= threshold}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during set_low_stock_threshold: {e}"}
+
 # --- HISTORY PERSISTENCE FUNCTIONS (New) ---
 
-def load_history(session_id: str) -> Dict:
+def load_history(session_id: str, before: int = None, after: int = None, limit: int = None) -> Dict:
     """
-    Loads all messages for a given session ID.
+    Loads messages for a given session ID, oldest first. Without a cursor or
+    limit the whole conversation is returned. Message ids are the cursors.
 
     :param session_id: The unique identifier for the chat session.
-    :return: Dictionary containing status and a list of message dicts ({'role': str, 'content': str}).
+    :param before: Only messages older than this message id (the newest `limit` of them).
+    :param after: Only messages newer than this message id (the oldest `limit` of them); "since" mode.
+                  Takes precedence over `before`.
+    :param limit: Page size (at least 1), capped at HISTORY_MAX_PAGE; with no cursor, the most recent page.
+    :return: Dictionary containing status, a list of message dicts ({'id': int, 'role': str, 'content': str}),
+             has_more (older messages exist for before/latest pages, newer ones for after pages)
+             and the oldest_id/newest_id of the page.
     """
-    conn = connect_db()
+    if limit is not None and limit < 1:
+        return {"status": "Error", "message": f"Invalid limit {limit}; limit must be at least 1."}
+    paged = before is not None or after is not None or limit is not None
+    page_size = min(limit or HISTORY_MAX_PAGE, HISTORY_MAX_PAGE)
+    conn = POOL.acquire()
     cursor = conn.cursor()
     try:
-        query = "SELECT role, content FROM messages WHERE session_id = ? ORDER BY created_at ASC"
-        results = cursor.execute(query, (session_id,)).fetchall()
+        if not paged:
+            query = "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id ASC"
+            results = cursor.execute(query, (session_id,)).fetchall()
+        elif after is not None:
+            query = "SELECT id, role, content FROM messages WHERE session_id = ? AND id > ? ORDER BY id ASC LIMIT ?"
+            results = cursor.execute(query, (session_id, after, page_size + 1)).fetchall()
+        else:
+            # Newest first so LIMIT keeps the page closest to the cursor; flipped below
+            query = "SELECT id, role, content FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?"
+            upper = before if before is not None else 2 ** 63 - 1
+            results = cursor.execute(query, (session_id, upper, page_size + 1)).fetchall()
+
+        # One extra row was fetched to tell whether another page exists
+        has_more = paged and len(results) > page_size
+        if paged:
+            results = results[:page_size]
+            if after is None:
+                results.reverse()
 
         history_list = [dict(row) for row in results]
 
-        return {"status": "Success", "history": history_list}
+        return {
+            "status": "Success",
+            "history": history_list,
+            "has_more": has_more,
+            "oldest_id": history_list[0]['id'] if history_list else None,
+            "newest_id": history_list[-1]['id'] if history_list else None,
+        }
     except sqlite3.Error as e:
         return {"status": "Error", "message": f"Database error during load_history: {e}"}
     finally:
-        conn.close()
+        POOL.release(conn)
 
 def save_message(session_id: str, role: str, content: str) -> Dict:
     """
     Saves a single message (user or assistant) to the database.
     """
-    conn = connect_db()
+    return WRITER.submit(_save_message, session_id, role, content)
+
+
+def _save_message(conn: sqlite3.Connection, session_id: str, role: str, content: str) -> Dict:
     cursor = conn.cursor()
     try:
         query = "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)"
@@ -273,5 +726,244 @@ def save_message(session_id: str, role: str, content: str) -> Dict:
     except sqlite3.Error as e:
         conn.rollback()
         return {"status": "Error", "message": f"Database error during save_message: {e}"}
+
+
+def count_messages(session_id: str) -> Dict:
+    """
+    Counts a session's messages (an index-only scan), used to tell whether a
+    cached history is still complete when several processes serve the session.
+
+    :return: Dictionary with status and count.
+    """
+    conn = POOL.acquire()
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+        return {"status": "Success", "count": count}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during count_messages: {e}"}
     finally:
-        conn.close()
+        POOL.release(conn)
+
+
+def load_summary(session_id: str) -> Dict:
+    """
+    Loads the rolling summary of a session's older messages.
+
+    :return: Dictionary with status, summary text and covered_messages (how many of
+             the session's oldest messages the summary replaces); empty if none yet.
+    """
+    conn = POOL.acquire()
+    cursor = conn.cursor()
+    try:
+        query = "SELECT summary, covered_messages FROM session_summaries WHERE session_id = ?"
+        result = cursor.execute(query, (session_id,)).fetchone()
+
+        if result is None:
+            return {"status": "Success", "summary": "", "covered_messages": 0}
+        return {"status": "Success", "summary": result['summary'], "covered_messages": result['covered_messages']}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during load_summary: {e}"}
+    finally:
+        POOL.release(conn)
+
+def save_summary(session_id: str, summary: str, covered_messages: int) -> Dict:
+    """
+    Stores (or replaces) the rolling summary of a session.
+    """
+    return WRITER.submit(_save_summary, session_id, summary, covered_messages)
+
+
+def _save_summary(conn: sqlite3.Connection, session_id: str, summary: str, covered_messages: int) -> Dict:
+    cursor = conn.cursor()
+    try:
+        query = """
+        INSERT INTO session_summaries (session_id, summary, covered_messages) VALUES (?, ?, ?)
+        ON CONFLICT(session_id) DO UPDATE SET
+            summary = excluded.summary,
+            covered_messages = excluded.covered_messages,
+            updated_at = datetime('now', 'localtime')
+        """
+        cursor.execute(query, (session_id, summary, covered_messages))
+        conn.commit()
+        return {"status": "Success"}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during save_summary: {e}"}
+
+
+# --- RESPONSE CACHE ---
+
+def lookup_cached_response(key: str) -> Dict:
+    """
+    Reads a response_cache entry together with the current data_versions, so the
+    caller can tell in one round trip whether the entry is still valid.
+
+    :return: Dictionary with status, entry (dict, or None on a miss) and versions ({domain: version}).
+    """
+    conn = POOL.acquire()
+    cursor = conn.cursor()
+    try:
+        entry = cursor.execute(
+            "SELECT key, prompt, response, tools, versions, created_at, hits FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        versions = {row['name']: row['version'] for row in cursor.execute("SELECT name, version FROM data_versions")}
+        return {"status": "Success", "entry": dict(entry) if entry else None, "versions": versions}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during lookup_cached_response: {e}"}
+    finally:
+        POOL.release(conn)
+
+
+def data_versions() -> Dict:
+    """Returns the current change counter of every data domain ({'books': int, 'orders': int, ...})."""
+    conn = POOL.acquire()
+    try:
+        versions = {row['name']: row['version'] for row in conn.execute("SELECT name, version FROM data_versions")}
+        return {"status": "Success", "versions": versions}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during data_versions: {e}"}
+    finally:
+        POOL.release(conn)
+
+
+def store_cached_response(key: str, prompt: str, response: str, tools: List[str], versions: Dict[str, int],
+                          max_entries: int) -> Dict:
+    """Stores (or replaces) a cached response, then evicts least recently used entries beyond max_entries."""
+    return WRITER.submit(_store_cached_response, key, prompt, response, tools, versions, max_entries)
+
+
+def _store_cached_response(conn: sqlite3.Connection, key: str, prompt: str, response: str, tools: List[str],
+                           versions: Dict[str, int], max_entries: int) -> Dict:
+    cursor = conn.cursor()
+    try:
+        now = time.time()
+        cursor.execute(
+            "INSERT OR REPLACE INTO response_cache (key, prompt, response, tools, versions, created_at, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (key, prompt, response, json.dumps(tools), json.dumps(versions), now, now)
+        )
+        cursor.execute(
+            "DELETE FROM response_cache WHERE key IN "
+            "(SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (max_entries,)
+        )
+        evicted = cursor.rowcount
+        conn.commit()
+        return {"status": "Success", "evicted": evicted}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during store_cached_response: {e}"}
+
+
+def touch_cached_response(key: str) -> Dict:
+    """Marks a cached response as used now (for LRU eviction) and counts the hit."""
+    return WRITER.submit(_touch_cached_response, key)
+
+
+def _touch_cached_response(conn: sqlite3.Connection, key: str) -> Dict:
+    try:
+        conn.execute("UPDATE response_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return {"status": "Success"}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during touch_cached_response: {e}"}
+
+
+def delete_cached_response(key: str) -> Dict:
+    """Removes an expired or stale cached response."""
+    return WRITER.submit(_delete_cached_response, key)
+
+
+def _delete_cached_response(conn: sqlite3.Connection, key: str) -> Dict:
+    try:
+        conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        conn.commit()
+        return {"status": "Success"}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during delete_cached_response: {e}"}
+
+
+# --- TOOL CALL TRACES ---
+
+def record_tool_calls(rows: List[tuple]) -> Dict:
+    """
+    Inserts a batch of tool call traces in one transaction.
+
+    :param rows: Tuples of (session_id, name, args_json, result_json, duration_ms, status, args_bytes, result_bytes).
+    """
+    return WRITER.submit(_record_tool_calls, rows)
+
+
+def _record_tool_calls(conn: sqlite3.Connection, rows: List[tuple]) -> Dict:
+    cursor = conn.cursor()
+    try:
+        query = """
+        INSERT INTO tool_calls (session_id, name, args_json, result_json, duration_ms, status, args_bytes, result_bytes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        cursor.executemany(query, rows)
+        conn.commit()
+        return {"status": "Success", "recorded": len(rows)}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during record_tool_calls: {e}"}
+
+
+def slowest_tool_calls(session_id: str, limit: int = 10) -> Dict:
+    """
+    Returns the slowest recorded tool calls of a session plus per-tool timing aggregates.
+    """
+    conn = POOL.acquire()
+    cursor = conn.cursor()
+    try:
+        calls_query = """
+        SELECT id, name, args_json, status, duration_ms, args_bytes, result_bytes, created_at
+        FROM tool_calls
+        WHERE session_id = ? AND duration_ms IS NOT NULL
+        ORDER BY duration_ms DESC
+        LIMIT ?
+        """
+        calls = [dict(row) for row in cursor.execute(calls_query, (session_id, limit)).fetchall()]
+
+        by_tool_query = """
+        SELECT name, COUNT(*) AS calls, AVG(duration_ms) AS avg_ms, MAX(duration_ms) AS max_ms,
+               SUM(status = 'Error') AS errors
+        FROM tool_calls
+        WHERE session_id = ? AND duration_ms IS NOT NULL
+        GROUP BY name
+        ORDER BY max_ms DESC
+        """
+        by_tool = [dict(row) for row in cursor.execute(by_tool_query, (session_id,)).fetchall()]
+
+        return {"status": "Success", "session_id": session_id, "calls": calls, "by_tool": by_tool}
+    except sqlite3.Error as e:
+        return {"status": "Error", "message": f"Database error during slowest_tool_calls: {e}"}
+    finally:
+        POOL.release(conn)
+
+
+# --- ASYNC WRAPPERS (used by the FastAPI server) ---
+# Reads are offloaded to a worker thread; writes are awaited on the writer queue
+# without tying up a thread, so the event loop never blocks on SQLite.
+
+async def aload_history(session_id: str, before: int = None, after: int = None, limit: int = None) -> Dict:
+    with tracing.span("load_history", {"session.id": session_id}) as span:
+        result = await asyncio.to_thread(load_history, session_id, before, after, limit)
+        span.set_attribute("history.messages", len(result.get("history", [])))
+        return result
+
+async def acount_messages(session_id: str) -> Dict:
+    return await asyncio.to_thread(count_messages, session_id)
+
+async def asave_message(session_id: str, role: str, content: str) -> Dict:
+    return await WRITER.submit_async(_save_message, session_id, role, content)
+
+async def aload_summary(session_id: str) -> Dict:
+    return await asyncio.to_thread(load_summary, session_id)
+
+async def asave_summary(session_id: str, summary: str, covered_messages: int) -> Dict:
+    return await WRITER.submit_async(_save_summary, session_id, summary, covered_messages)
+
+async def aslowest_tool_calls(session_id: str, limit: int = 10) -> Dict:
+    return await asyncio.to_thread(slowest_tool_calls, session_id, limit)
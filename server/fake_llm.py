@@ -0,0 +1,168 @@
+# /server/fake_llm.py
+#
+# Deterministic, offline stand-in for ChatGoogleGenerativeAI. It replays
+# scripted tool-call sequences, so the whole server (agent loop, tools, DB,
+# history) can be load-tested without an API key or network access.
+#
+#   LLM_PROVIDER=fake FAKE_LLM_LATENCY=0.2 uvicorn main:app
+#   LLM_PROVIDER=fake FAKE_LLM_SCRIPT=my_script.json uvicorn main:app
+#   LLM_PROVIDER=fake FAKE_LLM_LATENCY=0.05 FAKE_LLM_BLOCKING=1 uvicorn main:app
+#   LLM_PROVIDER=fake FAKE_LLM_LATENCY=0.2 FAKE_LLM_INPUT_LATENCY=0.05 uvicorn main:app
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+
+# A script is a list of entries. The first entry whose `match` regex is found
+# in the user's message (case-insensitive) drives the turn: each step is one
+# LLM response, either tool calls or the final answer. An entry without
+# `match` is the fallback.
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {"match": r"restock", "steps": [
+        {"tool_calls": [{"name": "restock_book_tool", "args": {"isbn": "978-0134494166", "qty": 1}}]},
+        {"content": "The Pragmatic Programmer was restocked."},
+    ]},
+    {"match": r"\border\b", "steps": [
+        {"tool_calls": [{"name": "order_status_tool", "args": {"order_id": 101}}]},
+        {"content": "Order 101 was found."},
+    ]},
+    {"match": r"find|search|book", "steps": [
+        {"tool_calls": [{"name": "find_books_tool", "args": {"q": "code"}}]},
+        {"content": "Here are the matching books."},
+    ]},
+    {"steps": [
+        {"tool_calls": [{"name": "inventory_summary_tool", "args": {}}]},
+        {"content": "Inventory checked."},
+    ]},
+]
+
+
+def load_script(path: str) -> List[Dict[str, Any]]:
+    """Reads a script (same shape as DEFAULT_SCRIPT) from a JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def _prompt_chars(messages: List[BaseMessage]) -> int:
+    return sum(len(str(message.content)) for message in messages)
+
+
+class ScriptedChatModel:
+    """
+    Chat model that answers from a script instead of calling an API.
+
+    Which step to play is derived from the messages themselves (the number of
+    AI messages since the last user message), so one instance can serve any
+    number of concurrent sessions. Every call sleeps `latency` seconds, plus
+    up to `jitter` seconds drawn from a seeded RNG, plus `input_latency`
+    seconds per 1000 prompt tokens (a real model reads the whole prompt before
+    answering, so long histories cost time). The unbound model (used by
+    ContextWindow to summarize) returns a truncated transcript as the summary.
+
+    With `blocking`, the async methods sleep without yielding to the event loop,
+    like a synchronous client; one server process then serves one LLM call at a
+    time. Throughput then grows with worker processes even on one core, so it
+    shows how requests are spread, not how much work the server can do.
+    """
+
+    def __init__(self, script: Optional[List[Dict[str, Any]]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, seed: int = 0, blocking: bool = False, input_latency: float = 0.0):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.jitter = jitter
+        self.input_latency = input_latency
+        self.blocking = blocking
+        self._rng = random.Random(seed)
+        self._tools_bound = False
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "ScriptedChatModel":
+        path = os.getenv("FAKE_LLM_SCRIPT")
+        return cls(
+            script=load_script(path) if path else None,
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.0")),
+            jitter=float(os.getenv("FAKE_LLM_JITTER", "0.0")),
+            blocking=os.getenv("FAKE_LLM_BLOCKING", "0") == "1",
+            input_latency=float(os.getenv("FAKE_LLM_INPUT_LATENCY", "0.0")),
+        )
+
+    def bind_tools(self, tools) -> "ScriptedChatModel":
+        bound = ScriptedChatModel(self.script, self.latency, self.jitter, blocking=self.blocking,
+                                  input_latency=self.input_latency)
+        bound._rng = self._rng
+        bound._tools_bound = True
+        return bound
+
+    def _delay(self, messages: List[BaseMessage]) -> float:
+        self.calls += 1
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if self.input_latency:
+            delay += self.input_latency * _prompt_chars(messages) / 4 / 1000
+        return delay
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt_chars = _prompt_chars(messages)
+        if not self._tools_bound:
+            content = str(messages[-1].content)[-400:]
+            return self._with_usage(AIMessage(content=content), prompt_chars)
+
+        last_user = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+        user_text = str(messages[last_user].content) if last_user >= 0 else ""
+        position = sum(isinstance(message, AIMessage) for message in messages[last_user + 1:])
+
+        steps = next(
+            (entry["steps"] for entry in self.script
+             if "match" not in entry or re.search(entry["match"], user_text, re.IGNORECASE)),
+            [],
+        )
+        if position >= len(steps):
+            return self._with_usage(AIMessage(content="Done."), prompt_chars)
+        step = steps[position]
+        if "tool_calls" in step:
+            tool_calls = [
+                {"name": call["name"], "args": call.get("args", {}), "id": f"call_{len(messages)}_{i}"}
+                for i, call in enumerate(step["tool_calls"])
+            ]
+            return self._with_usage(AIMessage(content="", tool_calls=tool_calls), prompt_chars)
+        return self._with_usage(AIMessage(content=step["content"]), prompt_chars)
+
+    @staticmethod
+    def _with_usage(message: AIMessage, prompt_chars: int) -> AIMessage:
+        # Same ~4 characters per token estimate as context_window.estimate_tokens
+        input_tokens = prompt_chars // 4
+        output_tokens = len(str(message.content)) // 4 + 10 * len(message.tool_calls)
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                  "total_tokens": input_tokens + output_tokens}
+        return message
+
+    def invoke(self, messages: List[BaseMessage]) -> AIMessage:
+        time.sleep(self._delay(messages))
+        return self._respond(messages)
+
+    async def ainvoke(self, messages: List[BaseMessage]) -> AIMessage:
+        if self.blocking:
+            time.sleep(self._delay(messages))
+        else:
+            await asyncio.sleep(self._delay(messages))
+        return self._respond(messages)
+
+    async def astream(self, messages: List[BaseMessage]):
+        response = await self.ainvoke(messages)
+        if response.tool_calls:
+            yield AIMessageChunk(content="", tool_call_chunks=[
+                {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                for i, c in enumerate(response.tool_calls)
+            ], usage_metadata=response.usage_metadata)
+            return
+        words = response.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield AIMessageChunk(content=word if last else word + " ",
+                                 usage_metadata=response.usage_metadata if last else None)
@@ -0,0 +1,172 @@
+# /server/fast_path.py
+
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db_tools import inventory_summary, is_valid_isbn, lookup_isbn, order_status, restock_book
+import metrics
+import tracing
+
+ISBN = r"(?P<isbn>[0-9][0-9\- ]{8,15}[0-9Xx])"
+QTY = r"(?P<qty>\d{1,6})"
+ORDER_ID = r"#?(?P<order_id>\d{1,9})"
+END = r"\s*[.!?]?\s*$"
+# record() route for turns answered from the response cache (neither fast path nor LLM)
+RESPONSE_CACHE_ROUTE = "response_cache"
+
+# Each pattern must match the whole prompt, so anything extra ("... and then
+# order two copies") falls through to the LLM.
+ROUTES: List[Tuple[str, str]] = [
+    ("restock", rf"^\s*(?:please\s+)?restock\s+(?:isbn\s+)?{ISBN}\s+(?:by\s+|with\s+)?\+?{QTY}(?:\s+(?:copies|units|more))?{END}"),
+    ("restock", rf"^\s*(?:please\s+)?add\s+{QTY}\s+(?:copies|units)\s+(?:of|to)\s+(?:isbn\s+)?{ISBN}{END}"),
+    ("order_status", rf"^\s*(?:what(?:'s|\s+is)\s+the\s+|show\s+(?:me\s+)?(?:the\s+)?|check\s+(?:the\s+)?)?status\s+(?:of|for)\s+order\s+{ORDER_ID}{END}"),
+    ("order_status", rf"^\s*order\s+(?:status\s+)?{ORDER_ID}(?:\s+status)?{END}"),
+    ("inventory_summary", rf"^\s*(?:show\s+(?:me\s+)?|give\s+me\s+|get\s+)?(?:the\s+|an\s+)?(?:current\s+)?inventory(?:\s+summary|\s+overview)?{END}"),
+]
+
+
+def _restock_answer(result: Dict) -> str:
+    if result["status"] != "Success":
+        return result["message"]
+    return f"The restock of {result['title']} was successful. New stock level is **{result['new_stock']}**."
+
+
+def _order_status_answer(result: Dict) -> str:
+    if result["status"] != "Found":
+        return result["message"]
+    items = ", ".join(f"{item['title']} x **{item['qty']}**" for item in result["items"]) or "no items"
+    return (f"Order **{result['order_id']}** for {result['customer_name']} ({result['order_date']}): "
+            f"{items}. Total **{result['total_price']:.2f}**.")
+
+
+def _inventory_answer(result: Dict) -> str:
+    if result["status"] != "Success":
+        return result["message"]
+    answer = (f"Inventory holds **{result['total_unique_books']}** titles and "
+              f"**{result['total_inventory_quantity']}** copies in stock.")
+    low = result["low_stock_titles"]
+    if not low:
+        return answer + " No titles are low on stock."
+    return answer + " Low stock: " + ", ".join(f"{book['title']} (**{book['stock']}**)" for book in low) + "."
+
+
+# route -> (tool name for traces, db_tools function, args from the match, answer template)
+HANDLERS: Dict[str, Tuple[str, Callable[..., Dict], Callable[[Dict], Dict], Callable[[Dict], str]]] = {
+    "restock": ("restock_book_tool", restock_book,
+                lambda g: {"isbn": g["isbn"].strip(), "qty": int(g["qty"])}, _restock_answer),
+    "order_status": ("order_status_tool", order_status,
+                     lambda g: {"order_id": int(g["order_id"])}, _order_status_answer),
+    "inventory_summary": ("inventory_summary_tool", inventory_summary,
+                          lambda g: {}, _inventory_answer),
+}
+
+
+class FastPathRouter:
+    """
+    Answers simple, fully structured desk commands without the LLM.
+
+    A prompt that matches one of ROUTES end to end (e.g. "restock
+    978-0134494166 by 10", "status of order 101", "inventory summary") is
+    executed directly against db_tools and answered from a template. Anything
+    else returns None and goes to the agent. Counters record which share of
+    traffic took the fast path and how long each path took.
+    """
+
+    def __init__(self, routes: List[Tuple[str, str]] = None, samples: int = 1000):
+        self.routes = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in (routes or ROUTES)]
+        self._lock = threading.Lock()
+        self.by_route: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self._fast_ms: "deque[float]" = deque(maxlen=samples)
+        self._cache_ms: "deque[float]" = deque(maxlen=samples)
+        self._llm_ms: "deque[float]" = deque(maxlen=samples)
+
+    def match(self, prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Returns (route, tool args) for a high-confidence match, else None."""
+        for name, pattern in self.routes:
+            found = pattern.match(prompt)
+            if found is None:
+                continue
+            groups = found.groupdict()
+            if "isbn" in groups and not is_valid_isbn(groups["isbn"].strip()):
+                continue
+            return name, HANDLERS[name][2](groups)
+        return None
+
+    def answer(self, prompt: str, tracer: Any = None, session_id: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Executes a matched prompt and returns {'route', 'tool', 'args', 'result', 'content'},
+        or None when the prompt needs the LLM.
+        """
+        matched = self.match(prompt)
+        return None if matched is None else self._execute(matched, tracer, session_id)
+
+    async def aanswer(self, prompt: str, tracer: Any = None, session_id: str = None) -> Optional[Dict[str, Any]]:
+        """Async variant of answer(); the DB call runs in a worker thread."""
+        matched = self.match(prompt)
+        if matched is None:
+            return None
+        return await asyncio.to_thread(self._execute, matched, tracer, session_id)
+
+    @staticmethod
+    def _execute(matched: Tuple[str, Dict[str, Any]], tracer: Any, session_id: Optional[str]) -> Dict[str, Any]:
+        route, args = matched
+        tool_name, fn, _, template = HANDLERS[route]
+
+        start = time.perf_counter()
+        with tracing.span(f"tool {tool_name}", {"tool.name": tool_name, "tool.args": json.dumps(args),
+                                                "fast_path.route": route}):
+            if "isbn" in args:
+                # Typed with or without hyphens; the tools match the stored form exactly
+                found = lookup_isbn(args["isbn"])
+                if found["status"] == "Found":
+                    args = {**args, "isbn": found["isbn"]}
+            result = fn(**args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.record_tool(tool_name, elapsed_ms / 1000)
+        if tracer is not None:
+            tracer.record(session_id or "cli", tool_name, json.dumps(args), json.dumps(result, default=str),
+                          elapsed_ms, result.get("status", "Success"))
+        return {"route": route, "tool": tool_name, "args": args, "result": result, "content": template(result)}
+
+    def record(self, route: Optional[str], elapsed_ms: float) -> None:
+        """Records one request; route None means it went to the LLM, RESPONSE_CACHE_ROUTE a response cache hit."""
+        with self._lock:
+            if route is None:
+                self.fallbacks += 1
+                self._llm_ms.append(elapsed_ms)
+            elif route == RESPONSE_CACHE_ROUTE:
+                self.cache_hits += 1
+                self._cache_ms.append(elapsed_ms)
+            else:
+                self.by_route[route] = self.by_route.get(route, 0) + 1
+                self._fast_ms.append(elapsed_ms)
+
+    @staticmethod
+    def _latency(samples: "deque[float]") -> Dict[str, float]:
+        ordered = sorted(samples)
+        return {"p50_ms": round(metrics.percentile(ordered, 50), 3),
+                "p95_ms": round(metrics.percentile(ordered, 95), 3)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            fast = sum(self.by_route.values())
+            total = fast + self.cache_hits + self.fallbacks
+            return {
+                "requests": total,
+                "fast_path": fast,
+                "response_cache": self.cache_hits,
+                "llm": self.fallbacks,
+                "fast_path_fraction": round(fast / total, 4) if total else 0.0,
+                "response_cache_fraction": round(self.cache_hits / total, 4) if total else 0.0,
+                "by_route": dict(self.by_route),
+                "fast_path_latency": self._latency(self._fast_ms),
+                "response_cache_latency": self._latency(self._cache_ms),
+                "llm_latency": self._latency(self._llm_ms),
+            }
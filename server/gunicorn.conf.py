@@ -0,0 +1,31 @@
+# /server/gunicorn.conf.py
+#
+# Multi-worker deployment (gunicorn is not in requirements.txt; pip install gunicorn):
+#
+#   cd server
+#   WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py main:app
+#
+# Every worker imports main.py and so builds its own agent, connection pool,
+# writer thread and caches. What must agree across workers lives in SQLite:
+# chat history, the response cache, and the change counters the in-process
+# caches are checked against (SHARED_STATE=sqlite, set below).
+
+import multiprocessing
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Inherited by the workers; db_tools turns on SHARED_STATE=sqlite when it is above 1
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = os.getenv("BIND", f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))  # A turn can wait on several LLM calls
+preload_app = False  # Import (and build the agent) in each worker, never before the fork
+
+
+def on_starting(server):
+    """Migrates the database once in the master, before any worker starts."""
+    from migrations import apply_migrations
+    result = apply_migrations()
+    if result["status"] != "Success":
+        server.log.warning(result["message"])
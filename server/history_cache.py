@@ -0,0 +1,141 @@
+# /server/history_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class HistoryCache:
+    """
+    In-process LRU cache of per-session conversation history.
+
+    Entries are filled from SQLite on a miss and then kept current by append()
+    as new messages are saved, so a /chat turn does not reload and rebuild the
+    whole conversation. Sessions idle longer than `ttl_seconds` expire, and the
+    least recently used session is evicted once `max_sessions` is reached.
+    """
+
+    def __init__(self, max_sessions: int = 256, ttl_seconds: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Bumped on every change to a cached session or one with a load in flight,
+        # so a slow DB load that raced with a write is never stored over newer data.
+        # Sessions that are neither have no entry, which keeps this bounded.
+        self._versions: Dict[str, int] = {}
+        self._loading: Dict[str, int] = {}  # session_id -> loads in flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def begin_load(self, session_id: str) -> int:
+        """
+        Registers a DB load of the session and returns the version to pass to put().
+        Every call must be paired with end_load() once the load is over.
+        """
+        with self._lock:
+            self._loading[session_id] = self._loading.get(session_id, 0) + 1
+            return self._versions.setdefault(session_id, 0)
+
+    def end_load(self, session_id: str) -> None:
+        with self._lock:
+            remaining = self._loading.get(session_id, 0) - 1
+            if remaining > 0:
+                self._loading[session_id] = remaining
+            else:
+                self._loading.pop(session_id, None)
+                self._forget(session_id)
+
+    def get(self, session_id: str, expected_length: Optional[int] = None) -> Optional[List[Any]]:
+        """
+        Returns a copy of the cached messages, or None on a miss.
+
+        :param expected_length: The session's message count in the database, when other
+                                processes may also append to it; a cached entry of any
+                                other length is stale and dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and time.monotonic() - entry["touched"] > self.ttl_seconds:
+                self._evict(session_id)
+                entry = None
+            if entry is not None and expected_length is not None and len(entry["messages"]) != expected_length:
+                self._evict(session_id)
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["touched"] = time.monotonic()
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return list(entry["messages"])
+
+    def put(self, session_id: str, messages: List[Any], version: int) -> bool:
+        """
+        Stores messages loaded from the DB. `version` must be the value
+        begin_load() returned before the load; the put is dropped if it is stale.
+        """
+        with self._lock:
+            if self._versions.get(session_id, 0) != version:
+                return False
+            self._entries[session_id] = {"messages": list(messages), "touched": time.monotonic()}
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._evict(next(iter(self._entries)))
+            return True
+
+    def _evict(self, session_id: str) -> None:
+        # Caller holds the lock
+        del self._entries[session_id]
+        self._forget(session_id)
+        self.evictions += 1
+
+    def _forget(self, session_id: str) -> None:
+        # Caller holds the lock. A version is only needed while the session is cached or loading.
+        if session_id not in self._entries and session_id not in self._loading:
+            self._versions.pop(session_id, None)
+
+    def _bump(self, session_id: str) -> None:
+        # Caller holds the lock
+        if session_id in self._versions:
+            self._versions[session_id] += 1
+
+    def append(self, session_id: str, message: Any) -> None:
+        """Adds a newly saved message to the session, if it is cached."""
+        with self._lock:
+            self._bump(session_id)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry["messages"].append(message)
+
+    def invalidate(self, session_id: str) -> None:
+        """Drops a session so the next read goes back to the DB."""
+        with self._lock:
+            self._bump(session_id)
+            self._entries.pop(session_id, None)
+            self._forget(session_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for session_id in list(self._versions):
+                self._bump(session_id)
+            self._entries.clear()
+            for session_id in list(self._versions):
+                self._forget(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
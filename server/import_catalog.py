@@ -0,0 +1,229 @@
+# /server/import_catalog.py
+#
+# Bulk catalog importer. Streams a CSV or JSONL file of books into the books
+# table without ever holding the whole file in memory:
+#
+#   read rows -> validate -> chunk -> upsert (one transaction per chunk)
+#
+#   python import_catalog.py catalog.csv
+#   python import_catalog.py catalog.jsonl --chunk-size 20000
+#   python import_catalog.py catalog.csv --keep-indexes   # small import into a live database
+#
+# CSV files need a header row with isbn, title, author, stock, price. JSONL
+# files hold one object per line with the same keys. Existing ISBNs are updated
+# in place. stock and price are optional: a new book without them gets 0, an
+# existing one keeps its current values (so a metadata-only catalog can be
+# re-imported without wiping inventory and prices).
+
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db_tools import CATALOG_TAG, RESULT_CACHE, STOCK_TAG, connect_db, is_valid_isbn
+from migrations import sync_search_index
+
+# A NULL stock or price (absent from the row) keeps the stored value. The NULL
+# can't travel through excluded.*: stock and price are NOT NULL, and that is
+# checked before the conflict is, so the parameters are reused by number.
+UPSERT_BOOK = """
+INSERT INTO books (isbn, title, author, stock, price) VALUES (?1, ?2, ?3, COALESCE(?4, 0), COALESCE(?5, 0))
+ON CONFLICT(isbn) DO UPDATE SET
+    title = excluded.title, author = excluded.author,
+    stock = COALESCE(?4, books.stock), price = COALESCE(?5, books.price)
+"""
+
+# Reported individually; beyond this only the count grows.
+MAX_REPORTED_ERRORS = 20
+
+
+# --- Parsing ---
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, Dict]]:
+    """Yields (line number, raw row dict) from a CSV or JSONL file, one row at a time."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"_error": f"Invalid JSON: {e}"}
+
+
+def _optional(value: Any, convert: Callable[[Any], Any]) -> Any:
+    """None for an absent or empty field, else the converted value (ValueError if it doesn't convert)."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return convert(value)
+
+
+def validate_rows(rows: Iterable[Tuple[int, Dict]], errors: List[str], counts: Dict[str, int]) -> Iterator[tuple]:
+    """
+    Turns raw rows into books parameter tuples, skipping invalid ones.
+    ISBNs are stored as written (trimmed), so they match what users type.
+    A missing or empty stock or price becomes None (see UPSERT_BOOK).
+    """
+    for line_no, row in rows:
+        counts["read"] += 1
+        try:
+            if "_error" in row:
+                raise ValueError(row["_error"])
+            isbn = str(row.get("isbn") or "").strip()
+            if not is_valid_isbn(isbn):
+                raise ValueError(f"invalid ISBN {isbn!r}")
+            title = str(row.get("title") or "").strip()
+            author = str(row.get("author") or "").strip()
+            if not title or not author:
+                raise ValueError("title and author are required")
+            stock = _optional(row.get("stock"), int)
+            price = _optional(row.get("price"), lambda value: round(float(value), 2))
+            if (stock is not None and stock < 0) or (price is not None and price < 0):
+                raise ValueError("stock and price must not be negative")
+        except (TypeError, ValueError) as e:
+            counts["invalid"] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"line {line_no}: {e}")
+            continue
+        yield isbn, title, author, stock, price
+
+
+def chunked(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk: List[tuple] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Index handling ---
+
+def _drop_books_indexes(conn: sqlite3.Connection) -> List[str]:
+    """
+    Drops secondary indexes on books and the books_fts sync triggers, returning
+    the SQL to recreate them. The primary key stays: the upsert needs it.
+    All drops are one transaction, so on failure nothing has been dropped.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        objects = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE tbl_name = 'books' AND sql IS NOT NULL "
+            "AND (type = 'index' OR (type = 'trigger' AND name LIKE 'books_fts_%'))"
+        ).fetchall()
+        for obj in objects:
+            conn.execute(f"DROP {obj['type'].upper()} IF EXISTS {obj['name']}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return [obj["sql"] for obj in objects]
+
+
+def _restore_books_indexes(conn: sqlite3.Connection, statements: List[str]) -> None:
+    """Recreates what _drop_books_indexes removed and rebuilds books_fts in one pass."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql in statements:
+            conn.execute(sql)
+        sync_search_index(conn)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+# --- Import ---
+
+def import_catalog(path: str, fmt: Optional[str] = None, chunk_size: int = 5000,
+                   keep_indexes: bool = False, progress: bool = False) -> Dict:
+    """
+    Streams a catalog file into books, upserting `chunk_size` rows per transaction.
+
+    :param fmt: "csv" or "jsonl"; guessed from the file extension if omitted.
+    :param keep_indexes: Maintain indexes and books_fts row by row instead of
+        dropping them and rebuilding once at the end. Slower, but searches stay
+        complete while the import runs.
+    :return: Dictionary with row counts, rows/sec and the first validation errors.
+    """
+    counts = {"read": 0, "invalid": 0, "imported": 0, "chunks": 0}
+    errors: List[str] = []
+    conn = connect_db()
+    dropped: List[str] = []
+    failure: Optional[str] = None
+    start = time.perf_counter()
+    try:
+        if not keep_indexes:
+            dropped = _drop_books_indexes(conn)
+
+        rows = validate_rows(read_rows(path, fmt), errors, counts)
+        for chunk in chunked(rows, chunk_size):
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(UPSERT_BOOK, chunk)
+            conn.commit()
+            counts["imported"] += len(chunk)
+            counts["chunks"] += 1
+            if progress and counts["chunks"] % 10 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {counts['imported']} rows ({counts['imported'] / elapsed:.0f} rows/s)", file=sys.stderr)
+    except (OSError, sqlite3.Error) as e:
+        if conn.in_transaction:
+            conn.rollback()
+        failure = f"Error during import_catalog: {e}"
+    finally:
+        # Always put the indexes back, even after a failed chunk, and always close the connection
+        try:
+            if dropped:
+                rebuild_start = time.perf_counter()
+                _restore_books_indexes(conn, dropped)
+                counts["index_rebuild_sec"] = round(time.perf_counter() - rebuild_start, 3)
+                dropped = []
+        except sqlite3.Error as e:
+            restore_failure = f"Could not restore books indexes and triggers: {e}"
+            failure = f"{failure}; {restore_failure}" if failure else restore_failure
+        finally:
+            conn.close()
+            # Only reaches a server that imported this module; others see the data_versions change
+            RESULT_CACHE.invalidate(CATALOG_TAG, STOCK_TAG)
+
+    if failure is not None:
+        result = {"status": "Error", "message": failure, **counts, "errors": errors}
+        if dropped:
+            result["unrestored_sql"] = dropped  # Run these (then migrations.rebuild_search_index) by hand
+        return result
+
+    elapsed = time.perf_counter() - start
+    return {
+        "status": "Success",
+        **counts,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(counts["imported"] / elapsed) if elapsed else 0,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a CSV/JSONL book catalog into the books table")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per transaction")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="Don't drop indexes/FTS triggers during the import")
+    args = parser.parse_args()
+
+    result = import_catalog(args.path, args.format, args.chunk_size, args.keep_indexes, progress=True)
+    for error in result.pop("errors"):
+        print(f"  skipped {error}", file=sys.stderr)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["status"] == "Success" else 1)
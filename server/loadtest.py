@@ -0,0 +1,128 @@
+# /server/loadtest.py
+#
+# End-to-end load generator for the FastAPI server. Virtual users each own a
+# session and alternate POST /chat and GET /history calls; latencies are
+# reported per endpoint as p50/p95/p99 plus throughput.
+#
+# Fully offline, in this process, against a throwaway seeded database and the
+# scripted LLM (fake_llm.py):
+#
+#   python loadtest.py --concurrency 20 --requests 500 --llm-latency 0.2
+#
+# Against a running server (start it with LLM_PROVIDER=fake to stay offline):
+#
+#   LLM_PROVIDER=fake FAKE_LLM_LATENCY=0.2 uvicorn main:app --port 8000
+#   python loadtest.py --url http://127.0.0.1:8000 --concurrency 50 --requests 2000
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from metrics import percentile
+
+PROMPTS = [
+    "Show me the inventory summary",
+    "Find books about code",
+    "What's the status of order 101?",
+    "Restock The Pragmatic Programmer",
+]
+
+
+def summarize(samples: List[float], errors: int, wall: float) -> Dict:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "max_ms": round(samples[-1], 2) if samples else 0.0,
+        "req_per_sec": round((len(samples) + errors) / wall, 1) if wall else 0.0,
+    }
+
+
+async def run_load(client: httpx.AsyncClient, concurrency: int, requests: int,
+                   history_ratio: float, seed: int) -> Dict:
+    """
+    Issues `requests` calls from `concurrency` virtual users. Each call is a
+    GET /history with probability `history_ratio`, otherwise a POST /chat.
+    """
+    samples: Dict[str, List[float]] = {"chat": [], "history": []}
+    errors = {"chat": 0, "history": 0}
+    remaining = [requests]
+    run_id = f"load-{int(time.time())}"
+
+    async def user(n: int) -> None:
+        rng = random.Random(seed + n)
+        session_id = f"{run_id}-{n}"
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            endpoint = "history" if rng.random() < history_ratio else "chat"
+            start = time.perf_counter()
+            try:
+                if endpoint == "chat":
+                    response = await client.post("/chat", json={"prompt": rng.choice(PROMPTS), "session_id": session_id})
+                else:
+                    response = await client.get(f"/history/{session_id}")
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                samples[endpoint].append((time.perf_counter() - start) * 1000)
+            else:
+                errors[endpoint] += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    report = {endpoint: summarize(samples[endpoint], errors[endpoint], wall) for endpoint in samples}
+    report["total"] = summarize(samples["chat"] + samples["history"], sum(errors.values()), wall)
+    report["wall_sec"] = round(wall, 2)
+    return report
+
+
+def in_process_client(llm_latency: float) -> httpx.AsyncClient:
+    """Builds the app against a temp DB with the scripted LLM and returns a client that calls it directly."""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(llm_latency)
+    from benchmark import build_temp_db
+    build_temp_db()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadtest", timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /chat and GET /history")
+    parser.add_argument("--url", help="Base URL of a running server; default: run the app in-process")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests across all users")
+    parser.add_argument("--history-ratio", type=float, default=0.3, help="Fraction of requests that are GET /history")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Scripted LLM seconds per call (in-process only)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def main_async() -> Dict:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60,
+                                       limits=httpx.Limits(max_connections=args.concurrency))
+        else:
+            client = in_process_client(args.llm_latency)
+        async with client:
+            # The agent prints every tool call; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                return await run_load(client, args.concurrency, args.requests, args.history_ratio, args.seed)
+
+    report = asyncio.run(main_async())
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["total"]["errors"] else 0)
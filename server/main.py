@@ -1,27 +1,94 @@
 # /server/main.py (FINAL VERSION WITH DB HISTORY PERSISTENCE)
 
-from fastapi import FastAPI
+import contextlib
+import json
+import time
+from fastapi import FastAPI, Header, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from typing import Dict, Any, List, Union
+from typing import Dict, Any, List, Optional, Union
 from langchain_core.messages import HumanMessage, AIMessage
 
 # --- New Imports ---
 # Import the helper functions for DB operations
-from db_tools import load_history, save_message
-from agent import create_library_agent, run_agent_chat, LibraryAgent
+import os
+from db_tools import (aload_history, acount_messages, asave_message, aslowest_tool_calls, configure_database,
+                      HISTORY_MAX_PAGE, LOCK_STATS, MULTI_PROCESS, RESULT_CACHE, SHARED_STATE, WEB_CONCURRENCY)
+from history_cache import HistoryCache
+from context_window import ContextWindow
+from fast_path import RESPONSE_CACHE_ROUTE, FastPathRouter
+from response_cache import ResponseCache
+import metrics
+import tracing
+from migrations import apply_migrations
+from agent import create_library_agent, arun_agent_chat, astream_agent_chat, LibraryAgent, TRACER
 
-# --- Global Agent State ---
+# --- Database Configuration (WAL + PRAGMAs, then schema migrations) ---
+DB_CONFIG = configure_database()
+if DB_CONFIG['status'] != 'Success':
+    print(f"Warning: {DB_CONFIG['message']}")
+
+DB_MIGRATIONS = apply_migrations()
+if DB_MIGRATIONS['status'] != 'Success':
+    print(f"Warning: {DB_MIGRATIONS['message']}")
+elif DB_MIGRATIONS['applied']:
+    print(f"Applied migrations: {DB_MIGRATIONS['applied']}")
+
+# --- Global Agent State (one per worker process) ---
 AGENT: Union[LibraryAgent, None] = create_library_agent()
+WORKER_PID = os.getpid()
+
+# --- Conversation History Cache (LangChain messages per session) ---
+HISTORY_CACHE = HistoryCache(
+    max_sessions=int(os.getenv("HISTORY_CACHE_SESSIONS", "256")),
+    ttl_seconds=float(os.getenv("HISTORY_CACHE_TTL", "1800")),
+)
+
+# --- Context Window (recent turns verbatim + rolling summary, token-budgeted) ---
+CONTEXT = ContextWindow(
+    llm=AGENT.llm if AGENT else None,
+    keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "6")),
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000")),
+    summary_max_tokens=int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "500")),
+    fold_turns=int(os.getenv("CONTEXT_FOLD_TURNS", "4")),
+)
+
+# --- Fast Path (structured desk commands answered without the LLM) ---
+FAST_PATH = FastPathRouter() if os.getenv("FAST_PATH_ENABLED", "1") != "0" else None
+
+# --- Response Cache (answers to repeated read-only questions, in SQLite) ---
+RESPONSE_CACHE = ResponseCache(
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+) if os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0" else None
 
 # --- Pydantic Data Model for Request Body ---
 class ChatRequest(BaseModel):
     prompt: str
     session_id: str
 
+def init_worker() -> None:
+    """
+    Rebuilds the agent when this process was forked from the one that imported
+    the app (e.g. gunicorn --preload): LLM clients and thread pools must not be
+    shared across a fork. Workers that import the app themselves already own theirs.
+    """
+    global AGENT, WORKER_PID
+    if WORKER_PID == os.getpid():
+        return
+    WORKER_PID = os.getpid()
+    AGENT = create_library_agent()
+    CONTEXT.llm = AGENT.llm if AGENT else None
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_worker()
+    yield
+
 # --- FastAPI App Initialization ---
-app = FastAPI(title="Library Desk Agent API")
+app = FastAPI(title="Library Desk Agent API", lifespan=lifespan)
 
 # --- CORS Middleware Configuration (Remains the same) ---
 origins = [
@@ -37,6 +104,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Helpers ---
+
+def to_langchain_message(role: str, content: str) -> Union[HumanMessage, AIMessage]:
+    return HumanMessage(content=content) if role == 'user' else AIMessage(content=content)
+
+async def load_history_messages(session_id: str) -> List[Union[HumanMessage, AIMessage]]:
+    """Returns a session's history as LangChain messages, from the cache or the DB."""
+    expected_length = None
+    if SHARED_STATE == "sqlite":
+        # Another worker may have added to this session since it was cached here
+        counted = await acount_messages(session_id)
+        expected_length = counted["count"] if counted["status"] == "Success" else -1
+    cached = HISTORY_CACHE.get(session_id, expected_length)
+    tracing.set_attribute("history.cache_hit", cached is not None)
+    if cached is not None:
+        return cached
+
+    version = HISTORY_CACHE.begin_load(session_id)
+    try:
+        db_history_result = await aload_history(session_id)
+        history_lc: List[Union[HumanMessage, AIMessage]] = []
+
+        if db_history_result['status'] == 'Success':
+            for msg in db_history_result['history']:
+                history_lc.append(to_langchain_message(msg['role'], msg['content']))
+            HISTORY_CACHE.put(session_id, history_lc, version)
+        return history_lc
+    finally:
+        HISTORY_CACHE.end_load(session_id)
+
+async def save_history_message(session_id: str, role: str, content: str) -> Dict[str, Any]:
+    """Saves a message to the DB and appends it to the cached session history."""
+    result = await asave_message(session_id, role, content)
+    if result['status'] == 'Success':
+        HISTORY_CACHE.append(session_id, to_langchain_message(role, content))
+    else:
+        HISTORY_CACHE.invalidate(session_id)
+    return result
+
+def finish_request_metrics(endpoint: str, path: str) -> Dict[str, Any]:
+    """Records the request in /metrics and tags the request's trace span with how it was answered."""
+    tracing.set_attribute("chat.path", path)
+    return metrics.finish_request(endpoint, path)
+
+def finish_metrics(response: Response, endpoint: str, path: str) -> None:
+    """Records the request in /metrics and attaches its timings to the response headers."""
+    response.headers.update(metrics.timing_headers(finish_request_metrics(endpoint, path)))
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """Formats one event as a Server-Sent Events frame."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
 # --- Endpoints ---
 
 @app.get("/")
@@ -44,48 +163,126 @@ def read_root():
     status = "running" if AGENT else "Error: Agent not loaded (Check API Key)."
     return {"message": "Library Desk Agent API is running.", "agent_status": status}
 
+@app.get("/stats")
+def read_stats() -> Dict[str, Any]:
+    """Cache, write-lock and fast-path counters for monitoring (of the worker that answers)."""
+    return {
+        "worker": {"pid": os.getpid(), "workers": WEB_CONCURRENCY, "multi_process": MULTI_PROCESS,
+                   "shared_state": SHARED_STATE},
+        "history_cache": HISTORY_CACHE.stats(),
+        "result_cache": RESULT_CACHE.stats(),
+        "tool_traces": TRACER.stats(),
+        "write_locks": LOCK_STATS.stats(),
+        "fast_path": FAST_PATH.stats() if FAST_PATH else None,
+        "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE else None,
+        "tool_memo_saved": AGENT.memo_saved_total if AGENT else 0,
+    }
+
+@app.get("/metrics")
+def read_metrics() -> PlainTextResponse:
+    """Request, LLM, tool and DB timings in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/tools/slowest/{session_id}")
+async def slowest_tools(session_id: str, limit: int = 10) -> Dict[str, Any]:
+    """Slowest traced tool calls of a session, plus per-tool timing aggregates."""
+    return await aslowest_tool_calls(session_id, limit)
+
 # NEW ENDPOINT: To load history on Streamlit startup
 @app.get("/history/{session_id}")
-async def load_chat_history(session_id: str) -> Dict[str, Any]:
-    """Retrieves chat history from the database for a given session."""
-    db_result = load_history(session_id)
+async def load_chat_history(session_id: str, before: Optional[int] = None, after: Optional[int] = None,
+                            limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_PAGE)) -> Dict[str, Any]:
+    """
+    Retrieves chat history from the database for a given session. Without
+    parameters, the whole conversation; with `limit` (1 to HISTORY_MAX_PAGE),
+    the most recent page; `before`/`after` (message ids) page backwards or
+    fetch only newer messages.
+    """
+    db_result = await aload_history(session_id, before, after, limit)
     return db_result
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
+async def chat_endpoint(request: ChatRequest, response: Response,
+                        traceparent: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Runs one chat turn. Timings of the turn (LLM, tools, DB) are returned in the
+    Server-Timing and X-LLM-* / X-Agent-Iterations headers. The turn is traced
+    (as a child of an incoming W3C `traceparent`, if any); its trace id is
+    returned as `trace_id` and in the X-Trace-Id header.
+    """
+    with tracing.span("POST /chat", {"session.id": request.session_id}, kind="SERVER",
+                      remote_parent=tracing.parse_traceparent(traceparent)) as span:
+        result = await chat_turn(request, response)
+    result["trace_id"] = span.trace_id
+    response.headers["X-Trace-Id"] = span.trace_id
+    return result
+
+async def chat_turn(request: ChatRequest, response: Response) -> Dict[str, Any]:
+    """Body of /chat, run inside the request's trace span."""
     user_prompt = request.prompt
     session_id = request.session_id
+    start = time.perf_counter()
+    metrics.start_request()
+
+    # 0. Structured commands ("restock <isbn> by <n>", "status of order <id>", ...) skip the LLM
+    fast = await FAST_PATH.aanswer(user_prompt, TRACER, session_id) if FAST_PATH else None
+    if fast is not None:
+        await save_history_message(session_id, 'user', user_prompt)
+        await save_history_message(session_id, 'assistant', fast['content'])
+        FAST_PATH.record(fast['route'], (time.perf_counter() - start) * 1000)
+        finish_metrics(response, "chat", "fast_path")
+        return {
+            "response": fast['content'],
+            "session_id": session_id,
+            "tool_info": f"Fast path: {fast['tool']} (no LLM call)."
+        }
     
     if not AGENT:
+        finish_metrics(response, "chat", "unavailable")
         return {
             "response": "Agent failed to initialize. Check API Key.",
             "session_id": session_id,
             "tool_info": {}
         }
 
-    # 1. Load History (Convert DB dicts to LangChain messages)
-    db_history_result = load_history(session_id)
-    history_lc: List[Union[HumanMessage, AIMessage]] = []
-    
-    if db_history_result['status'] == 'Success':
-        for msg in db_history_result['history']:
-            if msg['role'] == 'user':
-                history_lc.append(HumanMessage(content=msg['content']))
-            else:
-                history_lc.append(AIMessage(content=msg['content']))
+    # 0b. A repeated read-only question whose data has not changed is answered from the response cache
+    cached = await RESPONSE_CACHE.aget(user_prompt) if RESPONSE_CACHE else None
+    if cached is not None:
+        await save_history_message(session_id, 'user', user_prompt)
+        await save_history_message(session_id, 'assistant', cached['response'])
+        if FAST_PATH:
+            FAST_PATH.record(RESPONSE_CACHE_ROUTE, (time.perf_counter() - start) * 1000)
+        finish_metrics(response, "chat", "response_cache")
+        return {
+            "response": cached['response'],
+            "session_id": session_id,
+            "tool_info": f"Response cache hit (data unchanged for: {', '.join(cached['tools'])})."
+        }
+    versions = await RESPONSE_CACHE.asnapshot() if RESPONSE_CACHE else {}
+
+    # 1. Load History (Convert DB dicts to LangChain messages), windowed to the token budget
+    history = await load_history_messages(session_id)
+    history_length = len(history)
+    history_lc = await CONTEXT.prepare(session_id, history)
 
     # 2. Save User Message to DB
-    save_message(session_id, 'user', user_prompt)
+    await save_history_message(session_id, 'user', user_prompt)
     
     # 3. Run the Agent with loaded history
-    ai_response_message: AIMessage = run_agent_chat(AGENT, user_prompt, history_lc)
+    ai_response_message: AIMessage = await arun_agent_chat(AGENT, user_prompt, history_lc, session_id)
     ai_response_content = ai_response_message.content
 
     # 4. Save Agent Message to DB
-    save_message(session_id, 'assistant', ai_response_content)
+    await save_history_message(session_id, 'assistant', ai_response_content)
+    if FAST_PATH:
+        FAST_PATH.record(None, (time.perf_counter() - start) * 1000)
+    metadata = ai_response_message.response_metadata
+    if RESPONSE_CACHE and metadata.get("completed"):
+        await RESPONSE_CACHE.aput(user_prompt, ai_response_content, metadata["tools_used"], versions, history_length)
 
     # 5. Prepare Response for Streamlit
     tool_status_text = "Agent processed the request (DB used for history)."
+    finish_metrics(response, "chat", "llm")
 
     return {
         "response": ai_response_content,
@@ -93,6 +290,86 @@ async def chat_endpoint(request: ChatRequest) -> Dict[str, Any]:
         "tool_info": tool_status_text 
     }
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, traceparent: Optional[str] = Header(None)) -> StreamingResponse:
+    """
+    Same as /chat, but streams Server-Sent Events while the agent works:
+    'tool_call' / 'tool_result' progress, 'token' text as the LLM produces it,
+    and a closing 'final' event carrying the full answer, tool_info, the
+    turn's timings (the same numbers /chat returns as headers) and its trace_id.
+    """
+    user_prompt = request.prompt
+    session_id = request.session_id
+
+    async def turn_events():
+        start = time.perf_counter()
+        metrics.start_request()
+        fast = await FAST_PATH.aanswer(user_prompt, TRACER, session_id) if FAST_PATH else None
+        if fast is not None:
+            await save_history_message(session_id, 'user', user_prompt)
+            await save_history_message(session_id, 'assistant', fast['content'])
+            FAST_PATH.record(fast['route'], (time.perf_counter() - start) * 1000)
+            yield {"type": "tool_call", "name": fast['tool'], "args": fast['args']}
+            yield {"type": "tool_result", "name": fast['tool'], "content": json.dumps(fast['result'], default=str)[:200]}
+            yield {"type": "final", "content": fast['content'], "session_id": session_id,
+                   "tool_info": f"Fast path: {fast['tool']} (no LLM call).",
+                   "timing": finish_request_metrics("chat_stream", "fast_path")}
+            return
+
+        cached = await RESPONSE_CACHE.aget(user_prompt) if RESPONSE_CACHE else None
+        if cached is not None:
+            await save_history_message(session_id, 'user', user_prompt)
+            await save_history_message(session_id, 'assistant', cached['response'])
+            if FAST_PATH:
+                FAST_PATH.record(RESPONSE_CACHE_ROUTE, (time.perf_counter() - start) * 1000)
+            yield {"type": "final", "content": cached['response'], "session_id": session_id,
+                   "tool_info": f"Response cache hit (data unchanged for: {', '.join(cached['tools'])}).",
+                   "timing": finish_request_metrics("chat_stream", "response_cache")}
+            return
+        versions = await RESPONSE_CACHE.asnapshot() if RESPONSE_CACHE else {}
+
+        history = await load_history_messages(session_id)
+        history_length = len(history)
+        history_lc = await CONTEXT.prepare(session_id, history)
+        await save_history_message(session_id, 'user', user_prompt)
+
+        tools_used: List[str] = []
+        async for event in astream_agent_chat(AGENT, user_prompt, history_lc, session_id):
+            if event['type'] == 'tool_call':
+                tools_used.append(event['name'])
+            elif event['type'] == 'final':
+                # Persist before the client sees the end of the stream
+                await save_history_message(session_id, 'assistant', event['content'])
+                if FAST_PATH:
+                    FAST_PATH.record(None, (time.perf_counter() - start) * 1000)
+                if event.pop('completed', False) and RESPONSE_CACHE:
+                    await RESPONSE_CACHE.aput(user_prompt, event['content'], tools_used, versions, history_length)
+                event['session_id'] = session_id
+                event['tool_info'] = f"Tools used: {', '.join(tools_used)}" if tools_used else "No tools used."
+                event['timing'] = finish_request_metrics("chat_stream", "llm" if AGENT else "unavailable")
+            yield event
+
+    async def event_stream():
+        with tracing.span("POST /chat/stream", {"session.id": session_id}, kind="SERVER",
+                          remote_parent=tracing.parse_traceparent(traceparent)) as span:
+            async for event in turn_events():
+                if event['type'] == 'final':
+                    event['trace_id'] = span.trace_id
+                yield sse_event(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --- Running the Server ---
+# WEB_CONCURRENCY=4 python main.py runs four worker processes (as does
+# WEB_CONCURRENCY=4 uvicorn main:app, or gunicorn -c gunicorn.conf.py main:app).
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    host, port = os.getenv("HOST", "0.0.0.0"), int(os.getenv("PORT", "8000"))
+    if WEB_CONCURRENCY > 1:
+        # Each worker imports the app itself, so it is passed by import string
+        uvicorn.run("main:app", host=host, port=port, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,264 @@
+# /server/metrics.py
+#
+# Request instrumentation for the agent: LLM call latency and token usage,
+# agent loop depth, per-tool time and database time. Process-wide totals are
+# kept in a small registry rendered in the Prometheus text exposition format
+# (GET /metrics); the numbers of the request being served are collected in a
+# RequestMetrics object that main.py turns into response timing headers.
+
+import contextvars
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond DB reads up to slow multi-iteration LLM turns
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(max(int(round(pct / 100 * len(samples))) - 1, 0), len(samples) - 1)]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            return [(self.name, list(zip(self.labelnames, key)), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(Counter):
+    """Cumulative-bucket histogram with _bucket, _sum and _count series, like prometheus_client's."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> List[Tuple[str, List[Tuple[str, str]], float]]:
+        result = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, counts):
+                    result.append((f"{self.name}_bucket", labels + [("le", _format_value(bound))], count))
+                result.append((f"{self.name}_sum", labels, total))
+                result.append((f"{self.name}_count", labels, counts[-1]))
+        return result
+
+
+class Registry:
+    """Named metrics, rendered together in the Prometheus text format (version 0.0.4)."""
+
+    def __init__(self):
+        self._metrics: List[Counter] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CHAT_REQUESTS = REGISTRY.counter(
+    "library_chat_requests_total", "Chat requests by endpoint and how they were answered.", ["endpoint", "path"])
+CHAT_SECONDS = REGISTRY.histogram(
+    "library_chat_request_seconds", "End-to-end chat request latency.", ["endpoint", "path"])
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "library_llm_call_seconds", "Latency of each tool-bound LLM call in the agent loop.")
+LLM_TOKENS = REGISTRY.counter(
+    "library_llm_tokens_total", "Tokens reported in LLM usage metadata.", ["direction"])
+AGENT_ITERATIONS = REGISTRY.histogram(
+    "library_agent_iterations", "LLM calls (loop iterations) per agent turn.", buckets=ITERATION_BUCKETS)
+TOOL_SECONDS = REGISTRY.histogram(
+    "library_tool_seconds", "Execution time of each tool call.", ["tool"])
+DB_SECONDS = REGISTRY.histogram(
+    "library_db_seconds", "Time a pooled read connection was held, or a queued write took to complete.", ["kind"])
+
+
+class RequestMetrics:
+    """Timings and token counts of one request; safe to update from tool threads."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.llm_calls: List[Dict[str, float]] = []
+        self.iterations = 0
+        self.tools: List[Tuple[str, float]] = []
+        self.db_seconds = {"read": 0.0, "write": 0.0}
+
+    def add_llm_call(self, seconds: float, input_tokens: int, output_tokens: int) -> None:
+        with self._lock:
+            self.llm_calls.append({"seconds": seconds, "input_tokens": input_tokens, "output_tokens": output_tokens})
+
+    def add_tool(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.tools.append((name, seconds))
+
+    def add_db(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self.db_seconds[kind] = self.db_seconds.get(kind, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Any]:
+        """Millisecond totals; tool and DB times are summed, so concurrent work can exceed the wall time."""
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+                "llm_ms": round(sum(call["seconds"] for call in self.llm_calls) * 1000, 3),
+                "llm_calls": len(self.llm_calls),
+                "input_tokens": sum(call["input_tokens"] for call in self.llm_calls),
+                "output_tokens": sum(call["output_tokens"] for call in self.llm_calls),
+                "iterations": self.iterations,
+                "tool_ms": round(sum(seconds for _, seconds in self.tools) * 1000, 3),
+                "tools": [{"name": name, "ms": round(seconds * 1000, 3)} for name, seconds in self.tools],
+                "db_ms": round(sum(self.db_seconds.values()) * 1000, 3),
+                "db_read_ms": round(self.db_seconds.get("read", 0.0) * 1000, 3),
+                "db_write_ms": round(self.db_seconds.get("write", 0.0) * 1000, 3),
+            }
+
+
+# The request being served by the current task; copied into to_thread workers and gathered tasks
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request() -> RequestMetrics:
+    request = RequestMetrics()
+    _CURRENT.set(request)
+    return request
+
+
+def current() -> Optional[RequestMetrics]:
+    return _CURRENT.get()
+
+
+def finish_request(endpoint: str, path: str) -> Dict[str, Any]:
+    """
+    Closes the current request and records it in the process-wide metrics.
+
+    :param endpoint: 'chat' or 'chat_stream'.
+    :param path: How the request was answered: 'fast_path', 'response_cache', 'llm' or 'unavailable'.
+    :return: The request summary (see RequestMetrics.summary), or {} if no request was started.
+    """
+    request = _CURRENT.get()
+    if request is None:
+        return {}
+    _CURRENT.set(None)
+    summary = request.summary()
+    CHAT_REQUESTS.inc(endpoint=endpoint, path=path)
+    CHAT_SECONDS.observe(summary["total_ms"] / 1000, endpoint=endpoint, path=path)
+    return summary
+
+
+def record_llm_call(seconds: float, usage: Optional[Dict[str, Any]]) -> None:
+    """Records one llm_with_tools call; `usage` is the message's usage_metadata (may be None)."""
+    usage = usage or {}
+    input_tokens = int(usage.get("input_tokens") or 0)
+    output_tokens = int(usage.get("output_tokens") or 0)
+    LLM_CALL_SECONDS.observe(seconds)
+    LLM_TOKENS.inc(input_tokens, direction="input")
+    LLM_TOKENS.inc(output_tokens, direction="output")
+    request = _CURRENT.get()
+    if request is not None:
+        request.add_llm_call(seconds, input_tokens, output_tokens)
+
+
+def record_iterations(iterations: int) -> None:
+    AGENT_ITERATIONS.observe(iterations)
+    request = _CURRENT.get()
+    if request is not None:
+        request.iterations += iterations
+
+
+def record_tool(name: str, seconds: float) -> None:
+    TOOL_SECONDS.observe(seconds, tool=name)
+    request = _CURRENT.get()
+    if request is not None:
+        request.add_tool(name, seconds)
+
+
+def record_db(kind: str, seconds: float) -> None:
+    """Pool/writer observer: 'read' for a released pooled connection, 'write' for a completed write job."""
+    DB_SECONDS.observe(seconds, kind=kind)
+    request = _CURRENT.get()
+    if request is not None:
+        request.add_db(kind, seconds)
+
+
+def timing_headers(summary: Dict[str, Any]) -> Dict[str, str]:
+    """Server-Timing plus X-* headers for a request summary."""
+    if not summary:
+        return {}
+    return {
+        "Server-Timing": (f"total;dur={summary['total_ms']}, "
+                          f"llm;dur={summary['llm_ms']};desc=\"{summary['llm_calls']} calls\", "
+                          f"tools;dur={summary['tool_ms']}, db;dur={summary['db_ms']}"),
+        "X-LLM-Calls": str(summary["llm_calls"]),
+        "X-LLM-Input-Tokens": str(summary["input_tokens"]),
+        "X-LLM-Output-Tokens": str(summary["output_tokens"]),
+        "X-Agent-Iterations": str(summary["iterations"]),
+    }
@@ -0,0 +1,362 @@
+# /server/migrations.py
+#
+# Versioned schema migrations on top of db/schema.sql. The applied version is
+# tracked in SQLite's built-in PRAGMA user_version, so each migration runs
+# exactly once per database file.
+#
+# The server applies them on startup (see main.py); they can also be run by hand:
+#
+#   python migrations.py            # migrate ../db/library_desk.db (or $LIBRARY_DB_PATH)
+
+import sqlite3
+from typing import Dict, List, Tuple
+
+from db_tools import connect_db
+
+# (version, description, sql). Append only: never edit a migration once shipped.
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "books_fts full-text index on books(title, author)", """
+        -- External-content FTS5 table: stores only the index, rows live in books.
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author) VALUES (new.rowid, new.title, new.author);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.rowid, old.title, old.author);
+        END;
+
+        -- Only title/author changes touch the index; stock and price updates stay cheap.
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.rowid, old.title, old.author);
+            INSERT INTO books_fts(rowid, title, author) VALUES (new.rowid, new.title, new.author);
+        END;
+
+        -- Index every book already in the database.
+        INSERT INTO books_fts(books_fts) VALUES ('rebuild');
+    """),
+    (2, "indexes for history, order and tool-call lookups", """
+        -- load_history: WHERE session_id = ? ORDER BY created_at. Not covering on
+        -- purpose; copying every message body into the index would double its size.
+        CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at);
+
+        -- order_status: covers every order_items column the items query reads.
+        CREATE INDEX IF NOT EXISTS idx_order_items_order_cover ON order_items(order_id, isbn, qty, price_at_order);
+
+        CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id, order_date);
+
+        CREATE INDEX IF NOT EXISTS idx_tool_calls_session_created ON tool_calls(session_id, created_at);
+    """),
+    (3, "session_summaries for rolling conversation summaries", """
+        -- One row per session: a summary of its oldest `covered_messages` messages.
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            covered_messages INTEGER NOT NULL,
+            updated_at TEXT DEFAULT (datetime('now', 'localtime'))
+        );
+    """),
+    (4, "tool_calls trace columns: duration, status and payload sizes", """
+        ALTER TABLE tool_calls ADD COLUMN duration_ms REAL;
+        ALTER TABLE tool_calls ADD COLUMN status TEXT;
+        ALTER TABLE tool_calls ADD COLUMN args_bytes INTEGER;
+        ALTER TABLE tool_calls ADD COLUMN result_bytes INTEGER;
+
+        -- GET /tools/slowest: WHERE session_id = ? ORDER BY duration_ms DESC
+        CREATE INDEX IF NOT EXISTS idx_tool_calls_session_duration ON tool_calls(session_id, duration_ms);
+    """),
+    (5, "messages keyed by (session_id, id) for history pagination", """
+        -- load_history pages by message id (before/after cursors). created_at has
+        -- one-second resolution, so id is also the reliable order; the old index
+        -- would only cost writes now.
+        CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages(session_id, id);
+        DROP INDEX IF EXISTS idx_messages_session_created;
+    """),
+    (6, "inventory_totals aggregate and per-title low-stock thresholds", """
+        -- Replaces the hardcoded threshold of 5; set per title with set_low_stock_threshold.
+        ALTER TABLE books ADD COLUMN low_stock_threshold INTEGER NOT NULL DEFAULT 5;
+
+        -- inventory_summary low-stock list: only low titles are in the index,
+        -- so reading it costs O(low-stock titles), not O(catalog).
+        CREATE INDEX IF NOT EXISTS idx_books_low_stock ON books(stock) WHERE stock <= low_stock_threshold;
+
+        -- Single-row running totals, kept current by the triggers below.
+        CREATE TABLE IF NOT EXISTS inventory_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_titles INTEGER NOT NULL,
+            total_stock INTEGER NOT NULL
+        );
+        INSERT OR REPLACE INTO inventory_totals (id, total_titles, total_stock)
+            SELECT 1, COUNT(*), COALESCE(SUM(stock), 0) FROM books;
+
+        CREATE TRIGGER IF NOT EXISTS books_totals_ai AFTER INSERT ON books BEGIN
+            UPDATE inventory_totals SET total_titles = total_titles + 1, total_stock = total_stock + new.stock WHERE id = 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_totals_ad AFTER DELETE ON books BEGIN
+            UPDATE inventory_totals SET total_titles = total_titles - 1, total_stock = total_stock - old.stock WHERE id = 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_totals_au AFTER UPDATE OF stock ON books BEGIN
+            UPDATE inventory_totals SET total_stock = total_stock + new.stock - old.stock WHERE id = 1;
+        END;
+    """),
+    (7, "data_versions counters and the response_cache table", """
+        -- One counter per data domain, bumped by triggers on every change. A
+        -- cached answer records the counters of the domains its tools read.
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO data_versions (name) VALUES ('books'), ('orders'), ('customers');
+    """ + "".join(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {event} ON {table} BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = '{domain}';
+        END;
+        """
+        for table, domain in (("books", "books"), ("orders", "orders"), ("order_items", "orders"), ("customers", "customers"))
+        for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+    ) + """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            tools TEXT NOT NULL,      -- JSON list of the tools that produced the answer
+            versions TEXT NOT NULL,   -- JSON {domain: version} at the start of that turn
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache(last_used);
+    """),
+    (8, "books_fts keyed on a stable integer id instead of books' implicit rowid", """
+        -- books has a TEXT primary key, so its rowid is implicit and VACUUM may
+        -- renumber it, leaving books_fts pointing at the wrong books. Each ISBN
+        -- gets a permanent INTEGER PRIMARY KEY here and the index is keyed on that.
+        CREATE TABLE IF NOT EXISTS book_search_keys (
+            id INTEGER PRIMARY KEY,
+            isbn TEXT NOT NULL UNIQUE
+        );
+        INSERT OR IGNORE INTO book_search_keys (isbn) SELECT isbn FROM books ORDER BY rowid;
+
+        CREATE VIEW IF NOT EXISTS books_search AS
+            SELECT k.id, b.title, b.author FROM book_search_keys k JOIN books b ON b.isbn = k.isbn;
+
+        DROP TRIGGER IF EXISTS books_fts_ai;
+        DROP TRIGGER IF EXISTS books_fts_ad;
+        DROP TRIGGER IF EXISTS books_fts_au;
+        DROP TABLE IF EXISTS books_fts;
+
+        CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author,
+            content='books_search', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT OR IGNORE INTO book_search_keys (isbn) VALUES (new.isbn);
+            INSERT INTO books_fts(rowid, title, author)
+                SELECT id, new.title, new.author FROM book_search_keys WHERE isbn = new.isbn;
+        END;
+
+        CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author)
+                SELECT 'delete', id, old.title, old.author FROM book_search_keys WHERE isbn = old.isbn;
+            DELETE FROM book_search_keys WHERE isbn = old.isbn;
+        END;
+
+        CREATE TRIGGER books_fts_au AFTER UPDATE OF isbn, title, author ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author)
+                SELECT 'delete', id, old.title, old.author FROM book_search_keys WHERE isbn = old.isbn;
+            UPDATE book_search_keys SET isbn = new.isbn WHERE isbn = old.isbn;
+            INSERT INTO books_fts(rowid, title, author)
+                SELECT id, new.title, new.author FROM book_search_keys WHERE isbn = new.isbn;
+        END;
+
+        INSERT INTO books_fts(books_fts) VALUES ('rebuild');
+    """),
+    (9, "books looked up by ISBN digits, whatever hyphens or spaces they were stored with", """
+        -- lookup_isbn: '9780134494166', '978-0134494166' and '978 0 13 449416 6' are the same book.
+        CREATE INDEX IF NOT EXISTS idx_books_isbn_digits ON books(replace(replace(upper(isbn), '-', ''), ' ', ''));
+    """),
+]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Splits a migration script into single statements (trigger bodies stay whole)."""
+    statements, buffer = [], ""
+    for piece in sql.split(";"):
+        buffer += piece + ";"
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip(" \t\n;"):
+                statements.append(buffer.strip())
+            buffer = ""
+    return statements
+
+
+def apply_migrations(conn: sqlite3.Connection = None) -> Dict:
+    """
+    Applies every migration newer than the database's user_version, each in
+    its own transaction. Safe to run from several processes at once (e.g.
+    every server worker on startup): each migration takes the write lock with
+    BEGIN IMMEDIATE and re-reads user_version under it, so it is applied once
+    and the other processes skip it.
+
+    :param conn: Connection to migrate; a new one is opened (and closed) if omitted.
+    :return: Dictionary with status, the starting/final version and applied migrations.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+
+    start_version = current_version(conn)
+    applied = []
+    try:
+        for version, description, sql in MIGRATIONS:
+            if version <= start_version:
+                continue
+            # Statement by statement: executescript() would commit the BEGIN IMMEDIATE first.
+            conn.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= version:
+                conn.rollback()  # Applied by another process meanwhile
+                continue
+            for statement in split_statements(sql):
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied.append(f"{version}: {description}")
+        return {"status": "Success", "from_version": start_version,
+                "version": current_version(conn), "applied": applied}
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        return {"status": "Error", "message": f"Database error during migration: {e}",
+                "version": current_version(conn), "applied": applied}
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def sync_search_index(conn: sqlite3.Connection) -> None:
+    """rebuild_search_index's statements, run in the caller's transaction (no commit)."""
+    conn.execute("INSERT OR IGNORE INTO book_search_keys (isbn) SELECT isbn FROM books")
+    conn.execute("DELETE FROM book_search_keys WHERE isbn NOT IN (SELECT isbn FROM books)")
+    conn.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def rebuild_search_index(conn: sqlite3.Connection = None) -> Dict:
+    """
+    Rebuilds books_fts from the books table, first giving every ISBN a
+    book_search_keys id and dropping keys of deleted books. Needed after
+    books was written with the books_fts_* triggers dropped (see import_catalog.py).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    try:
+        sync_search_index(conn)
+        conn.commit()
+        return {"status": "Success"}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during rebuild_search_index: {e}"}
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def rebuild_inventory_totals(conn: sqlite3.Connection = None) -> Dict:
+    """Recomputes inventory_totals from books, e.g. after editing books with the triggers disabled."""
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO inventory_totals (id, total_titles, total_stock)
+            SELECT 1, COUNT(*), COALESCE(SUM(stock), 0) FROM books
+        """)
+        conn.commit()
+        return {"status": "Success"}
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"status": "Error", "message": f"Database error during rebuild_inventory_totals: {e}"}
+    finally:
+        if own_conn:
+            conn.close()
+
+
+# --- Query plans ---
+
+# Hot queries and the index each one must use (EXPLAIN QUERY PLAN detail substring).
+EXPECTED_PLANS: List[Tuple[str, str, str]] = [
+    ("load_history",
+     "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id ASC",
+     "USING INDEX idx_messages_session_id"),
+    ("load_history (page)",
+     "SELECT id, role, content FROM messages WHERE session_id = ? AND id < 9e18 ORDER BY id DESC LIMIT 50",
+     "USING INDEX idx_messages_session_id"),
+    ("count_messages",
+     "SELECT COUNT(*) FROM messages WHERE session_id = ?",
+     "USING COVERING INDEX idx_messages_session_id"),
+    ("order_status items",
+     "SELECT oi.isbn, oi.qty, oi.price_at_order FROM order_items oi WHERE oi.order_id = ?",
+     "USING COVERING INDEX idx_order_items_order_cover"),
+    ("orders by customer",
+     "SELECT id, order_date FROM orders WHERE customer_id = ?",
+     "USING COVERING INDEX idx_orders_customer"),
+    ("tool_calls by session",
+     "SELECT name, args_json FROM tool_calls WHERE session_id = ? ORDER BY created_at",
+     "USING INDEX idx_tool_calls_session_created"),
+    ("slowest tool calls",
+     "SELECT name, duration_ms FROM tool_calls WHERE session_id = ? AND duration_ms IS NOT NULL ORDER BY duration_ms DESC LIMIT 10",
+     "USING INDEX idx_tool_calls_session_duration"),
+    ("low stock titles",
+     "SELECT isbn, title, stock, low_stock_threshold FROM books WHERE stock <= low_stock_threshold ORDER BY stock, title",
+     "USING INDEX idx_books_low_stock"),
+    ("lookup_isbn",
+     "SELECT isbn FROM books WHERE replace(replace(upper(isbn), '-', ''), ' ', '') = ? LIMIT 1",
+     "USING INDEX idx_books_isbn_digits"),
+    ("find_books (fts)",
+     "SELECT b.isbn FROM books_fts f JOIN book_search_keys k ON k.id = f.rowid JOIN books b ON b.isbn = k.isbn "
+     "WHERE books_fts MATCH ? ORDER BY f.rank",
+     "VIRTUAL TABLE INDEX"),
+]
+
+
+# Queries whose ORDER BY only sorts an already small, index-selected set.
+SMALL_SORT_PLANS = {"low stock titles"}
+
+
+def query_plan(conn: sqlite3.Connection, query: str) -> str:
+    """The EXPLAIN QUERY PLAN details of a query, joined with ' | ' (placeholders bound to dummy values)."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", ("x",) * query.count("?")).fetchall()
+    return " | ".join(row[3] for row in rows)
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[Dict]:
+    """
+    Checks that every EXPECTED_PLANS query uses its index on this database.
+
+    :return: One {'label', 'plan', 'ok'} per query.
+    """
+    checks = []
+    for label, query, expected in EXPECTED_PLANS:
+        plan = query_plan(conn, query)
+        # A sort is fine once the index has narrowed the rows to a small set
+        ok = expected in plan and ("USE TEMP B-TREE" not in plan or label in SMALL_SORT_PLANS)
+        checks.append({"label": label, "plan": plan, "ok": ok})
+    return checks
+
+if __name__ == "__main__":
+    result = apply_migrations()
+    print(result)
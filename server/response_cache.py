@@ -0,0 +1,164 @@
+# /server/response_cache.py
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from db_tools import (data_versions, delete_cached_response, lookup_cached_response,
+                      store_cached_response, touch_cached_response)
+
+# Data domains (data_versions rows) each read-only tool depends on. An answer
+# produced by any tool not listed here (i.e. a write) is never cached.
+TOOL_DOMAINS: Dict[str, List[str]] = {
+    "find_books_tool": ["books"],
+    "inventory_summary_tool": ["books"],
+    "order_status_tool": ["orders", "customers", "books"],
+}
+
+# Words that usually point back into the conversation ("what about its price?").
+# The same text can then mean something else in another session, so such
+# prompts are neither cached nor served from the cache.
+CONTEXT_REFERENCE = re.compile(
+    r"\b(it|its|it's|that|those|these|them|they|their|he|she|his|her|same|again|previous|above|"
+    r"earlier|last one|first one|second one|the other)\b"
+)
+# Openers of an elliptical follow-up ("and for order 102?", "what about Clean Code?")
+FOLLOW_UP = re.compile(r"^(and|also|or|so|but|then|what about|how about)\b")
+FILLER = re.compile(r"^(?:(?:please|hi|hey|hello|ok|okay|can you|could you|would you|tell me)\s+)+|(?:\s+(?:please|thanks|thank you))+$")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercases, drops punctuation and politeness filler, and collapses whitespace."""
+    text = prompt.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s'-]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return FILLER.sub("", text).strip()
+
+
+class ResponseCache:
+    """
+    Cache of final agent answers for repeated questions, stored in SQLite and
+    shared by every session.
+
+    Prompts are keyed by their normalized text. An answer is only stored when
+    every tool behind it was read-only (see TOOL_DOMAINS) and it was the first
+    turn of its session, so it was produced from the prompt and the data
+    alone, never from another user's conversation. It is stored with the
+    data_versions of the domains those tools read, taken before the turn
+    started. A later identical question is answered from the cache only if
+    none of those domains changed since, and the entry is younger than
+    `ttl_seconds`. At most `max_entries` are kept, least recently used first out.
+
+    Prompts that look like follow-ups (CONTEXT_REFERENCE words such as "it" or
+    "that", or a FOLLOW_UP opener such as "and ..." or "what about ...") are
+    neither stored nor served, in any turn. A follow-up those patterns miss can
+    still get the answer the same question gets as a first turn.
+
+    Matching is lexical (normalized text), not embedding-based; there is no
+    embedding model in this stack.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600.0, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stored = 0
+        self.skipped = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def key(prompt: str) -> str:
+        return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+    @staticmethod
+    def is_cacheable_prompt(prompt: str) -> bool:
+        normalized = normalize_prompt(prompt)
+        return bool(normalized) and not CONTEXT_REFERENCE.search(normalized) and not FOLLOW_UP.match(normalized)
+
+    def get(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """Returns {'response', 'tools'} for a valid cached answer, or None."""
+        if not self.is_cacheable_prompt(prompt):
+            return None
+        key = self.key(prompt)
+        found = lookup_cached_response(key)
+        entry = found.get("entry") if found["status"] == "Success" else None
+        if entry is None:
+            self._count("misses")
+            return None
+
+        recorded = json.loads(entry["versions"])
+        expired = time.time() - entry["created_at"] > self.ttl_seconds
+        changed = any(found["versions"].get(domain) != version for domain, version in recorded.items())
+        if expired or changed:
+            self._count("stale")
+            delete_cached_response(key)
+            return None
+
+        self._count("hits")
+        touch_cached_response(key)
+        return {"response": entry["response"], "tools": json.loads(entry["tools"])}
+
+    def snapshot(self) -> Dict[str, int]:
+        """Data versions to pass to put(); read before the agent runs so concurrent writes invalidate."""
+        result = data_versions()
+        return result["versions"] if result["status"] == "Success" else {}
+
+    def put(self, prompt: str, response: str, tools_used: List[str], versions: Dict[str, int],
+            history_length: int) -> bool:
+        """
+        Stores an answer if it is safe to replay; returns whether it was stored.
+
+        :param history_length: Messages the session had before this turn; only first-turn (0) answers are stored.
+        """
+        cacheable = (
+            history_length == 0
+            and tools_used
+            and versions
+            and all(tool in TOOL_DOMAINS for tool in tools_used)
+            and self.is_cacheable_prompt(prompt)
+        )
+        if not cacheable:
+            self._count("skipped")
+            return False
+        domains = {domain for tool in tools_used for domain in TOOL_DOMAINS[tool]}
+        recorded = {domain: versions[domain] for domain in domains if domain in versions}
+        result = store_cached_response(self.key(prompt), normalize_prompt(prompt), response,
+                                       sorted(set(tools_used)), recorded, self.max_entries)
+        if result["status"] == "Success":
+            self._count("stored")
+            return True
+        return False
+
+    async def aget(self, prompt: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, prompt)
+
+    async def asnapshot(self) -> Dict[str, int]:
+        return await asyncio.to_thread(self.snapshot)
+
+    async def aput(self, prompt: str, response: str, tools_used: List[str], versions: Dict[str, int],
+                   history_length: int) -> bool:
+        return await asyncio.to_thread(self.put, prompt, response, tools_used, versions, history_length)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "stored": self.stored,
+                "skipped": self.skipped,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
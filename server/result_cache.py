@@ -0,0 +1,135 @@
+# /server/result_cache.py
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+
+class ResultCache:
+    """
+    LRU cache for read tool results with tag-based invalidation.
+
+    Each entry is stored with the set of tags it depends on (e.g. the ISBNs a
+    find_books result contains, or "stock" for inventory totals). A write
+    invalidates exactly the tags it touched, dropping only the entries that
+    could have changed.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        # Bumped on every invalidation; a read that overlapped one is not cached.
+        self.generation = 0
+        # Shared change counter the entries are valid for (see sync() and advance())
+        self._stamp: Any = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.remote_clears = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns a private copy of the cached result, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry["value"]
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any, tags: Iterable[str], generation: int) -> bool:
+        """
+        Caches value under key. `generation` must be read before computing the
+        value; if anything was invalidated since, the value may be stale and is dropped.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            tags = set(tags)
+            self._entries[key] = {"value": copy.deepcopy(value), "tags": tags}
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _remove(self, key: Hashable) -> None:
+        # Caller holds the lock
+        entry = self._entries.pop(key)
+        for tag in entry["tags"]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags: str) -> int:
+        """Drops every entry depending on any of the given tags; returns how many."""
+        with self._lock:
+            self.generation += 1
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def sync(self, stamp: Any) -> bool:
+        """
+        Clears the cache when `stamp`, a change counter read from shared storage,
+        differs from the one seen last. Called before reads, so writes made by
+        other processes (other workers, the catalog importer) also drop cached
+        results. Returns whether the cache was cleared.
+        """
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            self.generation += 1
+            if not self._entries:
+                return False
+            self._entries.clear()
+            self._tags.clear()
+            self.remote_clears += 1
+            return True
+
+    def advance(self, before: Any, after: Any) -> None:
+        """
+        Records that the shared change counter moved from `before` to `after`
+        through a write of this process that has already been invalidate()d by
+        tag. If the cache was in sync at `before` it stays in sync, so a local
+        write does not clear everything on the next sync().
+        """
+        with self._lock:
+            if before is not None and self._stamp == before:
+                self._stamp = after
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "remote_clears": self.remote_clears,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
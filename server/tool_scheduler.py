@@ -0,0 +1,122 @@
+# /server/tool_scheduler.py
+
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class ToolScheduler:
+    """
+    Executes the tool calls of one agent iteration.
+
+    Consecutive read-only calls are grouped into a batch and run concurrently;
+    a mutating call is a barrier that runs alone, after everything before it
+    and before everything after it. Results always come back in the order the
+    model issued the calls, so ToolMessages line up with their tool_call_ids.
+    """
+
+    def __init__(self, execute: Callable[[Dict], Any], aexecute: Callable[[Dict], Awaitable[Any]],
+                 read_only: Set[str], max_workers: int = 8):
+        """
+        :param execute: Runs one tool call synchronously and returns its message.
+        :param aexecute: Async equivalent of execute.
+        :param read_only: Names of tools that never write; anything else is treated as mutating.
+        :param max_workers: Thread pool size for concurrent sync execution.
+        """
+        self.execute = execute
+        self.aexecute = aexecute
+        self.read_only = read_only
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def is_read_only(self, tool_call: Dict) -> bool:
+        return tool_call["name"] in self.read_only
+
+    def plan(self, tool_calls: List[Dict]) -> List[List[Dict]]:
+        """Splits tool calls into ordered batches that are safe to run concurrently."""
+        batches: List[List[Dict]] = []
+        for tool_call in tool_calls:
+            if self.is_read_only(tool_call) and batches and self.is_read_only(batches[-1][0]):
+                batches[-1].append(tool_call)
+            else:
+                batches.append([tool_call])
+        return batches
+
+    def _timed(self, tool_call: Dict, context: Dict) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        result = self.execute(tool_call, **context)
+        return result, time.perf_counter() - start
+
+    async def _atimed(self, tool_call: Dict, context: Dict) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        result = await self.aexecute(tool_call, **context)
+        return result, time.perf_counter() - start
+
+    def run(self, tool_calls: List[Dict], **context) -> List[Any]:
+        """
+        Runs all tool calls of an iteration, read-only batches on the thread pool.
+        Keyword arguments (e.g. session_id) are passed through to execute.
+        """
+        start = time.perf_counter()
+        timed: List[Tuple[Any, float]] = []
+        for batch in self.plan(tool_calls):
+            if len(batch) == 1:
+                timed.append(self._timed(batch[0], context))
+            else:
+                # Each call runs in a copy of this thread's context, so the current trace span carries over
+                futures = [self._executor.submit(contextvars.copy_context().run, self._timed, tool_call, context)
+                           for tool_call in batch]
+                timed.extend(future.result() for future in futures)
+        return self._report(timed, time.perf_counter() - start)
+
+    async def arun(self, tool_calls: List[Dict], **context) -> List[Any]:
+        """Async variant of run(); read-only batches are gathered on the event loop."""
+        start = time.perf_counter()
+        timed: List[Tuple[Any, float]] = []
+        for batch in self.plan(tool_calls):
+            timed.extend(await asyncio.gather(*(self._atimed(tool_call, context) for tool_call in batch)))
+        return self._report(timed, time.perf_counter() - start)
+
+    @staticmethod
+    def _report(timed: List[Tuple[Any, float]], wall: float) -> List[Any]:
+        serial = sum(elapsed for _, elapsed in timed)
+        if len(timed) > 1:
+            print(f"[Tool Timing] {len(timed)} calls: wall={wall * 1000:.1f}ms "
+                  f"serial={serial * 1000:.1f}ms saved={(serial - wall) * 1000:.1f}ms")
+        return [result for result, _ in timed]
+
+
+class TurnMemo:
+    """
+    Memo of read-only tool results within one agent turn.
+
+    When the model repeats a read-only call with identical arguments, the
+    earlier output is reused instead of running the tool again. Any mutating
+    call clears the memo, since it may have changed what the reads return.
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self.saved = 0
+
+    @staticmethod
+    def key(tool_call: Dict) -> Tuple[str, str]:
+        return tool_call["name"], json.dumps(tool_call["args"], sort_keys=True, default=str)
+
+    def lookup(self, tool_call: Dict) -> Optional[str]:
+        with self._lock:
+            content = self._results.get(self.key(tool_call))
+            if content is not None:
+                self.saved += 1
+            return content
+
+    def record(self, tool_call: Dict, content: str, read_only: bool, ok: bool = True) -> None:
+        with self._lock:
+            if not read_only:
+                self._results.clear()
+            elif ok:
+                self._results[self.key(tool_call)] = content
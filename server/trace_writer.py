@@ -0,0 +1,119 @@
+# /server/trace_writer.py
+
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+
+class TraceWriter:
+    """
+    Buffers tool call traces and writes them in batches from a background thread.
+
+    record() only enqueues, so tracing never adds a synchronous write to the
+    request path. The background thread flushes once `batch_size` traces are
+    waiting or `flush_interval` seconds have passed, handing each batch to
+    `sink` (one executemany transaction). If the buffer is full, new traces are
+    dropped and counted rather than blocking the agent.
+    """
+
+    def __init__(self, sink: Callable[[List[tuple]], Dict], batch_size: int = 50,
+                 flush_interval: float = 1.0, max_buffer: int = 10000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_buffer)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed_batches = 0
+        atexit.register(self.close)  # Don't lose the last partial batch on shutdown
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def record(self, session_id: str, name: str, args_json: str, result_json: str,
+               duration_ms: float, status: str) -> None:
+        """Queues one trace; never blocks."""
+        self._ensure_started()
+        row = (session_id, name, args_json, result_json, round(duration_ms, 3), status,
+               len(args_json.encode()), len(result_json.encode()))
+        try:
+            self._queue.put_nowait(row)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch: List[tuple]) -> None:
+        try:
+            result = self.sink(batch)
+            ok = result.get("status") == "Success"
+        except Exception as e:
+            result, ok = {"message": str(e)}, False
+        if ok:
+            self.written += len(batch)
+            self.batches += 1
+        else:
+            self.failed_batches += 1
+            print(f"[Trace] Dropped a batch of {len(batch)} tool call traces: {result.get('message')}")
+
+    def _run(self) -> None:
+        batch: List[tuple] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = False  # Interval elapsed
+
+            stop = item is None
+            if isinstance(item, threading.Event):
+                flushed = item
+            else:
+                flushed = None
+                if isinstance(item, tuple):
+                    batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or item is False or stop or flushed):
+                self._write(batch)
+                batch = []
+            if item is False or not batch:
+                deadline = time.monotonic() + self.flush_interval
+            if flushed is not None:
+                flushed.set()
+            if stop:
+                return
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Blocks until everything recorded so far has been handed to the sink."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Flushes remaining traces and stops the background thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "pending": self._queue.qsize(),
+        }
@@ -0,0 +1,283 @@
+# /server/tracing.py
+#
+# Span tracing for a chat turn: the endpoint, history loading, every agent
+# iteration and LLM call, every tool invoke and every SQL statement. Spans use
+# OpenTelemetry's data model (128-bit trace ids, 64-bit span ids, W3C
+# traceparent propagation) and are exported locally, with no collector:
+#
+#   TRACE_EXPORTER=console   one line per span on stdout
+#   TRACE_EXPORTER=file      one OTLP/JSON document per trace appended to TRACE_FILE,
+#                            readable by the collector's otlpjsonfile receiver
+#   TRACE_EXPORTER=none      (default) spans are still created, so trace ids are
+#                            returned to clients, but nothing is written
+
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "library-desk-agent")
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "spans.jsonl")
+SQL_STATEMENT_MAX_CHARS = 500
+
+# OTLP enum values
+SPAN_KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+STATUS_CODES = {"UNSET": 0, "OK": 1, "ERROR": 2}
+
+
+class Span:
+    """One timed operation; ids are lowercase hex like OpenTelemetry's."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "remote_parent",
+                 "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 remote_parent: bool, attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.remote_parent = remote_parent
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "UNSET"
+        self.status_message = ""
+
+    @property
+    def is_local_root(self) -> bool:
+        return self.parent_id is None or self.remote_parent
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_status(self, status: str, message: str = "") -> None:
+        self.status = status
+        self.status_message = message
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": STATUS_CODES[self.status], "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# --- EXPORTERS ---
+
+class ConsoleSpanExporter:
+    """Prints each finished span on one line (trace id, name, duration, attributes)."""
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            status = "" if span.status != "ERROR" else f" ERROR {span.status_message}"
+            print(f"[Span] {span.trace_id} {span.span_id} parent={span.parent_id or '-'} "
+                  f"{span.name} {span.duration_ms:.3f}ms {json.dumps(span.attributes, default=str)}{status}")
+
+    def close(self) -> None:
+        pass
+
+
+class FileSpanExporter:
+    """Appends one OTLP/JSON ExportTraceServiceRequest line per batch of spans."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, spans: List[Span]) -> None:
+        document = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "library-desk"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        line = json.dumps(document, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def make_exporter(kind: str, path: str):
+    """Exporter for TRACE_EXPORTER ('console', 'file' or 'none'); None disables export."""
+    if kind == "console":
+        return ConsoleSpanExporter()
+    if kind == "file":
+        return FileSpanExporter(path)
+    if kind not in ("", "none"):
+        print(f"Warning: unknown TRACE_EXPORTER '{kind}'; spans will not be exported.")
+    return None
+
+
+EXPORTER = make_exporter(TRACE_EXPORTER, TRACE_FILE)
+ENABLED = EXPORTER is not None
+if EXPORTER is not None:
+    atexit.register(EXPORTER.close)
+
+# Finished spans are held per trace and exported together when the trace's local root ends
+_PENDING: Dict[str, List[Span]] = {}
+_PENDING_LOCK = threading.Lock()
+
+_CURRENT: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def _finish(span: Span) -> None:
+    span.end_ns = time.time_ns()
+    if EXPORTER is None:
+        return
+    with _PENDING_LOCK:
+        if span.is_local_root:
+            batch = _PENDING.pop(span.trace_id, []) + [span]
+        else:
+            _PENDING.setdefault(span.trace_id, []).append(span)
+            return
+    EXPORTER.export(batch)
+
+
+# --- SPANS ---
+
+def current_span() -> Optional[Span]:
+    return _CURRENT.get()
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Sets an attribute on the current span, if there is one."""
+    span = _CURRENT.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+def parse_traceparent(header: Any) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a W3C traceparent header, or None if absent or malformed."""
+    if not isinstance(header, str):
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "INTERNAL",
+         remote_parent: Optional[Tuple[str, str]] = None, require_parent: bool = False) -> Iterator[Optional[Span]]:
+    """
+    Runs the block as a child of the current span (or as a new trace) and makes
+    it the current span. An exception marks the span ERROR and is re-raised.
+
+    :param remote_parent: (trace_id, span_id) from an incoming traceparent; starts a local root under it.
+    :param require_parent: Yield None and record nothing when there is no current span (used for SQL).
+    """
+    parent = _CURRENT.get()
+    if parent is None and require_parent:
+        yield None
+        return
+    if parent is not None:
+        current = Span(name, kind, parent.trace_id, parent.span_id, False, attributes)
+    elif remote_parent is not None:
+        current = Span(name, kind, remote_parent[0], remote_parent[1], True, attributes)
+    else:
+        current = Span(name, kind, secrets.token_hex(16), None, False, attributes)
+
+    token = _CURRENT.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.set_status("ERROR", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        try:
+            _CURRENT.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned stream); restore the parent explicitly
+            _CURRENT.set(parent)
+        _finish(current)
+
+
+# --- SQL ---
+
+def _sql_span(sql: str):
+    statement = " ".join(sql.split())
+    operation = statement.split(" ", 1)[0].upper() if statement else ""
+    return span(f"sql {operation}", {"db.system": "sqlite", "db.operation": operation,
+                                     "db.statement": statement[:SQL_STATEMENT_MAX_CHARS]},
+                kind="CLIENT", require_parent=True)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor whose statements are recorded as child spans; the span covers execution up to the first row."""
+
+    def execute(self, sql, parameters=()):
+        with _sql_span(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with _sql_span(sql):
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with _sql_span(sql_script):
+            return super().executescript(sql_script)
+
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3.connect(factory=TracedConnection) traces every statement run through the connection."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* bypass Cursor.execute, so they are routed through a traced cursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
@@ -0,0 +1,90 @@
+# /tests/conftest.py
+#
+# The server modules import each other by bare name (they run from server/),
+# so the tests put server/ on the path the same way.
+#
+#   python -m pytest -q
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_DIR = os.path.join(ROOT, "server")
+DB_DIR = os.path.join(ROOT, "db")
+sys.path.insert(0, SERVER_DIR)
+
+
+def create_database(path: str, migrate: bool = True) -> str:
+    """Writes db/schema.sql + db/seed.sql to `path`, optionally migrated to the latest version."""
+    conn = sqlite3.connect(path)
+    for name in ("schema.sql", "seed.sql"):
+        with open(os.path.join(DB_DIR, name)) as f:
+            conn.executescript(f.read())
+    conn.commit()
+    if migrate:
+        from migrations import apply_migrations
+        result = apply_migrations(conn)
+        assert result["status"] == "Success", result
+    conn.close()
+    return path
+
+
+# db_tools reads LIBRARY_DB_PATH on import, and main.py migrates it on import.
+# Point both at a scratch database so the suite never opens db/library_desk.db;
+# tests that touch data use the `db` fixture below instead.
+os.environ["LIBRARY_DB_PATH"] = create_database(
+    os.path.join(tempfile.mkdtemp(prefix="library_tests_"), "library_desk.db"))
+
+import db_tools  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    A fresh migrated seed database that db_tools (and processes spawned by the
+    test, through LIBRARY_DB_PATH) use. Yields the file path.
+    """
+    path = create_database(str(tmp_path / "library_desk.db"))
+    monkeypatch.setenv("LIBRARY_DB_PATH", path)
+    monkeypatch.setattr(db_tools, "DB_PATH", path)
+    monkeypatch.setattr(db_tools, "RESULT_CACHE", ResultCache(max_entries=db_tools.RESULT_CACHE_SIZE))
+    yield path
+    if "agent" in sys.modules:
+        sys.modules["agent"].TRACER.flush()  # Write this test's tool traces before its database goes away
+    # Connections of this test's database must not leak into the next test
+    db_tools.WRITER.close()
+    db_tools.POOL.close_all()
+
+
+@pytest.fixture
+def app(db, monkeypatch):
+    """
+    main.py with an agent driven by fake_llm.ScriptedChatModel and fresh
+    per-test caches. The fast path and the response cache start switched off;
+    tests that exercise them set main.FAST_PATH / main.RESPONSE_CACHE.
+    """
+    import agent
+    import main
+    from fake_llm import ScriptedChatModel
+    from history_cache import HistoryCache
+
+    library_agent = agent.create_library_agent(ScriptedChatModel())
+    monkeypatch.setattr(main, "AGENT", library_agent)
+    monkeypatch.setattr(main.CONTEXT, "llm", library_agent.llm)
+    monkeypatch.setattr(main, "HISTORY_CACHE", HistoryCache())
+    monkeypatch.setattr(main, "FAST_PATH", None)
+    monkeypatch.setattr(main, "RESPONSE_CACHE", None)
+    return main
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app.app) as test_client:
+        yield test_client
@@ -0,0 +1,105 @@
+# /tests/test_batch_writes.py
+
+import sqlite3
+
+import db_tools
+
+PRAGMATIC = "978-0134494166"  # 15 in stock, 45.99
+CLEAN_CODE = "978-0132350884"  # 5 in stock, 39.50
+REFACTORING = "978-0321773025"  # 12 in stock, 55.00
+MISSING = "978-0000000000"
+
+
+def _books(path: str) -> dict:
+    with sqlite3.connect(path) as conn:
+        return {isbn: (stock, price) for isbn, stock, price in conn.execute("SELECT isbn, stock, price FROM books")}
+
+
+def _outcomes(result: dict) -> dict:
+    return {item["isbn"]: item for item in result["results"]}
+
+
+def test_restock_books_applies_every_valid_line(db):
+    result = db_tools.restock_books([{"isbn": PRAGMATIC, "qty": 5}, {"isbn": CLEAN_CODE, "qty": 1}])
+
+    assert (result["status"], result["applied"], result["failed"]) == ("Success", 2, 0)
+    outcomes = _outcomes(result)
+    assert (outcomes[PRAGMATIC]["new_stock"], outcomes[CLEAN_CODE]["new_stock"]) == (20, 6)
+    assert outcomes[PRAGMATIC]["title"] == "The Pragmatic Programmer"
+    assert _books(db)[PRAGMATIC][0] == 20
+
+
+def test_restock_books_reports_invalid_lines_and_applies_the_rest(db):
+    result = db_tools.restock_books([
+        {"isbn": PRAGMATIC, "qty": 5},
+        {"isbn": MISSING, "qty": 1},
+        {"isbn": CLEAN_CODE, "qty": -3},
+        {"isbn": REFACTORING, "qty": "2"},
+    ])
+
+    assert (result["status"], result["applied"], result["failed"]) == ("Success", 1, 3)
+    outcomes = _outcomes(result)
+    assert outcomes[PRAGMATIC] == {"isbn": PRAGMATIC, "status": "Success", "title": "The Pragmatic Programmer",
+                                   "new_stock": 20}
+    assert outcomes[MISSING]["message"] == f"Book with ISBN {MISSING} not found."
+    assert "positive integer" in outcomes[CLEAN_CODE]["message"]
+    assert "positive integer" in outcomes[REFACTORING]["message"]
+    books = _books(db)
+    assert (books[CLEAN_CODE][0], books[REFACTORING][0]) == (5, 12)
+
+
+def test_repeated_isbns_are_summed_unless_one_of_their_lines_is_invalid(db):
+    result = db_tools.restock_books([
+        {"isbn": PRAGMATIC, "qty": 2}, {"isbn": PRAGMATIC, "qty": 3},
+        {"isbn": CLEAN_CODE, "qty": 2}, {"isbn": CLEAN_CODE, "qty": 0}, {"isbn": CLEAN_CODE, "qty": 4},
+    ])
+
+    outcomes = _outcomes(result)
+    assert outcomes[PRAGMATIC]["new_stock"] == 20
+    assert outcomes[CLEAN_CODE]["status"] == "Error"
+    assert len(result["results"]) == 2
+    assert _books(db)[CLEAN_CODE][0] == 5
+
+
+def test_update_prices_last_price_wins_and_invalid_prices_are_reported(db):
+    result = db_tools.update_prices([
+        {"isbn": PRAGMATIC, "price": 50}, {"isbn": PRAGMATIC, "price": 47.25},
+        {"isbn": CLEAN_CODE, "price": -1}, {"isbn": MISSING, "price": 10.0},
+    ])
+
+    assert (result["status"], result["applied"], result["failed"]) == ("Success", 1, 2)
+    outcomes = _outcomes(result)
+    assert outcomes[PRAGMATIC]["new_price"] == 47.25
+    assert "non-negative" in outcomes[CLEAN_CODE]["message"]
+    books = _books(db)
+    assert books[PRAGMATIC][1] == 47.25
+    assert books[CLEAN_CODE][1] == 39.5
+
+
+def test_nothing_applied_is_an_error(db):
+    result = db_tools.update_prices([{"isbn": MISSING, "price": 1.0}])
+
+    assert (result["status"], result["applied"], result["message"]) == ("Error", 0, "No items were applied.")
+
+
+def test_a_failing_update_rolls_back_the_whole_batch(db):
+    with sqlite3.connect(db) as conn:
+        conn.execute(f"""
+            CREATE TRIGGER refuse_refactoring BEFORE UPDATE OF stock ON books WHEN new.isbn = '{REFACTORING}'
+            BEGIN SELECT RAISE(ABORT, 'refused'); END
+        """)
+    before = _books(db)
+
+    result = db_tools.restock_books([{"isbn": PRAGMATIC, "qty": 1}, {"isbn": REFACTORING, "qty": 1},
+                                     {"isbn": CLEAN_CODE, "qty": 1}])
+
+    assert result == {"status": "Error", "message": "Database error during restock_books: refused"}
+    assert _books(db) == before
+    assert db_tools.restock_book(PRAGMATIC, 1)["new_stock"] == 16  # The writer connection is usable again
+
+
+def test_batch_writes_invalidate_cached_reads(db):
+    assert db_tools.find_books("pragmatic")["books"][0]["price"] == 45.99
+    db_tools.update_prices([{"isbn": PRAGMATIC, "price": 42.0}])
+
+    assert db_tools.find_books("pragmatic")["books"][0]["price"] == 42.0
@@ -0,0 +1,67 @@
+# /tests/test_chat_stream.py
+
+import json
+
+import db_tools
+
+
+def _events(body: str) -> list:
+    """Parses a Server-Sent Events body into [(event name, data dict)]."""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _stream(client, prompt: str, session_id: str) -> list:
+    with client.stream("POST", "/chat/stream", json={"prompt": prompt, "session_id": session_id}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return _events(response.read().decode())
+
+
+def test_stream_reports_tools_then_tokens_then_the_final_answer(client):
+    events = _stream(client, "find books about code", "stream-1")
+
+    names = [name for name, _ in events]
+    assert names[:2] == ["tool_call", "tool_result"]
+    assert set(names[2:-1]) == {"token"}
+    assert names[-1] == "final"
+
+    _, call = events[0]
+    assert (call["name"], call["args"]) == ("find_books_tool", {"q": "code"})
+    assert events[1][1]["content"].startswith('{"status": "Success"')
+
+    final = events[-1][1]
+    assert "".join(data["content"] for name, data in events if name == "token") == final["content"]
+    assert final["content"] == "Here are the matching books."
+    assert final["tool_info"] == "Tools used: find_books_tool"
+    assert final["timing"]["llm_calls"] == 2
+    assert len(final["trace_id"]) == 32
+
+
+def test_streamed_turn_is_saved_before_the_final_event(client):
+    _stream(client, "find books about code", "stream-2")
+
+    history = db_tools.load_history("stream-2")["history"]
+    assert [(m["role"], m["content"]) for m in history] == [
+        ("user", "find books about code"), ("assistant", "Here are the matching books.")]
+
+
+def test_stream_and_chat_give_the_same_answer(client):
+    streamed = _stream(client, "what's in the inventory", "stream-3")[-1][1]["content"]
+    answered = client.post("/chat", json={"prompt": "what's in the inventory", "session_id": "stream-4"}).json()
+
+    assert streamed == answered["response"] == "Inventory checked."
+
+
+def test_fast_path_turn_streams_its_tool_and_answer(app, client, monkeypatch):
+    from fast_path import FastPathRouter
+    monkeypatch.setattr(app, "FAST_PATH", FastPathRouter())
+
+    events = _stream(client, "status of order 101", "stream-5")
+
+    assert [name for name, _ in events] == ["tool_call", "tool_result", "final"]
+    assert events[0][1]["name"] == "order_status_tool"
+    assert "(no LLM call)" in events[-1][1]["tool_info"]
@@ -0,0 +1,109 @@
+# /tests/test_concurrency.py
+
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import db_tools
+
+ISBN = "978-0201485677"
+SOLD_QUERY = "SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE isbn = ?"
+
+
+def _stock_and_sold(path: str, isbn: str):
+    with sqlite3.connect(path) as conn:
+        stock = conn.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,)).fetchone()[0]
+        sold = conn.execute(SOLD_QUERY, (isbn,)).fetchone()[0]
+    return stock, sold
+
+
+def test_configure_database_switches_to_wal(db):
+    result = db_tools.configure_database()
+
+    assert result["status"] == "Success"
+    assert result["journal_mode"] == "wal"
+
+
+def test_concurrent_orders_and_reads_never_hit_a_locked_database(db):
+    db_tools.configure_database()
+    _, sold_before = _stock_and_sold(db, ISBN)
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE books SET stock = 1000 WHERE isbn = ?", (ISBN,))
+
+    def hammer(i: int) -> dict:
+        if i % 2 == 0:
+            return db_tools.create_order(1 + i % 6, [{"isbn": ISBN, "qty": 1}])
+        return db_tools.find_books("Design")
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(hammer, range(400)))
+
+    assert [r["message"] for r in results if r["status"] == "Error"] == []
+    stock, sold = _stock_and_sold(db, ISBN)
+    assert sold - sold_before == 200
+    assert stock == 1000 - 200
+
+
+def _buy_one_copy_repeatedly(args) -> dict:
+    """
+    One spawned process racing for ISBN: its own db_tools, writer thread and
+    connections, so the processes only coordinate through SQLite locking,
+    like separate server workers.
+    """
+    threads, calls = args
+    outcome = {"sold": 0, "refused": 0, "errors": []}
+
+    def buy(i: int) -> None:
+        result = db_tools.create_order(1 + i % 6, [{"isbn": ISBN, "qty": 1}])
+        if result["status"] == "Success":
+            outcome["sold"] += 1
+        elif "Insufficient stock" in result["message"]:
+            outcome["refused"] += 1
+        else:
+            outcome["errors"].append(result["message"])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(buy, range(threads * calls)))
+    db_tools.WRITER.close()
+    db_tools.POOL.close_all()
+    return outcome
+
+
+def test_processes_racing_for_the_last_copies_never_oversell(db):
+    db_tools.configure_database()
+    processes, threads, calls = 3, 4, 10
+    initial_stock = processes * threads * calls // 4
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE books SET stock = ? WHERE isbn = ?", (initial_stock, ISBN))
+    _, sold_before = _stock_and_sold(db, ISBN)
+
+    # spawn: every process builds its own db_tools writer thread and connections
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        outcomes = pool.map(_buy_one_copy_repeatedly, [(threads, calls)] * processes)
+
+    assert [e for outcome in outcomes for e in outcome["errors"]] == []
+    stock, sold = _stock_and_sold(db, ISBN)
+    assert sum(outcome["sold"] for outcome in outcomes) == initial_stock
+    assert sum(outcome["refused"] for outcome in outcomes) == processes * threads * calls - initial_stock
+    assert sold - sold_before == initial_stock
+    assert stock == 0
+
+
+def _shared_state(_) -> tuple:
+    return db_tools.MULTI_PROCESS, db_tools.SHARED_STATE
+
+
+def test_worker_processes_default_to_sqlite_shared_state(monkeypatch):
+    # `uvicorn main:app --workers N` spawns its workers like this, without setting WEB_CONCURRENCY
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.delenv("SHARED_STATE", raising=False)
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        assert pool.map(_shared_state, [None]) == [(True, "sqlite")]
+
+    code = "import db_tools; print(db_tools.MULTI_PROCESS, db_tools.SHARED_STATE)"
+    single = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(db_tools.__file__),
+                            capture_output=True, text=True, check=True)
+    assert single.stdout.split() == ["False", "process"]
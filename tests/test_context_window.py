@@ -0,0 +1,82 @@
+# /tests/test_context_window.py
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import db_tools
+from agent import create_library_agent
+from context_window import ContextWindow, estimate_tokens
+from fake_llm import ScriptedChatModel
+
+
+def _history(turns: int, words: int = 20) -> list:
+    history = []
+    for i in range(turns):
+        history.append(HumanMessage(content=f"question {i} " + "word " * words))
+        history.append(AIMessage(content=f"answer {i} " + "word " * words))
+    return history
+
+
+def test_short_history_is_sent_unchanged(db):
+    history = _history(3)
+
+    assert asyncio.run(ContextWindow(keep_turns=6).prepare("short", history)) == history
+
+
+def test_long_history_is_cut_to_the_budget_behind_a_summary(db):
+    window = ContextWindow(keep_turns=6, token_budget=400, summary_max_tokens=100, fold_turns=4)
+    history = _history(40)
+
+    prepared = asyncio.run(window.prepare("long", history))
+
+    summary, recent = prepared[0], prepared[1:]
+    assert isinstance(summary, SystemMessage)
+    assert recent == history[len(history) - len(recent):]
+    assert estimate_tokens(recent) <= window.token_budget - window.summary_max_tokens
+    assert len(summary.content) <= window.summary_max_tokens * 4 + len("Summary of the earlier conversation:\n")
+    stored = db_tools.load_summary("long")
+    assert stored["covered_messages"] == len(history) - len(recent)
+
+
+def test_summary_is_reused_until_enough_new_turns_accumulate(db):
+    window = ContextWindow(keep_turns=2, token_budget=10000, fold_turns=4)
+    history = _history(12)
+    asyncio.run(window.prepare("rolling", history))
+    covered = db_tools.load_summary("rolling")["covered_messages"]
+
+    history += _history(2)  # Fewer than fold_turns new turns: no new fold
+    asyncio.run(window.prepare("rolling", history))
+    assert db_tools.load_summary("rolling")["covered_messages"] == covered
+
+    history += _history(3)
+    asyncio.run(window.prepare("rolling", history))
+    assert db_tools.load_summary("rolling")["covered_messages"] > covered
+
+
+def test_a_single_message_over_budget_is_still_kept(db):
+    window = ContextWindow(keep_turns=6, token_budget=200, summary_max_tokens=50)
+    history = _history(2) + [HumanMessage(content="x" * 4000)]
+
+    prepared = asyncio.run(window.prepare("huge", history))
+
+    assert prepared[-1] is history[-1]
+
+
+def test_windowed_turns_are_faster_with_a_prompt_sensitive_model(db):
+    # 20ms per LLM call + 20ms per 1000 prompt tokens; each turn makes two calls
+    model = ScriptedChatModel(latency=0.02, input_latency=0.02)
+    agent = create_library_agent(model)
+    window = ContextWindow(llm=model)
+    history = _history(300)
+    prepared = asyncio.run(window.prepare("latency", history))
+
+    def turn_seconds(messages: list) -> float:
+        start = time.perf_counter()
+        asyncio.run(agent.arun("find books about code", messages))
+        return time.perf_counter() - start
+
+    full, windowed = turn_seconds(history), turn_seconds(prepared)
+    assert estimate_tokens(prepared) < estimate_tokens(history) / 10
+    assert windowed < full / 2
@@ -0,0 +1,138 @@
+# /tests/test_fake_llm.py
+
+import asyncio
+import time
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from fake_llm import DEFAULT_SCRIPT, ScriptedChatModel
+from loadtest import run_load
+
+SCRIPT = [
+    {"match": r"weather", "steps": [
+        {"tool_calls": [{"name": "first_tool", "args": {"city": "Oslo"}}, {"name": "second_tool"}]},
+        {"content": "It is sunny in Oslo."},
+    ]},
+    {"steps": [{"content": "Fallback answer."}]},
+]
+
+
+def _after_tools(messages, response):
+    """Appends a scripted tool-call response and one ToolMessage per call, like the agent loop does."""
+    return messages + [response] + [ToolMessage(content="{}", tool_call_id=call["id"]) for call in response.tool_calls]
+
+
+def test_steps_follow_the_ai_messages_since_the_last_user_message():
+    model = ScriptedChatModel(SCRIPT).bind_tools([])
+    messages = [SystemMessage(content="system"), HumanMessage(content="What's the WEATHER like?")]
+
+    first = model.invoke(messages)
+    assert [(call["name"], call["args"]) for call in first.tool_calls] == [("first_tool", {"city": "Oslo"}),
+                                                                           ("second_tool", {})]
+    assert [call["id"] for call in first.tool_calls] == ["call_2_0", "call_2_1"]
+
+    messages = _after_tools(messages, first)
+    assert model.invoke(messages).content == "It is sunny in Oslo."
+    assert model.invoke(messages + [AIMessage(content="It is sunny in Oslo.")]).content == "Done."
+
+    # A new user message starts its own script from the first step
+    messages += [AIMessage(content="It is sunny in Oslo."), HumanMessage(content="Anything else?")]
+    assert model.invoke(messages).content == "Fallback answer."
+    assert model.calls == 4
+
+
+def test_default_script_drives_the_library_tools():
+    model = ScriptedChatModel().bind_tools([])
+
+    names = {prompt: model.invoke([HumanMessage(content=prompt)]).tool_calls[0]["name"]
+             for prompt in ["Restock it", "Where is my order?", "Find books", "Hello"]}
+
+    assert model.script is DEFAULT_SCRIPT
+    assert names == {"Restock it": "restock_book_tool", "Where is my order?": "order_status_tool",
+                     "Find books": "find_books_tool", "Hello": "inventory_summary_tool"}
+
+
+def test_unbound_model_summarizes_with_the_tail_of_the_last_message():
+    response = ScriptedChatModel(SCRIPT).invoke([HumanMessage(content="x" * 1000 + "weather")])
+
+    assert response.tool_calls == []
+    assert len(response.content) == 400 and response.content.endswith("weather")
+
+
+def test_usage_metadata_estimates_four_characters_per_token():
+    model = ScriptedChatModel(SCRIPT).bind_tools([])
+
+    tool_response = model.invoke([HumanMessage(content="weather" + "." * 393)])
+    answer = model.invoke([HumanMessage(content="hello")])
+
+    assert tool_response.usage_metadata == {"input_tokens": 100, "output_tokens": 20, "total_tokens": 120}
+    assert answer.usage_metadata == {"input_tokens": 1, "output_tokens": 4, "total_tokens": 5}
+
+
+def test_astream_yields_tool_call_chunks_or_words():
+    model = ScriptedChatModel(SCRIPT).bind_tools([])
+    messages = [HumanMessage(content="weather")]
+
+    async def collect(messages):
+        return [chunk async for chunk in model.astream(messages)]
+
+    tool_chunks = asyncio.run(collect(messages))
+    assert len(tool_chunks) == 1
+    assert [chunk["name"] for chunk in tool_chunks[0].tool_call_chunks] == ["first_tool", "second_tool"]
+    assert tool_chunks[0].tool_call_chunks[0]["args"] == '{"city": "Oslo"}'
+
+    messages = _after_tools(messages, model.invoke(messages))
+    word_chunks = asyncio.run(collect(messages))
+    assert "".join(chunk.content for chunk in word_chunks) == "It is sunny in Oslo."
+    assert len(word_chunks) == 5
+    assert [chunk.usage_metadata is not None for chunk in word_chunks] == [False] * 4 + [True]
+
+
+def test_latency_jitter_and_input_latency_are_added_per_call():
+    model = ScriptedChatModel(SCRIPT, latency=0.1, jitter=0.05, seed=1, input_latency=0.02).bind_tools([])
+    replay = ScriptedChatModel(SCRIPT, latency=0.1, jitter=0.05, seed=1, input_latency=0.02)
+
+    short, long = [HumanMessage(content="hi")], [HumanMessage(content="x" * 40_000)]
+    delays = [model._delay(short), model._delay(long)]
+
+    assert delays == [replay._delay(short), replay._delay(long)]
+    assert 0.1 <= delays[0] <= 0.15
+    assert 0.1 + 0.2 <= delays[1] <= 0.15 + 0.2
+
+
+def test_blocking_ainvoke_does_not_yield_to_the_event_loop():
+    async def overlap(model):
+        start = time.perf_counter()
+        await asyncio.gather(*(model.ainvoke([HumanMessage(content="weather")]) for _ in range(3)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(overlap(ScriptedChatModel(SCRIPT, latency=0.1).bind_tools([]))) < 0.25
+    assert asyncio.run(overlap(ScriptedChatModel(SCRIPT, latency=0.1, blocking=True).bind_tools([]))) >= 0.3
+
+
+def test_from_env(monkeypatch, tmp_path):
+    script = tmp_path / "script.json"
+    script.write_text('[{"steps": [{"content": "From a file."}]}]')
+    for name, value in {"FAKE_LLM_SCRIPT": str(script), "FAKE_LLM_LATENCY": "0.3", "FAKE_LLM_JITTER": "0.1",
+                        "FAKE_LLM_BLOCKING": "1", "FAKE_LLM_INPUT_LATENCY": "0.05"}.items():
+        monkeypatch.setenv(name, value)
+
+    model = ScriptedChatModel.from_env()
+
+    assert (model.latency, model.jitter, model.blocking, model.input_latency) == (0.3, 0.1, True, 0.05)
+    assert model.bind_tools([]).invoke([HumanMessage(content="anything")]).content == "From a file."
+
+
+def test_load_generator_reports_every_request(client, app):
+    async def load():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as load_client:
+            return await run_load(load_client, concurrency=4, requests=20, history_ratio=0.5, seed=0)
+
+    report = asyncio.run(load())
+
+    assert report["total"]["requests"] == 20
+    assert report["total"]["errors"] == 0
+    assert report["chat"]["requests"] + report["history"]["requests"] == 20
+    assert 0 < report["total"]["p50_ms"] <= report["total"]["p99_ms"] <= report["total"]["max_ms"]
@@ -0,0 +1,81 @@
+# /tests/test_fast_path.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import db_tools
+from db_tools import is_valid_isbn
+from fast_path import FastPathRouter
+
+
+@pytest.fixture
+def router():
+    return FastPathRouter()
+
+
+@pytest.mark.parametrize("isbn, valid", [
+    ("978-0134494166", True), ("978 0134494166", True), ("0-306-40615-2", True), ("080442957x", True),
+    ("978-0134494167", False), ("0-306-40615-3", False), ("97801344941", False), ("978013449416X", False),
+])
+def test_is_valid_isbn(isbn, valid):
+    assert is_valid_isbn(isbn) is valid
+
+
+def test_fast_path_does_not_load_the_import_script():
+    code = "import sys, fast_path; sys.exit('import_catalog' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(db_tools.__file__)).returncode == 0
+
+
+@pytest.mark.parametrize("prompt, route, args", [
+    ("restock 978-0134494166 by 10", "restock", {"isbn": "978-0134494166", "qty": 10}),
+    ("Please restock ISBN 9780134494166 with +3 copies.", "restock", {"isbn": "9780134494166", "qty": 3}),
+    ("add 5 copies of 978-0132350884", "restock", {"isbn": "978-0132350884", "qty": 5}),
+    ("What's the status of order 101?", "order_status", {"order_id": 101}),
+    ("order #102 status", "order_status", {"order_id": 102}),
+    ("inventory summary", "inventory_summary", {}),
+    ("Show me the current inventory", "inventory_summary", {}),
+])
+def test_structured_commands_match(router, prompt, route, args):
+    assert router.match(prompt) == (route, args)
+
+
+@pytest.mark.parametrize("prompt", [
+    "restock 978-0134494166 by 10 and then order two copies",
+    "restock 978-0134494167 by 10",           # Bad check digit
+    "status of order 101 for Alice",
+    "what's low in stock?",
+    "find books about inventory summary",
+])
+def test_anything_else_goes_to_the_llm(router, prompt):
+    assert router.match(prompt) is None
+
+
+@pytest.mark.parametrize("typed", ["9780134494166", "978-0134494166", "978 0134494166"])
+def test_restock_finds_the_stored_isbn_however_it_is_typed(db, router, typed):
+    fast = router.answer(f"restock {typed} by 2")
+
+    assert fast["args"]["isbn"] == "978-0134494166"
+    assert fast["result"]["status"] == "Success"
+    assert fast["result"]["new_stock"] == 17
+
+
+def test_unknown_isbn_is_reported(db, router):
+    fast = router.answer("restock 9780306406157 by 2")
+
+    assert fast["result"]["status"] == "Error"
+    assert "not found" in fast["content"]
+
+
+def test_stats_count_every_path(router):
+    router.record("restock", 5.0)
+    router.record("response_cache", 2.0)
+    router.record(None, 100.0)
+    router.record(None, 300.0)
+    stats = router.stats()
+
+    assert (stats["requests"], stats["fast_path"], stats["response_cache"], stats["llm"]) == (4, 1, 1, 2)
+    assert stats["fast_path_fraction"] == 0.25
+    assert stats["llm_latency"]["p50_ms"] <= stats["llm_latency"]["p95_ms"]
@@ -0,0 +1,85 @@
+# /tests/test_find_books.py
+
+import sqlite3
+
+import db_tools
+from migrations import rebuild_search_index
+
+
+def _isbns(result: dict) -> list:
+    return [book["isbn"] for book in result["books"]]
+
+
+def _add_books(path: str, rows: list) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO books (isbn, title, author, stock, price) VALUES (?, ?, ?, 1, 1)", rows)
+
+
+def test_every_token_matches_as_a_prefix(db):
+    result = db_tools.find_books("prag prog")
+
+    assert result["status"] == "Success"
+    assert _isbns(result) == ["978-0134494166"]
+    assert db_tools.find_books("hunt", by="author")["books"][0]["title"] == "The Pragmatic Programmer"
+
+
+def test_fts_operators_in_the_query_are_plain_text(db):
+    for q in ('code" OR "x', "title:code", "code*", "NOT code", "(code"):
+        assert db_tools.find_books(q)["status"] != "Error", q
+
+
+def test_results_past_the_limit_are_reported_as_truncated(db):
+    _add_books(db, [(f"isbn-{i}", f"Walrus Volume {i}", "W") for i in range(7)])
+
+    result = db_tools.find_books("walrus", limit=5)
+    assert len(result["books"]) == 5
+    assert (result["total"], result["truncated"]) == (7, True)
+    assert "showing the first 5" in result["message"]
+
+    everything = db_tools.find_books("walrus", limit=10)
+    assert (len(everything["books"]), everything["total"], everything["truncated"]) == (7, 7, False)
+
+
+def test_no_match(db):
+    result = db_tools.find_books("zzzz")
+
+    assert result["status"] == "Found"
+    assert (result["books"], result["total"], result["truncated"]) == ([], 0, False)
+
+
+def test_renames_and_deletes_reach_the_index(db):
+    _add_books(db, [("9780306406157", "Zebra Tales", "A")])
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE books SET title = 'Okapi Tales' WHERE isbn = '9780306406157'")
+    assert db_tools.find_books("zebra")["books"] == []
+    assert _isbns(db_tools.find_books("okapi")) == ["9780306406157"]
+
+    with sqlite3.connect(db) as conn:
+        conn.execute("DELETE FROM books WHERE isbn = '9780306406157'")
+    assert db_tools.find_books("okapi")["books"] == []
+
+
+def test_search_survives_vacuum(db):
+    with sqlite3.connect(db) as conn:
+        # Leave rowid gaps, so VACUUM has something to renumber
+        conn.execute("INSERT INTO books (isbn, title, author, stock, price) VALUES ('9780306406157', 'Zebra Tales', 'A', 1, 1)")
+        conn.execute("DELETE FROM order_items")
+        conn.execute("DELETE FROM books WHERE rowid IN (1, 2)")
+    conn = sqlite3.connect(db)
+    conn.execute("VACUUM")
+    conn.close()
+
+    assert _isbns(db_tools.find_books("zebra")) == ["9780306406157"]
+    for book in db_tools.find_books("the")["books"]:
+        assert "the" in book["title"].lower()
+
+
+def test_rebuild_search_index_picks_up_untracked_books(db):
+    with sqlite3.connect(db) as conn:
+        conn.execute("DROP TRIGGER books_fts_ai")
+        conn.execute("INSERT INTO books (isbn, title, author, stock, price) VALUES ('9780306406157', 'Walrus Guide', 'B', 1, 1)")
+    assert db_tools.find_books("walrus")["books"] == []
+
+    assert rebuild_search_index()["status"] == "Success"
+    db_tools.RESULT_CACHE.clear()
+    assert _isbns(db_tools.find_books("walrus")) == ["9780306406157"]
@@ -0,0 +1,96 @@
+# /tests/test_history_cache.py
+
+import time
+
+import db_tools
+from history_cache import HistoryCache
+
+
+def _load(cache: HistoryCache, session_id: str, messages: list) -> bool:
+    version = cache.begin_load(session_id)
+    try:
+        return cache.put(session_id, messages, version)
+    finally:
+        cache.end_load(session_id)
+
+
+def test_append_extends_a_cached_session():
+    cache = HistoryCache()
+    assert _load(cache, "s", ["hi"])
+    cache.append("s", "hello")
+
+    assert cache.get("s") == ["hi", "hello"]
+
+
+def test_load_that_raced_with_a_write_is_not_stored():
+    cache = HistoryCache()
+    version = cache.begin_load("s")
+    cache.append("s", "saved while the load was running")
+
+    assert cache.put("s", ["stale"], version) is False
+    cache.end_load("s")
+    assert cache.get("s") is None
+
+
+def test_invalidate_forces_a_reload():
+    cache = HistoryCache()
+    _load(cache, "s", ["hi"])
+    cache.invalidate("s")
+
+    assert cache.get("s") is None
+
+
+def test_entry_with_a_different_database_length_is_stale():
+    cache = HistoryCache()
+    _load(cache, "s", ["hi", "hello"])
+
+    assert cache.get("s", expected_length=2) == ["hi", "hello"]
+    assert cache.get("s", expected_length=4) is None  # Another worker added two messages
+    assert cache.stats()["stale"] == 1
+
+
+def test_idle_sessions_expire():
+    cache = HistoryCache(ttl_seconds=0.01)
+    _load(cache, "s", ["hi"])
+    time.sleep(0.02)
+
+    assert cache.get("s") is None
+
+
+def test_versions_are_only_kept_for_cached_or_loading_sessions():
+    cache = HistoryCache(max_sessions=2)
+    for i in range(100):
+        cache.append(f"uncached-{i}", "fast path answer")
+        cache.invalidate(f"other-{i}")
+    assert cache._versions == {}
+
+    for session_id in "abc":
+        _load(cache, session_id, [])
+    assert set(cache._versions) == {"b", "c"}
+
+    cache.clear()
+    assert cache._versions == {}
+
+
+def test_chat_turns_reuse_the_cached_history(app, client):
+    for prompt in ("find books about code", "find books about design"):
+        assert client.post("/chat", json={"prompt": prompt, "session_id": "cached"}).status_code == 200
+
+    stats = app.HISTORY_CACHE.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+    assert [message.content for message in app.HISTORY_CACHE.get("cached")] == [
+        "find books about code", "Here are the matching books.",
+        "find books about design", "Here are the matching books."]
+
+
+def test_shared_state_reloads_a_history_another_worker_extended(app, client, monkeypatch):
+    monkeypatch.setattr(app, "SHARED_STATE", "sqlite")
+    client.post("/chat", json={"prompt": "find books about code", "session_id": "shared"})
+    db_tools.save_message("shared", "user", "saved by another worker")
+
+    history = app.HISTORY_CACHE.get("shared")
+    assert len(history) == 2
+    client.post("/chat", json={"prompt": "find books about design", "session_id": "shared"})
+
+    assert app.HISTORY_CACHE.stats()["stale"] == 1
+    assert app.HISTORY_CACHE.get("shared")[2].content == "saved by another worker"
@@ -0,0 +1,78 @@
+# /tests/test_history_pagination.py
+
+import pytest
+
+import db_tools
+
+
+@pytest.fixture
+def session(db):
+    for i in range(7):
+        assert db_tools.save_message("paged", "user" if i % 2 == 0 else "assistant", f"message {i}")["status"] == "Success"
+    return db_tools.load_history("paged")["history"]
+
+
+def _contents(page: dict) -> list:
+    return [message["content"] for message in page["history"]]
+
+
+def test_unpaged_load_returns_the_whole_conversation(session):
+    assert [message["content"] for message in session] == [f"message {i}" for i in range(7)]
+
+
+def test_latest_page_then_older_pages(session):
+    latest = db_tools.load_history("paged", limit=3)
+    assert _contents(latest) == ["message 4", "message 5", "message 6"]
+    assert latest["has_more"] is True
+
+    older = db_tools.load_history("paged", before=latest["oldest_id"], limit=3)
+    assert _contents(older) == ["message 1", "message 2", "message 3"]
+    assert older["has_more"] is True
+
+    oldest = db_tools.load_history("paged", before=older["oldest_id"], limit=3)
+    assert _contents(oldest) == ["message 0"]
+    assert oldest["has_more"] is False
+
+
+def test_after_cursor_returns_newer_messages_oldest_first(session):
+    page = db_tools.load_history("paged", after=session[1]["id"], limit=2)
+    assert _contents(page) == ["message 2", "message 3"]
+    assert page["has_more"] is True
+
+    rest = db_tools.load_history("paged", after=page["newest_id"], limit=10)
+    assert _contents(rest) == ["message 4", "message 5", "message 6"]
+    assert rest["has_more"] is False
+
+
+def test_page_size_is_capped(session, monkeypatch):
+    monkeypatch.setattr(db_tools, "HISTORY_MAX_PAGE", 2)
+    page = db_tools.load_history("paged", limit=100)
+
+    assert len(page["history"]) == 2
+    assert page["has_more"] is True
+
+
+def test_count_messages(session):
+    assert db_tools.count_messages("paged") == {"status": "Success", "count": 7}
+    assert db_tools.count_messages("nobody")["count"] == 0
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_limits_below_one_are_rejected(session, limit):
+    result = db_tools.load_history("paged", limit=limit)
+
+    assert result == {"status": "Error", "message": f"Invalid limit {limit}; limit must be at least 1."}
+
+
+@pytest.mark.parametrize("limit", ["0", "-3", str(db_tools.HISTORY_MAX_PAGE + 1), "many"])
+def test_history_endpoint_rejects_out_of_range_limits(session, client, limit):
+    assert client.get(f"/history/paged?limit={limit}").status_code == 422
+
+
+def test_history_endpoint_pages(session, client):
+    latest = client.get("/history/paged?limit=2").json()
+    assert _contents(latest) == ["message 5", "message 6"]
+
+    older = client.get(f"/history/paged?before={latest['oldest_id']}&limit={db_tools.HISTORY_MAX_PAGE}").json()
+    assert _contents(older) == [f"message {i}" for i in range(5)]
+    assert older["has_more"] is False
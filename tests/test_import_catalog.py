@@ -0,0 +1,78 @@
+# /tests/test_import_catalog.py
+
+import json
+import sqlite3
+
+import pytest
+
+import db_tools
+from import_catalog import import_catalog
+from migrations import check_query_plans
+
+PRAGMATIC = "978-0134494166"  # 15 in stock, 45.99
+
+
+def _book(path: str, isbn: str):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT title, stock, price FROM books WHERE isbn = ?", (isbn,)).fetchone()
+
+
+def _write(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("keep_indexes", [False, True])
+def test_metadata_only_reimport_keeps_stock_and_price(db, tmp_path, keep_indexes):
+    catalog = _write(tmp_path, "metadata.csv",
+                     "isbn,title,author\n"
+                     f"{PRAGMATIC},The Pragmatic Programmer (2nd ed.),Andrew Hunt\n"
+                     "9780306406157,Zebra Tales,A. Author\n")
+
+    result = import_catalog(catalog, keep_indexes=keep_indexes)
+
+    assert (result["status"], result["imported"]) == ("Success", 2)
+    assert _book(db, PRAGMATIC) == ("The Pragmatic Programmer (2nd ed.)", 15, 45.99)
+    assert _book(db, "9780306406157") == ("Zebra Tales", 0, 0.0)
+
+
+def test_empty_and_present_values(db, tmp_path):
+    catalog = _write(tmp_path, "mixed.csv",
+                     "isbn,title,author,stock,price\n"
+                     f"{PRAGMATIC},The Pragmatic Programmer,Andrew Hunt,,50\n"
+                     "978-0132350884,Clean Code,Robert C. Martin,0,\n")
+
+    assert import_catalog(catalog)["status"] == "Success"
+    assert _book(db, PRAGMATIC) == ("The Pragmatic Programmer", 15, 50.0)
+    assert _book(db, "978-0132350884") == ("Clean Code", 0, 39.5)
+
+
+def test_invalid_rows_are_skipped_and_reported(db, tmp_path):
+    catalog = _write(tmp_path, "bad.csv",
+                     "isbn,title,author,stock,price\n"
+                     "9780306406158,Bad Check Digit,A,1,1\n"
+                     "9780306406157,,A,1,1\n"
+                     "9781861972712,Negative,A,-1,1\n"
+                     "9781861972712,Not A Number,A,many,1\n"
+                     "9781861972712,Good,A,3,9.99\n")
+
+    result = import_catalog(catalog)
+
+    assert (result["read"], result["invalid"], result["imported"]) == (5, 4, 1)
+    assert [error.split(":")[0] for error in result["errors"]] == ["line 2", "line 3", "line 4", "line 5"]
+    assert _book(db, "9781861972712") == ("Good", 3, 9.99)
+
+
+def test_jsonl_import_leaves_search_and_indexes_working(db, tmp_path):
+    lines = [{"isbn": "9780306406157", "title": "Walrus Handbook", "author": "W. Rus", "stock": 4, "price": 12.5},
+             {"isbn": PRAGMATIC, "title": "The Pragmatic Programmer", "author": "Andrew Hunt"}]
+    catalog = _write(tmp_path, "delta.jsonl", "\n".join(json.dumps(line) for line in lines) + "\n{not json\n")
+
+    result = import_catalog(catalog, chunk_size=1)
+
+    assert (result["status"], result["imported"], result["invalid"], result["chunks"]) == ("Success", 2, 1, 2)
+    assert [book["isbn"] for book in db_tools.find_books("walrus")["books"]] == ["9780306406157"]
+    assert _book(db, PRAGMATIC)[1:] == (15, 45.99)
+    with sqlite3.connect(db) as conn:
+        assert all(check["ok"] for check in check_query_plans(conn))
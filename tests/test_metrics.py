@@ -0,0 +1,111 @@
+# /tests/test_metrics.py
+
+import re
+
+import pytest
+
+import metrics
+from metrics import Registry, percentile
+
+SAMPLE = re.compile(r"^(?P<name>[a-z_]+)(?P<labels>\{.*\})? (?P<value>\S+)$")
+
+
+def _samples(text: str) -> dict:
+    """{'name{labels}': value} for every sample line of an exposition."""
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            match = SAMPLE.match(line)
+            assert match, f"Malformed sample line: {line!r}"
+            samples[match["name"] + (match["labels"] or "")] = float(match["value"])
+    return samples
+
+
+@pytest.mark.parametrize("pct, expected", [(0, 1.0), (50, 5.0), (95, 10.0), (99, 10.0), (100, 10.0)])
+def test_percentile_is_nearest_rank(pct, expected):
+    assert percentile([float(i) for i in range(1, 11)], pct) == expected
+
+
+def test_percentile_of_no_samples():
+    assert percentile([], 95) == 0.0
+
+
+def test_registry_renders_counters_and_cumulative_histograms():
+    registry = Registry()
+    counter = registry.counter("demo_total", "Demo counter.", ["kind"])
+    histogram = registry.histogram("demo_seconds", "Demo latency.", buckets=(0.1, 1.0))
+    counter.inc(kind='say "hi"\n')
+    counter.inc(2, kind="plain")
+    for seconds in (0.05, 0.5, 5.0):
+        histogram.observe(seconds)
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_total Demo counter.",
+        "# TYPE demo_total counter",
+        'demo_total{kind="plain"} 2',
+        'demo_total{kind="say \\"hi\\"\\n"} 1',
+        "# HELP demo_seconds Demo latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1.0"} 2',
+        'demo_seconds_bucket{le="+Inf"} 3',
+        "demo_seconds_sum 5.55",
+        "demo_seconds_count 3",
+    ]
+
+
+def test_request_summary_and_timing_headers():
+    request = metrics.start_request()
+    metrics.record_llm_call(0.25, {"input_tokens": 100, "output_tokens": 7})
+    metrics.record_llm_call(0.5, None)
+    metrics.record_iterations(2)
+    metrics.record_tool("find_books_tool", 0.01)
+    metrics.record_db("read", 0.002)
+    metrics.record_db("write", 0.003)
+
+    summary = metrics.finish_request("chat", "llm")
+
+    assert metrics.current() is None
+    assert (summary["llm_ms"], summary["llm_calls"], summary["input_tokens"], summary["output_tokens"]) == (
+        750.0, 2, 100, 7)
+    assert (summary["iterations"], summary["tool_ms"], summary["db_ms"]) == (2, 10.0, 5.0)
+    assert summary["tools"] == [{"name": "find_books_tool", "ms": 10.0}]
+    assert summary["total_ms"] >= 0 and request.iterations == 2
+
+    headers = metrics.timing_headers(summary)
+    assert headers["Server-Timing"] == (f"total;dur={summary['total_ms']}, llm;dur=750.0;desc=\"2 calls\", "
+                                        "tools;dur=10.0, db;dur=5.0")
+    assert (headers["X-LLM-Calls"], headers["X-LLM-Input-Tokens"], headers["X-LLM-Output-Tokens"],
+            headers["X-Agent-Iterations"]) == ("2", "100", "7", "2")
+    assert metrics.finish_request("chat", "llm") == {}
+    assert metrics.timing_headers({}) == {}
+
+
+def test_chat_returns_timing_headers_and_metrics_counts_it(client):
+    before = _samples(client.get("/metrics").text)
+
+    response = client.post("/chat", json={"prompt": "Find books about code", "session_id": "timed"})
+
+    timing = dict(re.findall(r"(\w+);dur=([\d.]+)", response.headers["Server-Timing"]))
+    assert set(timing) == {"total", "llm", "tools", "db"}
+    assert float(timing["total"]) >= float(timing["llm"])
+    assert (response.headers["X-LLM-Calls"], response.headers["X-Agent-Iterations"]) == ("2", "2")
+    assert int(response.headers["X-LLM-Input-Tokens"]) > 0
+
+    exposition = client.get("/metrics")
+    assert exposition.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for name in ["library_chat_requests_total", "library_chat_request_seconds", "library_llm_call_seconds",
+                 "library_llm_tokens_total", "library_agent_iterations", "library_tool_seconds", "library_db_seconds"]:
+        assert f"# TYPE {name} " in exposition.text
+
+    after = _samples(exposition.text)
+
+    def delta(sample: str) -> float:
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    assert delta('library_chat_requests_total{endpoint="chat",path="llm"}') == 1
+    assert delta('library_chat_request_seconds_count{endpoint="chat",path="llm"}') == 1
+    assert delta("library_llm_call_seconds_count") == 2
+    assert delta('library_llm_tokens_total{direction="input"}') == int(response.headers["X-LLM-Input-Tokens"])
+    assert delta('library_tool_seconds_count{tool="find_books_tool"}') == 1
+    assert delta('library_agent_iterations_bucket{le="2"}') == 1
@@ -0,0 +1,45 @@
+# /tests/test_migrations.py
+
+import multiprocessing
+import sqlite3
+
+import db_tools
+from conftest import create_database
+from migrations import MIGRATIONS, apply_migrations, current_version
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def _migrate(path: str) -> dict:
+    # Runs in a spawned process, like a server worker applying migrations on startup
+    db_tools.DB_PATH = path
+    return apply_migrations()
+
+
+def test_apply_migrations_is_idempotent(tmp_path):
+    path = create_database(str(tmp_path / "fresh.db"), migrate=False)
+    conn = sqlite3.connect(path)
+    try:
+        first = apply_migrations(conn)
+        assert first["status"] == "Success"
+        assert (first["from_version"], first["version"]) == (0, LATEST)
+        assert len(first["applied"]) == len(MIGRATIONS)
+        schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+
+        second = apply_migrations(conn)
+        assert second["status"] == "Success"
+        assert second["applied"] == []
+        assert current_version(conn) == LATEST
+        assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    finally:
+        conn.close()
+
+
+def test_concurrent_startups_apply_each_migration_once(tmp_path):
+    path = create_database(str(tmp_path / "fresh.db"), migrate=False)
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        results = pool.map(_migrate, [path] * 4)
+
+    assert all(result["status"] == "Success" for result in results), results
+    applied = sorted(entry for result in results for entry in result["applied"])
+    assert applied == sorted(f"{version}: {description}" for version, description, _ in MIGRATIONS)
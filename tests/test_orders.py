@@ -0,0 +1,68 @@
+# /tests/test_orders.py
+
+import sqlite3
+
+import pytest
+
+import db_tools
+
+PRAGMATIC = "978-0134494166"  # 15 in stock
+CLEAN_CODE = "978-0132350884"  # 5 in stock
+
+
+def _stock(path: str, isbn: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT stock FROM books WHERE isbn = ?", (isbn,)).fetchone()[0]
+
+
+def _order_count(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+@pytest.fixture(params=[True, False], ids=["update-from", "row-by-row"])
+def stock_update(request, monkeypatch):
+    """Runs the test with both stock decrement paths (UPDATE ... FROM and the pre-3.33 fallback)."""
+    if request.param and not db_tools.SQLITE_UPDATE_FROM:
+        pytest.skip("SQLite older than 3.33")
+    monkeypatch.setattr(db_tools, "SQLITE_UPDATE_FROM", request.param)
+
+
+def test_order_decrements_stock_and_merges_repeated_isbns(db, stock_update):
+    result = db_tools.create_order(1, [{"isbn": PRAGMATIC, "qty": 2}, {"isbn": CLEAN_CODE, "qty": 1},
+                                       {"isbn": PRAGMATIC, "qty": 3}])
+
+    assert result["status"] == "Success"
+    assert {line["isbn"]: line["new_stock"] for line in result["updated_stock"]} == {PRAGMATIC: 10, CLEAN_CODE: 4}
+    assert (_stock(db, PRAGMATIC), _stock(db, CLEAN_CODE)) == (10, 4)
+    items = db_tools.order_status(result["order_id"])["items"]
+    assert sorted((item["isbn"], item["qty"]) for item in items) == [(CLEAN_CODE, 1), (PRAGMATIC, 5)]
+
+
+@pytest.mark.parametrize("qty", [-5, 0, 1.5, "2", True, None])
+def test_quantities_that_are_not_positive_integers_are_rejected(db, qty):
+    orders = _order_count(db)
+    result = db_tools.create_order(1, [{"isbn": CLEAN_CODE, "qty": 1}, {"isbn": PRAGMATIC, "qty": qty}])
+
+    assert result["status"] == "Error"
+    assert "positive integer" in result["message"]
+    assert (_stock(db, PRAGMATIC), _stock(db, CLEAN_CODE)) == (15, 5)
+    assert _order_count(db) == orders
+
+
+def test_insufficient_stock_rolls_back_every_line(db, stock_update):
+    orders = _order_count(db)
+    result = db_tools.create_order(1, [{"isbn": PRAGMATIC, "qty": 1}, {"isbn": CLEAN_CODE, "qty": 6}])
+
+    assert result["status"] == "Error"
+    assert "Insufficient stock for Clean Code" in result["message"]
+    assert (_stock(db, PRAGMATIC), _stock(db, CLEAN_CODE)) == (15, 5)
+    assert _order_count(db) == orders
+
+
+@pytest.mark.parametrize("customer_id, isbn, message", [
+    (99, PRAGMATIC, "Customer ID 99 not found."),
+    (1, "978-0000000000", "Book with ISBN 978-0000000000 not found."),
+])
+def test_unknown_customer_or_book(db, customer_id, isbn, message):
+    assert db_tools.create_order(customer_id, [{"isbn": isbn, "qty": 1}]) == {"status": "Error", "message": message}
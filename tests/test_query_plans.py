@@ -0,0 +1,20 @@
+# /tests/test_query_plans.py
+
+import sqlite3
+
+from migrations import check_query_plans
+
+
+def test_hot_queries_use_their_indexes(db):
+    with sqlite3.connect(db) as conn:
+        checks = check_query_plans(conn)
+
+    assert [(check["label"], check["plan"]) for check in checks if not check["ok"]] == []
+
+
+def test_a_missing_index_fails_the_check(db):
+    with sqlite3.connect(db) as conn:
+        conn.execute("DROP INDEX idx_messages_session_id")
+        bad = {check["label"] for check in check_query_plans(conn) if not check["ok"]}
+
+    assert bad == {"load_history", "load_history (page)", "count_messages"}
@@ -0,0 +1,121 @@
+# /tests/test_response_cache.py
+
+import sqlite3
+
+import pytest
+
+import db_tools
+from response_cache import ResponseCache, normalize_prompt
+
+LOW_STOCK = "What's low in stock?"
+
+
+@pytest.fixture
+def cache(db):
+    return ResponseCache(ttl_seconds=60, max_entries=10)
+
+
+def _store(cache: ResponseCache, prompt: str, response: str = "answer",
+           tools=("inventory_summary_tool",), history_length: int = 0) -> bool:
+    return cache.put(prompt, response, list(tools), cache.snapshot(), history_length)
+
+
+def test_normalized_repeats_hit(cache):
+    assert cache.get(LOW_STOCK) is None
+    assert _store(cache, LOW_STOCK, "Clean Code is low.") is True
+
+    assert normalize_prompt("Hi, could you tell me what's LOW in stock, please") == "what's low in stock"
+    assert cache.get("hi could you tell me  what's LOW in stock?? please") == {
+        "response": "Clean Code is low.", "tools": ["inventory_summary_tool"]}
+    assert (cache.hits, cache.misses, cache.stored) == (1, 1, 1)
+
+
+def test_entries_expire_after_the_ttl(cache, db):
+    _store(cache, LOW_STOCK)
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE response_cache SET created_at = created_at - 61")
+
+    assert cache.get(LOW_STOCK) is None
+    assert cache.stale == 1
+    assert cache.get(LOW_STOCK) is None  # The stale entry was deleted
+    assert cache.misses == 1
+
+
+def test_least_recently_used_entries_are_evicted(db):
+    cache = ResponseCache(max_entries=2)
+    _store(cache, "first question")
+    _store(cache, "second question")
+    assert cache.get("first question") is not None
+
+    _store(cache, "third question")
+
+    assert cache.get("second question") is None
+    assert cache.get("first question") is not None
+    assert cache.get("third question") is not None
+
+
+def test_a_write_to_a_domain_the_answer_read_invalidates_it(cache):
+    _store(cache, LOW_STOCK)
+    _store(cache, "status of order 101", tools=["order_status_tool"])
+    _store(cache, "books by martin", tools=["find_books_tool"])
+
+    db_tools.create_order(1, [{"isbn": "978-0134494166", "qty": 1}])  # Writes orders and books
+
+    assert cache.get(LOW_STOCK) is None
+    assert cache.get("status of order 101") is None
+    assert cache.get("books by martin") is None
+
+
+def test_a_write_elsewhere_keeps_the_answer(cache, db):
+    _store(cache, "books by martin", tools=["find_books_tool"])
+    with sqlite3.connect(db) as conn:
+        conn.execute("UPDATE customers SET name = name || '!' WHERE id = 1")
+
+    assert cache.get("books by martin") is not None
+
+
+@pytest.mark.parametrize("prompt", [
+    "What about its price?", "Is that one in stock?", "Order the same again", "How many of them are left?",
+    "And for order 102?", "what about Clean Code", "Also the low stock ones", "Then order two copies",
+])
+def test_follow_up_prompts_are_never_stored_or_served(cache, prompt):
+    assert ResponseCache.is_cacheable_prompt(prompt) is False
+    assert _store(cache, prompt) is False
+
+    # Even an entry stored under the same normalized text is not served for them
+    db_tools.store_cached_response(ResponseCache.key(prompt), normalize_prompt(prompt), "answer",
+                                   ["inventory_summary_tool"], {}, 10)
+    assert cache.get(prompt) is None
+
+
+@pytest.mark.parametrize("tools, history_length", [
+    (["restock_book_tool"], 0),
+    (["find_books_tool", "create_order_tool"], 0),
+    ([], 0),
+    (["inventory_summary_tool"], 2),
+])
+def test_only_first_turn_answers_of_read_only_tools_are_stored(cache, tools, history_length):
+    assert _store(cache, LOW_STOCK, tools=tools, history_length=history_length) is False
+    assert cache.get(LOW_STOCK) is None
+    assert cache.skipped == 1
+
+
+def test_chat_answers_a_repeated_first_question_across_sessions(client, app, monkeypatch):
+    monkeypatch.setattr(app, "RESPONSE_CACHE", ResponseCache())
+
+    first = client.post("/chat", json={"prompt": LOW_STOCK, "session_id": "alice"}).json()
+    repeat = client.post("/chat", json={"prompt": LOW_STOCK, "session_id": "bob"}).json()
+
+    assert first["response"] == repeat["response"] == "Inventory checked."
+    assert repeat["tool_info"].startswith("Response cache hit")
+    assert [m["role"] for m in client.get("/history/bob").json()["history"]] == ["user", "assistant"]
+
+    # A later turn of a conversation is not stored; asking it first elsewhere runs the agent
+    client.post("/chat", json={"prompt": "Show the inventory summary", "session_id": "alice"})
+    fresh = client.post("/chat", json={"prompt": "Show the inventory summary", "session_id": "carol"}).json()
+    assert not fresh["tool_info"].startswith("Response cache hit")
+
+    client.post("/chat", json={"prompt": "restock", "session_id": "dave"})
+    after_write = client.post("/chat", json={"prompt": LOW_STOCK, "session_id": "erin"}).json()
+    assert not after_write["tool_info"].startswith("Response cache hit")
+    assert app.RESPONSE_CACHE.stats()["hits"] == 1
@@ -0,0 +1,96 @@
+# /tests/test_result_cache.py
+
+import sqlite3
+
+import db_tools
+from result_cache import ResultCache
+
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = ResultCache()
+    cache.put("a", {"v": 1}, ["book:1", "catalog"], cache.generation)
+    cache.put("b", {"v": 2}, ["book:2", "catalog"], cache.generation)
+
+    assert cache.invalidate("book:1") == 1
+    assert cache.get("a") is None
+    assert cache.get("b") == {"v": 2}
+    assert cache.invalidate("catalog") == 1
+    assert cache.get("b") is None
+
+
+def test_put_after_an_overlapping_invalidation_is_dropped():
+    cache = ResultCache()
+    generation = cache.generation
+    cache.invalidate("stock")  # A write landed while the value was being computed
+
+    assert cache.put("a", {"v": 1}, ["stock"], generation) is False
+    assert cache.get("a") is None
+
+
+def test_get_returns_a_private_copy():
+    cache = ResultCache()
+    cache.put("a", {"books": [1]}, [], cache.generation)
+    cache.get("a")["books"].append(2)
+
+    assert cache.get("a") == {"books": [1]}
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    for key in "abc":
+        cache.put(key, key, [], cache.generation)
+
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sync_clears_on_a_foreign_change_but_advance_keeps_local_writes():
+    cache = ResultCache()
+    cache.sync(1)
+    cache.put("a", "x", ["book:1"], cache.generation)
+    cache.put("b", "y", ["book:2"], cache.generation)
+
+    # This process wrote book:1, moving the counter from 1 to 3
+    cache.invalidate("book:1")
+    cache.advance(1, 3)
+    assert cache.sync(3) is False
+    assert cache.get("b") == "y"
+
+    # Someone else moved it again
+    assert cache.sync(4) is True
+    assert cache.get("b") is None
+
+
+def test_write_from_another_process_is_visible(db):
+    assert db_tools.find_books("zebra")["books"] == []
+    assert db_tools.inventory_summary()["total_unique_books"] == 10
+
+    with sqlite3.connect(db) as conn:  # e.g. import_catalog.py
+        conn.execute("INSERT INTO books (isbn, title, author, stock, price) VALUES ('9780306406157', 'Zebra Tales', 'A', 1, 1)")
+
+    assert [book["isbn"] for book in db_tools.find_books("zebra")["books"]] == ["9780306406157"]
+    assert db_tools.inventory_summary()["total_unique_books"] == 11
+
+
+def test_local_writes_invalidate_by_tag_without_clearing(db):
+    db_tools.find_books("clean code")
+    db_tools.find_books("pragmatic")
+    assert db_tools.restock_book("978-0134494166", 2)["status"] == "Success"
+
+    pragmatic = db_tools.find_books("pragmatic")
+    assert pragmatic["books"][0]["stock"] == 17
+    hits = db_tools.RESULT_CACHE.stats()["hits"]
+    db_tools.find_books("clean code")
+    stats = db_tools.RESULT_CACHE.stats()
+    assert stats["hits"] == hits + 1
+    assert stats["remote_clears"] == 0
+
+
+def test_inventory_summary_follows_stock_writes(db):
+    before = db_tools.inventory_summary()
+    assert db_tools.inventory_summary() == before
+    db_tools.restock_book("978-0132350884", 10)  # Clean Code: 5 -> 15, no longer low
+
+    after = db_tools.inventory_summary()
+    assert after["total_inventory_quantity"] == before["total_inventory_quantity"] + 10
+    assert "978-0132350884" not in [book["isbn"] for book in after["low_stock_titles"]]
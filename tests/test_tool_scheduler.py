@@ -0,0 +1,81 @@
+# /tests/test_tool_scheduler.py
+
+import asyncio
+import threading
+import time
+
+from tool_scheduler import ToolScheduler
+
+READ_ONLY = {"find_books_tool", "order_status_tool"}
+CALLS = [
+    {"name": "find_books_tool", "args": {"q": "a"}, "id": "1"},
+    {"name": "order_status_tool", "args": {"order_id": 101}, "id": "2"},
+    {"name": "restock_book_tool", "args": {"isbn": "x", "qty": 1}, "id": "3"},
+    {"name": "find_books_tool", "args": {"q": "b"}, "id": "4"},
+]
+
+
+class Recorder:
+    """execute/aexecute stand-ins that sleep and record when each call ran."""
+
+    def __init__(self, seconds: float = 0.05):
+        self.seconds = seconds
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def _record(self, tool_call, start):
+        with self._lock:
+            self.spans[tool_call["id"]] = (start, time.perf_counter())
+        return f"result {tool_call['id']}"
+
+    def execute(self, tool_call, **context):
+        start = time.perf_counter()
+        time.sleep(self.seconds)
+        return self._record(tool_call, start)
+
+    async def aexecute(self, tool_call, **context):
+        start = time.perf_counter()
+        await asyncio.sleep(self.seconds)
+        return self._record(tool_call, start)
+
+    def overlap(self, a: str, b: str) -> bool:
+        return self.spans[a][0] < self.spans[b][1] and self.spans[b][0] < self.spans[a][1]
+
+    def before(self, a: str, b: str) -> bool:
+        return self.spans[a][1] <= self.spans[b][0]
+
+
+def _scheduler(recorder: Recorder) -> ToolScheduler:
+    return ToolScheduler(recorder.execute, recorder.aexecute, READ_ONLY)
+
+
+def test_plan_groups_consecutive_reads_and_isolates_writes():
+    batches = _scheduler(Recorder()).plan(CALLS)
+
+    assert [[call["id"] for call in batch] for batch in batches] == [["1", "2"], ["3"], ["4"]]
+
+
+def _assert_schedule(recorder: Recorder, results: list) -> None:
+    assert results == ["result 1", "result 2", "result 3", "result 4"]
+    assert recorder.overlap("1", "2")
+    # The write waits for the reads before it, and the read after it waits for the write
+    assert recorder.before("1", "3") and recorder.before("2", "3")
+    assert recorder.before("3", "4")
+
+
+def test_sync_reads_run_concurrently_and_writes_keep_their_place():
+    recorder = Recorder()
+    _assert_schedule(recorder, _scheduler(recorder).run(CALLS, session_id="s"))
+
+
+def test_async_reads_run_concurrently_and_writes_keep_their_place():
+    recorder = Recorder()
+    _assert_schedule(recorder, asyncio.run(_scheduler(recorder).arun(CALLS, session_id="s")))
+
+
+def test_consecutive_writes_run_one_at_a_time_in_order():
+    recorder = Recorder(seconds=0.01)
+    writes = [{"name": "restock_book_tool", "args": {"qty": i}, "id": str(i)} for i in range(4)]
+    asyncio.run(_scheduler(recorder).arun(writes))
+
+    assert all(recorder.before(str(i), str(i + 1)) for i in range(3))
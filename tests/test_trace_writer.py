@@ -0,0 +1,98 @@
+# /tests/test_trace_writer.py
+
+import threading
+import time
+
+import agent
+import db_tools
+from trace_writer import TraceWriter
+
+
+class Sink:
+    """record_tool_calls stand-in that keeps every batch it was given."""
+
+    def __init__(self, status: str = "Success"):
+        self.status = status
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, rows):
+        with self.lock:
+            self.batches.append(list(rows))
+        return {"status": self.status, "message": "sink failed"}
+
+
+def _record(writer: TraceWriter, n: int, session_id: str = "s") -> None:
+    for i in range(n):
+        writer.record(session_id, f"tool_{i}", "{}", '{"status": "Success"}', float(i), "Success")
+
+
+def test_full_batches_are_written_together():
+    sink = Sink()
+    writer = TraceWriter(sink, batch_size=10, flush_interval=60)
+    _record(writer, 25)
+    writer.flush()
+
+    assert [len(batch) for batch in sink.batches] == [10, 10, 5]
+    assert writer.stats()["written"] == 25
+    writer.close()
+
+
+def test_a_partial_batch_is_written_after_the_interval():
+    sink = Sink()
+    writer = TraceWriter(sink, batch_size=100, flush_interval=0.05)
+    _record(writer, 3)
+    time.sleep(0.3)
+
+    assert [len(batch) for batch in sink.batches] == [3]
+    writer.close()
+
+
+def test_close_writes_what_is_still_buffered():
+    sink = Sink()
+    writer = TraceWriter(sink, batch_size=100, flush_interval=60)
+    _record(writer, 7)
+    writer.close()  # Registered with atexit, so this also runs on shutdown
+
+    assert sum(len(batch) for batch in sink.batches) == 7
+    assert writer.stats()["pending"] == 0
+
+
+def test_failed_batches_and_a_full_buffer_are_counted_not_raised():
+    writer = TraceWriter(Sink(status="Error"), batch_size=2, flush_interval=60, max_buffer=5)
+    writer._ensure_started = lambda: None  # Nothing drains the queue, so it fills up
+    _record(writer, 8)
+    assert (writer.stats()["recorded"], writer.stats()["dropped"]) == (5, 3)
+
+    del writer._ensure_started
+    writer._ensure_started()
+    writer.close()
+    assert writer.stats()["failed_batches"] == 3
+    assert writer.stats()["written"] == 0
+
+
+def test_traces_land_in_tool_calls_and_the_slowest_endpoint_ranks_them(db, client):
+    writer = TraceWriter(db_tools.record_tool_calls, batch_size=50, flush_interval=60)
+    for name, ms in [("find_books_tool", 3.0), ("create_order_tool", 40.0), ("find_books_tool", 12.0)]:
+        writer.record("traced", name, '{"q": "x"}', '{"status": "Success"}', ms, "Success")
+    writer.record("other", "inventory_summary_tool", "{}", "{}", 99.0, "Success")
+    writer.close()
+
+    body = client.get("/tools/slowest/traced", params={"limit": 2}).json()
+
+    assert body["status"] == "Success"
+    assert [(call["name"], call["duration_ms"]) for call in body["calls"]] == [
+        ("create_order_tool", 40.0), ("find_books_tool", 12.0)]
+    assert body["calls"][0]["args_bytes"] == len('{"q": "x"}')
+    by_tool = {row["name"]: row for row in body["by_tool"]}
+    assert set(by_tool) == {"create_order_tool", "find_books_tool"}
+    assert (by_tool["find_books_tool"]["calls"], by_tool["find_books_tool"]["max_ms"]) == (2, 12.0)
+
+
+def test_chat_turns_are_traced(app, client):
+    client.post("/chat", json={"prompt": "find books about code", "session_id": "agent-traced"})
+    agent.TRACER.flush()
+
+    calls = client.get("/tools/slowest/agent-traced").json()["calls"]
+    assert [call["name"] for call in calls] == ["find_books_tool"]
+    assert calls[0]["status"] == "Success"
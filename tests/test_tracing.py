@@ -0,0 +1,150 @@
+# /tests/test_tracing.py
+
+import json
+import sqlite3
+
+import pytest
+
+import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+TRACEPARENT = f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+
+class ListExporter:
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append(list(spans))
+
+    @property
+    def spans(self):
+        return [span for batch in self.batches for span in batch]
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, "EXPORTER", exporter)
+    return exporter
+
+
+@pytest.mark.parametrize("header, expected", [
+    (TRACEPARENT, (TRACE_ID, PARENT_ID)),
+    (f"  00-{TRACE_ID.upper()}-{PARENT_ID}-00 ", (TRACE_ID, PARENT_ID)),
+    (None, None),
+    ("", None),
+    (f"00-{TRACE_ID}-{PARENT_ID}", None),
+    (f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01", None),
+    (f"00-{TRACE_ID[:-1]}g-{PARENT_ID}-01", None),
+    (f"00-{'0' * 32}-{PARENT_ID}-01", None),
+    (f"00-{TRACE_ID}-{'0' * 16}-01", None),
+])
+def test_parse_traceparent(header, expected):
+    assert tracing.parse_traceparent(header) == expected
+
+
+def test_children_share_the_trace_and_are_exported_with_their_root(exporter):
+    with tracing.span("root", {"a": 1}) as root:
+        with tracing.span("child") as child:
+            tracing.set_attribute("rows", 3)
+            assert tracing.current_span() is child
+        assert exporter.batches == []
+        assert tracing.current_span() is root
+
+    assert tracing.current_span() is None
+    assert [[span.name for span in batch] for batch in exporter.batches] == [["child", "root"]]
+    assert child.trace_id == root.trace_id and len(root.trace_id) == 32
+    assert (root.parent_id, child.parent_id) == (None, root.span_id)
+    assert child.attributes == {"rows": 3}
+    assert root.traceparent() == f"00-{root.trace_id}-{root.span_id}-01"
+
+
+def test_remote_parent_starts_a_local_root_under_it(exporter):
+    with tracing.span("server", kind="SERVER", remote_parent=(TRACE_ID, PARENT_ID)) as server:
+        with tracing.span("inner"):
+            pass
+
+    assert (server.trace_id, server.parent_id, server.is_local_root) == (TRACE_ID, PARENT_ID, True)
+    assert len(exporter.batches) == 1
+    otlp = server.to_otlp()
+    assert (otlp["traceId"], otlp["parentSpanId"], otlp["kind"]) == (TRACE_ID, PARENT_ID, 2)
+
+
+def test_an_exception_marks_the_span_as_error(exporter):
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+
+    (span,) = exporter.spans
+    assert (span.status, span.status_message) == ("ERROR", "ValueError: boom")
+    assert span.to_otlp()["status"] == {"code": 2, "message": "ValueError: boom"}
+
+
+def test_sql_statements_are_child_spans_only_inside_a_trace(exporter):
+    conn = sqlite3.connect(":memory:", factory=tracing.TracedConnection)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    assert exporter.spans == []
+
+    with tracing.span("request"):
+        conn.execute("INSERT INTO t VALUES (?)", (1,))
+        conn.cursor().execute("SELECT   x\n FROM t").fetchall()
+
+    sql = [span for span in exporter.spans if span.name.startswith("sql")]
+    assert [span.name for span in sql] == ["sql INSERT", "sql SELECT"]
+    assert sql[1].attributes["db.statement"] == "SELECT x FROM t"
+    assert sql[1].kind == "CLIENT"
+
+
+def test_file_exporter_writes_one_otlp_document_per_trace(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    file_exporter = tracing.FileSpanExporter(str(path))
+    monkeypatch.setattr(tracing, "EXPORTER", file_exporter)
+
+    for _ in range(2):
+        with tracing.span("root", {"ok": True, "n": 2, "ratio": 0.5}):
+            with tracing.span("child"):
+                pass
+    file_exporter.close()
+
+    documents = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(documents) == 2
+    spans = documents[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["child", "root"]
+    assert spans[1]["attributes"] == [{"key": "ok", "value": {"boolValue": True}},
+                                      {"key": "n", "value": {"intValue": "2"}},
+                                      {"key": "ratio", "value": {"doubleValue": 0.5}}]
+
+
+def test_chat_continues_an_incoming_trace(client, exporter):
+    response = client.post("/chat", json={"prompt": "Find books about code", "session_id": "traced"},
+                           headers={"traceparent": TRACEPARENT})
+
+    assert response.headers["X-Trace-Id"] == response.json()["trace_id"] == TRACE_ID
+    (batch,) = exporter.batches
+    server = batch[-1]
+    assert (server.name, server.parent_id, server.attributes["chat.path"]) == ("POST /chat", PARENT_ID, "llm")
+    assert {span.trace_id for span in batch} == {TRACE_ID}
+    names = [span.name for span in batch]
+    assert names.count("agent.iteration") == 2 and names.count("llm.invoke") == 2
+    assert "tool find_books_tool" in names
+
+
+def test_chat_without_traceparent_starts_a_new_trace(client):
+    first = client.post("/chat", json={"prompt": "hello", "session_id": "untraced"})
+    second = client.post("/chat", json={"prompt": "hello", "session_id": "untraced"},
+                         headers={"traceparent": "not-a-traceparent"})
+
+    trace_ids = {first.headers["X-Trace-Id"], second.headers["X-Trace-Id"]}
+    assert len(trace_ids) == 2 and all(len(trace_id) == 32 for trace_id in trace_ids)
+
+
+def test_chat_stream_final_event_carries_the_incoming_trace_id(client):
+    with client.stream("POST", "/chat/stream", json={"prompt": "Find books", "session_id": "traced-stream"},
+                       headers={"traceparent": TRACEPARENT}) as response:
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert events[-1]["type"] == "final"
+    assert events[-1]["trace_id"] == TRACE_ID
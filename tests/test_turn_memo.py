@@ -0,0 +1,74 @@
+# /tests/test_turn_memo.py
+
+import asyncio
+
+import agent
+from fake_llm import ScriptedChatModel
+from tool_scheduler import TurnMemo
+
+FIND = {"name": "find_books_tool", "args": {"q": "code"}}
+RESTOCK = {"name": "restock_book_tool", "args": {"isbn": "978-1934356073", "qty": 1}}
+
+
+def _agent_with_steps(*tool_steps):
+    """An agent whose one script entry plays each tool_steps item as one LLM response, then answers."""
+    steps = [{"tool_calls": calls} for calls in tool_steps] + [{"content": "Done."}]
+    return agent.create_library_agent(ScriptedChatModel(script=[{"steps": steps}]))
+
+
+def _count_find_books(monkeypatch) -> list:
+    calls = []
+    real = agent.find_books
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(agent, "find_books", counted)
+    return calls
+
+
+def test_memo_keys_on_name_and_arguments():
+    memo = TurnMemo()
+    memo.record({"name": "find_books_tool", "args": {"q": "a", "by": "title"}}, "result", read_only=True)
+
+    assert memo.lookup({"name": "find_books_tool", "args": {"by": "title", "q": "a"}}) == "result"
+    assert memo.lookup({"name": "find_books_tool", "args": {"q": "b", "by": "title"}}) is None
+    assert memo.saved == 1
+
+
+def test_failed_reads_are_not_memoised_and_writes_clear_the_memo():
+    memo = TurnMemo()
+    memo.record(FIND, "error", read_only=True, ok=False)
+    assert memo.lookup(FIND) is None
+
+    memo.record(FIND, "result", read_only=True)
+    memo.record(RESTOCK, "restocked", read_only=False)
+    assert memo.lookup(FIND) is None
+
+
+def test_a_repeated_read_in_one_turn_runs_once(db, monkeypatch):
+    calls = _count_find_books(monkeypatch)
+    library_agent = _agent_with_steps([FIND], [FIND])
+
+    assert asyncio.run(library_agent.arun("anything", [])) == "Done."
+    assert len(calls) == 1
+    assert library_agent.memo_saved_total == 1
+
+
+def test_a_write_in_the_same_turn_invalidates_the_memo(db, monkeypatch):
+    calls = _count_find_books(monkeypatch)
+    library_agent = _agent_with_steps([FIND], [RESTOCK], [FIND])
+
+    assert asyncio.run(library_agent.arun("anything", [])) == "Done."
+    assert len(calls) == 2
+    assert library_agent.memo_saved_total == 0
+
+
+def test_the_memo_does_not_outlive_its_turn(db, monkeypatch):
+    calls = _count_find_books(monkeypatch)
+    library_agent = _agent_with_steps([FIND])
+
+    asyncio.run(library_agent.arun("first turn", []))
+    library_agent.run("second turn", [])
+    assert len(calls) == 2